@@ -16,4 +16,8 @@ def init_database():
            logger.info("Conexão com banco estabelecida.")
        
        Base.metadata.create_all(bind=engine)
-       logger.info("Tabelas verificadas/criadas com sucesso!")
\ No newline at end of file
+       logger.info("Tabelas verificadas/criadas com sucesso!")
+
+       # Índices/extensões que o create_all não cobre (ver backend/migrations/)
+       from app.migracoes import aplicar_migracoes
+       aplicar_migracoes(engine)
\ No newline at end of file
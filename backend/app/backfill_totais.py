@@ -0,0 +1,100 @@
+# app/backfill_totais.py
+#
+# Preenche as colunas de totais de refeicoes_salvas a partir do analysis_result_json
+# e reconstrói a tabela consumo_diario a partir dessas colunas. Usado depois da
+# migração 002 (refeições analisadas antes dela só têm o JSON): app/migracoes.py
+# o executa ao aplicar a 002; o comando abaixo serve para refazer. Idempotente.
+#
+# Uso (a partir de backend/):
+#   python -m app.backfill_totais
+#   python -m app.backfill_totais --lote 1000 --todas   (recalcula também as que já têm totais)
+
+import argparse
+import json
+import logging
+import time
+from collections import defaultdict
+
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.models.refeicoes import RefeicaoSalva, ConsumoDiario
+
+logger = logging.getLogger(__name__)
+
+
+def preencher_totais_refeicoes(db: Session, lote: int = 500, todas: bool = False) -> int:
+    """Grava os totais das refeições com análise salva (em lotes, um commit por lote). Retorna quantas foram atualizadas."""
+    atualizadas = 0
+    ultimo_id = 0
+    while True:
+        consulta = db.query(RefeicaoSalva).filter(
+            RefeicaoSalva.id > ultimo_id,
+            RefeicaoSalva.analysis_result_json.isnot(None),
+        )
+        if not todas:
+            consulta = consulta.filter(RefeicaoSalva.total_calorias.is_(None))
+        refeicoes = consulta.order_by(RefeicaoSalva.id).limit(lote).all()
+        if not refeicoes:
+            break
+
+        for refeicao in refeicoes:
+            try:
+                totais = crud.extrair_totais_analise(json.loads(refeicao.analysis_result_json))
+            except Exception as e:
+                logger.warning(f"⚠️ JSON inválido na refeição ID {refeicao.id}: {e}")
+                continue
+            for campo, valor in totais.items():
+                setattr(refeicao, campo, valor)
+            atualizadas += 1
+
+        ultimo_id = refeicoes[-1].id
+        db.commit()
+        db.expunge_all()
+    return atualizadas
+
+
+def reconstruir_consumo_diario(db: Session) -> int:
+    """Recalcula consumo_diario inteiro a partir das colunas de totais. Retorna o número de linhas (usuário, dia)."""
+    agregados = defaultdict(lambda: dict.fromkeys(crud.CAMPOS_TOTAIS, 0.0) | {"refeicoes_analisadas": 0})
+    linhas = db.query(
+        RefeicaoSalva.owner_id, RefeicaoSalva.created_at, *(getattr(RefeicaoSalva, campo) for campo in crud.CAMPOS_TOTAIS)
+    ).filter(RefeicaoSalva.total_calorias.isnot(None)).yield_per(1000)
+
+    for owner_id, created_at, *totais in linhas:
+        agregado = agregados[(owner_id, created_at.date())]
+        for campo, valor in zip(crud.CAMPOS_TOTAIS, totais):
+            agregado[campo] += valor or 0.0
+        agregado["refeicoes_analisadas"] += 1
+
+    # Troca o conteúdo numa transação só: o dashboard nunca vê a tabela pela metade
+    db.query(ConsumoDiario).delete(synchronize_session=False)
+    db.bulk_insert_mappings(ConsumoDiario, [
+        {"owner_id": owner_id, "dia": dia, **valores} for (owner_id, dia), valores in agregados.items()
+    ])
+    db.commit()
+    return len(agregados)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill dos totais das refeições e do consumo diário")
+    parser.add_argument("--lote", type=int, default=500, help="Refeições por commit")
+    parser.add_argument("--todas", action="store_true", help="Recalcula também as refeições que já têm totais")
+    args = parser.parse_args()
+
+    from app.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    inicio = time.perf_counter()
+    db = SessionLocal()
+    try:
+        atualizadas = preencher_totais_refeicoes(db, lote=args.lote, todas=args.todas)
+        logger.info(f"✅ Totais preenchidos em {atualizadas} refeições.")
+        dias = reconstruir_consumo_diario(db)
+        logger.info(f"✅ consumo_diario reconstruído: {dias} linhas (usuário, dia) em {time.perf_counter() - inicio:.1f}s.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
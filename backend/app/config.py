@@ -7,20 +7,132 @@ load_dotenv()
 class Settings:
     # Database
     DATABASE_URL = os.getenv('DATABASE_URL')
+
+    # Engine/pool (app/database.py). Conexões por instância = DB_POOL_SIZE + DB_MAX_OVERFLOW (+ as do engine assíncrono)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    # Engine assíncrono (rotas de leitura, app/database.py) tem pool próprio
+    DB_ASYNC_POOL_SIZE = int(os.getenv('DB_ASYNC_POOL_SIZE', DB_POOL_SIZE))
+    DB_ASYNC_MAX_OVERFLOW = int(os.getenv('DB_ASYNC_MAX_OVERFLOW', DB_MAX_OVERFLOW))
+    DB_POOL_TIMEOUT_SEGUNDOS = float(os.getenv('DB_POOL_TIMEOUT_SEGUNDOS', 10))
+    # Abaixo do autosuspend do Neon (5 min): conexões que atravessariam uma suspensão são recicladas
+    # antes do uso, sem o SELECT 1 do pre_ping em cada checkout
+    DB_POOL_RECYCLE_SEGUNDOS = int(os.getenv('DB_POOL_RECYCLE_SEGUNDOS', 280))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'false').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))  # 0 = sem limite
+    DB_APPLICATION_NAME = os.getenv('DB_APPLICATION_NAME', os.getenv('K_SERVICE', 'nutriscan-api'))
+    # PgBouncer em modo transação (pooler do Neon, host "-pooler"): sem prepared statements
+    # nem parâmetros de sessão na conexão. auto = detecta pelo host
+    DB_POOLER_TRANSACAO = os.getenv('DB_POOLER_TRANSACAO', 'auto').lower()  # auto, true ou false
     
     # Security
     SECRET_KEY = os.getenv('SECRET_KEY')
     ALGORITHM = os.getenv('ALGORITHM', 'HS256')
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES', 60))
     REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv('REFRESH_TOKEN_EXPIRE_DAYS', 7))
+
+    # Cache do usuário autenticado (get_current_user)
+    AUTH_CACHE_TTL_SEGUNDOS = int(os.getenv('AUTH_CACHE_TTL_SEGUNDOS', 60))
+    AUTH_CACHE_MAX_ITENS = int(os.getenv('AUTH_CACHE_MAX_ITENS', 10000))
+    # true: usa id/nome/ativo assinados no token e dispensa a consulta ao banco.
+    # Com mais de uma instância, habilite também o Redis para propagar desativações.
+    AUTH_PRINCIPAL_NOS_CLAIMS = os.getenv('AUTH_PRINCIPAL_NOS_CLAIMS', 'false').lower() == 'true'
     
     # API Keys
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+    GEMINI_TIMEOUT_SEGUNDOS = float(os.getenv('GEMINI_TIMEOUT_SEGUNDOS', 30))
+    GEMINI_MAX_CONCORRENCIA = int(os.getenv('GEMINI_MAX_CONCORRENCIA', 8))
+    GEMINI_API_BASE_URL = os.getenv('GEMINI_API_BASE_URL', 'https://generativelanguage.googleapis.com')
+
+    # Cliente HTTP compartilhado (chamadas REST externas)
+    HTTP_TIMEOUT_SEGUNDOS = float(os.getenv('HTTP_TIMEOUT_SEGUNDOS', 10))
+    HTTP_TIMEOUT_CONEXAO_SEGUNDOS = float(os.getenv('HTTP_TIMEOUT_CONEXAO_SEGUNDOS', 5))
+    HTTP_MAX_CONEXOES = int(os.getenv('HTTP_MAX_CONEXOES', 20))
+    HTTP_MAX_CONEXOES_KEEPALIVE = int(os.getenv('HTTP_MAX_CONEXOES_KEEPALIVE', 20))
+    HTTP_KEEPALIVE_SEGUNDOS = float(os.getenv('HTTP_KEEPALIVE_SEGUNDOS', 60))
+    HTTP_MAX_CONCORRENCIA = int(os.getenv('HTTP_MAX_CONCORRENCIA', 16))
+    HTTP_TENTATIVAS = int(os.getenv('HTTP_TENTATIVAS', 3))
+    HTTP_BACKOFF_BASE_SEGUNDOS = float(os.getenv('HTTP_BACKOFF_BASE_SEGUNDOS', 0.25))
+    HTTP_BACKOFF_MAX_SEGUNDOS = float(os.getenv('HTTP_BACKOFF_MAX_SEGUNDOS', 4))
     
     # Environment
     APP_ENV = os.getenv('APP_ENV', 'development')
     
     # Redis
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    REDIS_HABILITADO = os.getenv('REDIS_HABILITADO', 'false').lower() == 'true'
+    REDIS_TIMEOUT_SEGUNDOS = float(os.getenv('REDIS_TIMEOUT_SEGUNDOS', 0.5))
+
+    # Cache do scan rápido (por hash da imagem)
+    SCAN_CACHE_MAX_ITENS = int(os.getenv('SCAN_CACHE_MAX_ITENS', 256))
+    SCAN_CACHE_TTL_SEGUNDOS = int(os.getenv('SCAN_CACHE_TTL_SEGUNDOS', 86400))
+
+    # Google Cloud Storage
+    GCS_BUCKET_NAME = os.getenv('GCS_BUCKET_NAME', 'nutriscan-imagens-prod')
+
+    # Pré-processamento de imagens (antes do Gemini e do GCS)
+    IMAGEM_MAX_LADO = int(os.getenv('IMAGEM_MAX_LADO', 1536))
+    IMAGEM_FORMATO = os.getenv('IMAGEM_FORMATO', 'JPEG')  # JPEG ou WEBP
+    IMAGEM_QUALIDADE = int(os.getenv('IMAGEM_QUALIDADE', 82))
+    IMAGEM_MANTER_ORIGINAL = os.getenv('IMAGEM_MANTER_ORIGINAL', 'false').lower() == 'true'
+
+    # Staging da imagem do scan rápido (upload único: scan -> token -> salvar)
+    STAGING_BACKEND = os.getenv('STAGING_BACKEND', 'gcs' if os.getenv('K_SERVICE') else 'local')  # local ou gcs
+    STAGING_PREFIXO_GCS = os.getenv('STAGING_PREFIXO_GCS', 'staging')
+    STAGING_DIRETORIO_LOCAL = os.getenv('STAGING_DIRETORIO_LOCAL')
+    STAGING_TTL_SEGUNDOS = int(os.getenv('STAGING_TTL_SEGUNDOS', 3600))
+    STAGING_VARREDURA_SEGUNDOS = int(os.getenv('STAGING_VARREDURA_SEGUNDOS', 600))
+
+    # Índice em memória da tabela 'alimentos' (conversões de medidas)
+    INDICE_ALIMENTOS_TTL_SEGUNDOS = int(os.getenv('INDICE_ALIMENTOS_TTL_SEGUNDOS', 600))
+
+    # Criação de alimentos via Gemini: cache negativo para nomes que falharam
+    GEMINI_ALIMENTOS_NEGATIVO_MAX_ITENS = int(os.getenv('GEMINI_ALIMENTOS_NEGATIVO_MAX_ITENS', 1024))
+    GEMINI_ALIMENTOS_NEGATIVO_TTL_SEGUNDOS = int(os.getenv('GEMINI_ALIMENTOS_NEGATIVO_TTL_SEGUNDOS', 3600))
+
+    # Fila da análise detalhada (enfileirada ao salvar; processada por workers)
+    ANALISE_FILA_BACKEND = os.getenv('ANALISE_FILA_BACKEND', 'redis' if REDIS_HABILITADO else 'memoria')  # memoria ou redis
+    ANALISE_WORKER_EM_PROCESSO = os.getenv('ANALISE_WORKER_EM_PROCESSO', 'true').lower() == 'true'
+    ANALISE_WORKERS = int(os.getenv('ANALISE_WORKERS', 2))
+    ANALISE_MAX_TENTATIVAS = int(os.getenv('ANALISE_MAX_TENTATIVAS', 3))
+    ANALISE_BACKOFF_SEGUNDOS = float(os.getenv('ANALISE_BACKOFF_SEGUNDOS', 5))
+    ANALISE_LEASE_SEGUNDOS = int(os.getenv('ANALISE_LEASE_SEGUNDOS', 180))
+    ANALISE_POLL_SEGUNDOS = float(os.getenv('ANALISE_POLL_SEGUNDOS', 0.5))
+
+    # Métricas Prometheus (/metrics). Com METRICAS_TOKEN, o scrape precisa de "Authorization: Bearer <token>"
+    METRICAS_HABILITADAS = os.getenv('METRICAS_HABILITADAS', 'true').lower() == 'true'
+    METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+
+    # Perfil SQL por requisição (app/perfil_sql.py): headers X-SQL-* e avisos de N+1 no log
+    SQL_PERFIL_HEADER = os.getenv('SQL_PERFIL_HEADER', 'false' if APP_ENV == 'production' else 'true').lower() == 'true'
+    SQL_N_MAIS_1_LIMITE = int(os.getenv('SQL_N_MAIS_1_LIMITE', 5))  # mesmo formato repetido N vezes
+    SQL_CONSULTAS_AVISO = int(os.getenv('SQL_CONSULTAS_AVISO', 25))
+
+    # Hash de senhas (bcrypt) num pool de processos: 0 processos = núcleos da máquina.
+    # Acima de processos + SENHA_FILA_MAX operações pendentes, login/registro respondem 503
+    SENHA_BCRYPT_CUSTO = int(os.getenv('SENHA_BCRYPT_CUSTO', 12))
+    SENHA_PROCESSOS = int(os.getenv('SENHA_PROCESSOS', 0)) or (os.cpu_count() or 1)
+    SENHA_FILA_MAX = int(os.getenv('SENHA_FILA_MAX', 32))
+    SENHA_RETRY_AFTER_SEGUNDOS = int(os.getenv('SENHA_RETRY_AFTER_SEGUNDOS', 2))
+
+    # Limite de requisições (app/services/limite_taxa.py), em unidades de custo: 1 por requisição,
+    # mais LIMITE_CUSTO_CHAMADA_MODELO por chamada ao Gemini e 1 a cada LIMITE_BYTES_POR_UNIDADE de corpo.
+    # Contadores no Redis com REDIS_HABILITADO (senão, ou se ele falhar, em memória por instância)
+    LIMITE_TAXA_HABILITADO = os.getenv('LIMITE_TAXA_HABILITADO', 'true').lower() == 'true'
+    LIMITE_USUARIO_UNIDADES_POR_MINUTO = int(os.getenv('LIMITE_USUARIO_UNIDADES_POR_MINUTO', 120))
+    LIMITE_USUARIO_RAJADA = int(os.getenv('LIMITE_USUARIO_RAJADA', 60))
+    # Sem access token válido (login, registro, rotas públicas): por IP do cliente
+    LIMITE_IP_UNIDADES_POR_MINUTO = int(os.getenv('LIMITE_IP_UNIDADES_POR_MINUTO', 60))
+    LIMITE_IP_RAJADA = int(os.getenv('LIMITE_IP_RAJADA', 30))
+    LIMITE_CUSTO_CHAMADA_MODELO = int(os.getenv('LIMITE_CUSTO_CHAMADA_MODELO', 10))
+    LIMITE_BYTES_POR_UNIDADE = int(os.getenv('LIMITE_BYTES_POR_UNIDADE', 512 * 1024))
+    # Balde global de chamadas ao modelo, somando todos os usuários e instâncias (0 = desligado).
+    # Deixe abaixo da cota de requisições por minuto do projeto no Gemini
+    LIMITE_MODELO_CHAMADAS_POR_MINUTO = int(os.getenv('LIMITE_MODELO_CHAMADAS_POR_MINUTO', 0))
+    LIMITE_MODELO_RAJADA = int(os.getenv('LIMITE_MODELO_RAJADA', 10))
+    # Proxies na frente da API que acrescentam ao X-Forwarded-For (Cloud Run: 1; com load balancer externo: 2)
+    LIMITE_PROXIES_CONFIAVEIS = int(os.getenv('LIMITE_PROXIES_CONFIAVEIS', 1 if os.getenv('K_SERVICE') else 0))
+    LIMITE_REDIS_PAUSA_SEGUNDOS = float(os.getenv('LIMITE_REDIS_PAUSA_SEGUNDOS', 30))
+    LIMITE_MEMORIA_MAX_CHAVES = int(os.getenv('LIMITE_MEMORIA_MAX_CHAVES', 10000))
 
 settings = Settings()
\ No newline at end of file
@@ -1,10 +1,14 @@
 # app/crud.py
 
 from sqlalchemy.orm import Session, joinedload # ✅ Adicione joinedload aqui
-from sqlalchemy import func, cast, Date
-from typing import Optional, List, Dict, Any
+from sqlalchemy import func, select, String, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, List, Dict, Any, Tuple, Callable
+from concurrent.futures import ThreadPoolExecutor
 import json
-from datetime import datetime, date
+import base64
+from datetime import datetime, date, timedelta
 from zoneinfo import ZoneInfo
 import logging
 
@@ -12,7 +16,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 # --- Imports Explícitos ---
-from app.models.refeicoes import RefeicaoSalva, AlimentoSalvo, RefeicaoStatus
+from app.models.refeicoes import RefeicaoSalva, AlimentoSalvo, RefeicaoStatus, ConsumoDiario
 from app.models.usuario import Usuario
 from app.models.alimentos import Alimento
 from app.schemas.vision_alimentos_ import (
@@ -21,7 +25,18 @@ from app.schemas.vision_alimentos_ import (
 )
 
 # 🔹 NOVO: Import para auto-aprendizagem
-from app.vision import fetch_gemini_nutritional_data
+from app.services.indice_alimentos import indice_alimentos
+from app.services.gemini_alimentos import consulta_gemini_alimentos
+from app.services.busca_alimentos import busca_alimentos
+from app.services.autocomplete_alimentos import autocomplete_alimentos
+from app.services.motor_nutrientes import motor_nutrientes
+from app.config import settings
+
+# Pool dedicado às consultas de auto-aprendizagem ao Gemini (limita a concorrência global)
+_executor_gemini = ThreadPoolExecutor(
+    max_workers=settings.GEMINI_MAX_CONCORRENCIA,
+    thread_name_prefix="gemini-alimentos"
+)
 
 # --- FUNÇÕES AUXILIARES PARA AUTO-APRENDIZAGEM ---
 
@@ -43,106 +58,236 @@ def normalizar_nome_alimento(nome: str) -> str:
     nome = ' '.join(nome.split())  # Remove espaços múltiplos
     return nome
 
-def get_or_create_alimento_by_nome(db: Session, nome: str) -> Optional[Alimento]:
+def _invalidar_indices_alimentos(criados: List[Alimento]) -> None:
+    """Atualiza os índices em memória da tabela 'alimentos' após criar novos registros."""
+    indice_alimentos.invalidar()
+    busca_alimentos.invalidar()
+    motor_nutrientes.invalidar()
+    for alimento in criados:
+        autocomplete_alimentos.adicionar(alimento)
+
+
+def _alimento_a_partir_dados_ia(nome: str, nome_normalizado: str, dados_ia: Dict[str, Any]) -> Alimento:
+    """Monta (sem salvar) um novo Alimento com os dados nutricionais estimados pelo Gemini."""
+    return Alimento(
+        categoria=dados_ia.get("categoria", "Outros"),
+        alimento_normalizado=nome_normalizado,
+        alimentos=nome,
+        alimento=dados_ia.get("alimento", nome),
+        energia_kcal_100g=float(dados_ia.get("energia_kcal_100g", 0) or 0),
+        proteina_g_100g=float(dados_ia.get("proteina_g_100g", 0) or 0),
+        carboidrato_g_100g=float(dados_ia.get("carboidrato_g_100g", 0) or 0),
+        lipidios_g_100g=float(dados_ia.get("lipidios_g_100g", 0) or 0),
+        fibra_g_100g=float(dados_ia.get("fibra_g_100g", 0) or 0),
+        # Outros campos com defaults 0
+        ac_graxos_saturados_g=float(dados_ia.get("ac_graxos_saturados_g", 0) or 0),
+        ac_graxos_monoinsaturados_g=float(dados_ia.get("ac_graxos_monoinsaturados_g", 0) or 0),
+        ac_graxos_poliinsaturados_g=float(dados_ia.get("ac_graxos_poliinsaturados_g", 0) or 0),
+        colesterol_mg_100g=float(dados_ia.get("colesterol_mg_100g", 0) or 0),
+        sodio_mg_100g=float(dados_ia.get("sodio_mg_100g", 0) or 0),
+        potassio_mg_100g=float(dados_ia.get("potassio_mg_100g", 0) or 0),
+        calcio_mg_100g=float(dados_ia.get("calcio_mg_100g", 0) or 0),
+        ferro_mg_100g=float(dados_ia.get("ferro_mg_100g", 0) or 0),
+        magnesio_mg_100g=float(dados_ia.get("magnesio_mg_100g", 0) or 0),
+        unidades=float(dados_ia.get("unidades", 1) or 1),
+        un_medida_caseira=dados_ia.get("un_medida_caseira"),
+        peso_aproximado_g=float(dados_ia.get("peso_aproximado_g", 100) or 100),
+    )
+
+
+def _buscar_por_similaridade_em_lote(db: Session, pendentes: Dict[str, str]) -> Dict[str, Alimento]:
     """
-    Tenta encontrar um alimento na tabela 'alimentos' pelo nome normalizado.
-    Se não encontrar, chama o Gemini para gerar dados nutricionais e cria um novo registro.
+    Para cada nome normalizado (chave de 'pendentes', valor = nome original), busca o alimento
+    cujo nome o contém, priorizando a maior similaridade pg_trgm com o nome original.
+    No PostgreSQL é UMA query (unnest + DISTINCT ON); sem pg_trgm, cai na busca simples por nome.
     """
-    if not nome:
-        return None
+    normalizados = list(pendentes)
+    if db.get_bind().dialect.name == "postgresql":
+        try:
+            busca = select(
+                func.unnest(postgresql.array(normalizados), type_=String).label("normalizado"),
+                func.unnest(postgresql.array([pendentes[n] for n in normalizados]), type_=String).label("original"),
+            ).subquery("busca")
+
+            consulta = (
+                select(busca.c.normalizado, Alimento)
+                .join(Alimento, func.lower(Alimento.alimento).contains(busca.c.normalizado))
+                .distinct(busca.c.normalizado)
+                .order_by(busca.c.normalizado, func.similarity(Alimento.alimento, busca.c.original).desc())
+            )
+            # Savepoint: uma falha aqui (ex.: pg_trgm ausente) não invalida a transação da refeição
+            with db.begin_nested():
+                return {normalizado: alimento for normalizado, alimento in db.execute(consulta).all()}
+        except Exception as e:
+            logger.warning(f"⚠️ Busca por similaridade em lote falhou: {e}. Usando busca simples.")
 
-    nome_normalizado = normalizar_nome_alimento(nome)
-    logger.info(f"🔍 Procurando alimento: '{nome}' (normalizado: '{nome_normalizado}')")
+    encontrados = {}
+    for normalizado in normalizados:
+        alimento = db.query(Alimento).filter(
+            func.lower(Alimento.alimento).ilike(f"%{normalizado}%")
+        ).first()
+        if alimento:
+            encontrados[normalizado] = alimento
+    return encontrados
+
+
+def _consultar_gemini_em_lote(pendentes: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Consulta o Gemini para todos os nomes pendentes em paralelo (pool limitado).
+    Nomes já em consulta por outra requisição compartilham a mesma chamada, e nomes
+    com resposta inválida recente são respondidos pelo cache negativo.
+    """
+    futuros = {
+        normalizado: _executor_gemini.submit(consulta_gemini_alimentos.consultar, normalizado, nome)
+        for normalizado, nome in pendentes.items()
+    }
+    return {normalizado: futuro.result() for normalizado, futuro in futuros.items()}
 
-    # 1️⃣ Busca exata por alimento_normalizado (mais rápida)
-    alimento_existente = db.query(Alimento).filter(
-        func.lower(Alimento.alimento_normalizado) == nome_normalizado
-    ).first()
 
-    # 2️⃣ Se não achou, busca por similaridade usando pg_trgm
-    if not alimento_existente:
+def _inserir_alimentos_em_lote(db: Session, novos: Dict[str, Alimento]) -> Dict[str, Optional[Alimento]]:
+    """
+    Insere os novos alimentos em um único flush. Se outra requisição já tiver criado
+    algum deles (violação do unique em alimento_normalizado), insere um a um,
+    reaproveitando o registro existente para os nomes em conflito.
+    """
+    try:
+        with db.begin_nested():
+            db.add_all(list(novos.values()))
+            db.flush()
+        return dict(novos)
+    except IntegrityError:
+        logger.info("🔁 Conflito ao inserir alimentos em lote; inserindo individualmente.")
+
+    inseridos: Dict[str, Optional[Alimento]] = {}
+    for normalizado, alimento in novos.items():
         try:
-            # ✅ AGORA FUNCIONA: Usa a extensão pg_trgm que você ativou
-            alimento_existente = db.query(Alimento).filter(
-                func.lower(Alimento.alimento).contains(nome_normalizado)
-            ).order_by(
-                func.similarity(Alimento.alimento, nome)  # Usa o nome original para melhor similaridade
-                .desc()
+            with db.begin_nested():
+                db.add(alimento)
+                db.flush()
+            inseridos[normalizado] = alimento
+        except IntegrityError:
+            inseridos[normalizado] = db.query(Alimento).filter(
+                Alimento.alimento_normalizado == normalizado
             ).first()
+    return inseridos
 
-            if alimento_existente:
-                logger.info(f"✅ Alimento encontrado por similaridade: '{alimento_existente.alimento}' (ID: {alimento_existente.id}) - Similaridade: {func.similarity(alimento_existente.alimento, nome)}")
-        except Exception as e:
-            # Fallback se a extensão ainda não estiver disponível
-            logger.warning(f"⚠️ Busca por similaridade falhou: {e}. Usando busca simples.")
-            alimento_existente = db.query(Alimento).filter(
-                func.lower(Alimento.alimento).ilike(f"%{nome_normalizado}%")
-            ).first()
 
-    if alimento_existente:
-        logger.info(f"✅ Alimento encontrado na base: '{alimento_existente.alimento}' (ID: {alimento_existente.id})")
-        return alimento_existente
+def resolver_alimentos_em_lote(
+    db: Session,
+    nomes: List[str],
+    antes_de_consultar_gemini: Optional[Callable[[int], None]] = None,
+) -> Tuple[Dict[str, Optional[Alimento]], List[Alimento]]:
+    """
+    Resolve vários nomes de alimentos na tabela 'alimentos' de uma vez.
+
+    Etapas (cada uma com uma ida ao banco / um lote de chamadas):
+      1. Busca exata por alimento_normalizado (query IN)
+      2. Busca por similaridade pg_trgm para o que sobrou (uma query)
+      3. Gemini para os que ainda faltam (em paralelo)
+      4. Inserção dos novos alimentos (um flush; sem commit)
+
+    Retorna ({nome_normalizado: Alimento ou None}, [alimentos criados]).
+    Quem chama é responsável pelo commit e por invalidar o índice se houver criados.
+    'antes_de_consultar_gemini' recebe quantos nomes vão de fato ao Gemini (fora os do
+    cache negativo) antes da etapa 3; uma exceção ali interrompe a resolução sem consultas.
+    """
+    # Normaliza e remove duplicados, mantendo o primeiro nome original de cada um
+    originais: Dict[str, str] = {}
+    for nome in nomes:
+        nome_normalizado = normalizar_nome_alimento(nome)
+        if nome_normalizado and nome_normalizado not in originais:
+            originais[nome_normalizado] = nome
 
-    # 3️⃣ Não achou → chama Gemini para estimar os dados nutricionais
-    logger.info(f"🔄 Alimento não encontrado. Consultando Gemini para: '{nome}'")
-    dados_ia = fetch_gemini_nutritional_data(nome)
+    resolvidos: Dict[str, Optional[Alimento]] = {n: None for n in originais}
+    if not originais:
+        return resolvidos, []
 
-    if "erro" in dados_ia:
-        logger.error(f"❌ Erro ao obter dados do Gemini para '{nome}': {dados_ia.get('erro')}")
-        return None
+    # 1️⃣ Busca exata por alimento_normalizado (mais rápida)
+    for alimento in db.query(Alimento).filter(
+        func.lower(Alimento.alimento_normalizado).in_(list(originais))
+    ).all():
+        resolvidos[alimento.alimento_normalizado.lower()] = alimento
+
+    # 2️⃣ Busca por similaridade para os que não têm match exato
+    pendentes = {n: originais[n] for n, a in resolvidos.items() if a is None}
+    if pendentes:
+        resolvidos.update(_buscar_por_similaridade_em_lote(db, pendentes))
+
+    for nome_normalizado, alimento in resolvidos.items():
+        if alimento:
+            logger.info(f"✅ Alimento encontrado na base: '{alimento.alimento}' (ID: {alimento.id}) para '{originais[nome_normalizado]}'")
+
+    # 3️⃣ Não achou → Gemini estima os dados nutricionais (todas as consultas em paralelo)
+    pendentes = {n: originais[n] for n, a in resolvidos.items() if a is None}
+    if not pendentes:
+        return resolvidos, []
+
+    if antes_de_consultar_gemini is not None:
+        consultas = sum(1 for n in pendentes if consulta_gemini_alimentos.negativos.get(n) is None)
+        if consultas:
+            antes_de_consultar_gemini(consultas)
+
+    logger.info(f"🔄 {len(pendentes)} alimento(s) não encontrado(s). Consultando Gemini: {list(pendentes.values())}")
+    novos: Dict[str, Alimento] = {}
+    for nome_normalizado, dados_ia in _consultar_gemini_em_lote(pendentes).items():
+        nome = pendentes[nome_normalizado]
+        if "erro" in dados_ia:
+            logger.error(f"❌ Erro ao obter dados do Gemini para '{nome}': {dados_ia.get('erro')}")
+            continue
+        try:
+            novos[nome_normalizado] = _alimento_a_partir_dados_ia(nome, nome_normalizado, dados_ia)
+        except Exception as e:
+            logger.error(f"❌ Dados inválidos do Gemini para '{nome}': {e}")
+            consulta_gemini_alimentos.marcar_invalido(nome_normalizado, f"Dados inválidos do Gemini: {e}")
 
-    # 4️⃣ Monta e salva novo Alimento
-    try:
-        novo_alimento = Alimento(
-            categoria=dados_ia.get("categoria", "Outros"),
-            alimento_normalizado=nome_normalizado,
-            alimentos=nome,
-            alimento=dados_ia.get("alimento", nome),
-            energia_kcal_100g=float(dados_ia.get("energia_kcal_100g", 0) or 0),
-            proteina_g_100g=float(dados_ia.get("proteina_g_100g", 0) or 0),
-            carboidrato_g_100g=float(dados_ia.get("carboidrato_g_100g", 0) or 0),
-            lipidios_g_100g=float(dados_ia.get("lipidios_g_100g", 0) or 0),
-            fibra_g_100g=float(dados_ia.get("fibra_g_100g", 0) or 0),
-            # Outros campos com defaults 0
-            ac_graxos_saturados_g=float(dados_ia.get("ac_graxos_saturados_g", 0) or 0),
-            ac_graxos_monoinsaturados_g=float(dados_ia.get("ac_graxos_monoinsaturados_g", 0) or 0),
-            ac_graxos_poliinsaturados_g=float(dados_ia.get("ac_graxos_poliinsaturados_g", 0) or 0),
-            colesterol_mg_100g=float(dados_ia.get("colesterol_mg_100g", 0) or 0),
-            sodio_mg_100g=float(dados_ia.get("sodio_mg_100g", 0) or 0),
-            potassio_mg_100g=float(dados_ia.get("potassio_mg_100g", 0) or 0),
-            calcio_mg_100g=float(dados_ia.get("calcio_mg_100g", 0) or 0),
-            ferro_mg_100g=float(dados_ia.get("ferro_mg_100g", 0) or 0),
-            magnesio_mg_100g=float(dados_ia.get("magnesio_mg_100g", 0) or 0),
-            unidades=float(dados_ia.get("unidades", 1) or 1),
-            un_medida_caseira=dados_ia.get("un_medida_caseira"),
-            peso_aproximado_g=float(dados_ia.get("peso_aproximado_g", 100) or 100),
-        )
+    # 4️⃣ Insere todos os novos alimentos de uma vez
+    criados: List[Alimento] = []
+    if novos:
+        inseridos = _inserir_alimentos_em_lote(db, novos)
+        resolvidos.update(inseridos)
+        criados = [a for n, a in inseridos.items() if a is novos[n]]
+        logger.info(f"✅ {len(criados)} novo(s) alimento(s) criado(s) a partir do Gemini")
 
-        db.add(novo_alimento)
-        db.commit()
-        db.refresh(novo_alimento)
+    return resolvidos, criados
 
-        logger.info(f"✅ Novo alimento criado e salvo: '{nome}' (ID: {novo_alimento.id})")
-        return novo_alimento
 
-    except Exception as e:
-        logger.error(f"❌ Erro ao criar novo alimento '{nome}': {e}")
-        db.rollback()
+def get_or_create_alimento_by_nome(db: Session, nome: str) -> Optional[Alimento]:
+    """
+    Tenta encontrar um alimento na tabela 'alimentos' pelo nome normalizado.
+    Se não encontrar, chama o Gemini para gerar dados nutricionais e cria um novo registro.
+    """
+    if not nome:
         return None
 
+    logger.info(f"🔍 Procurando alimento: '{nome}'")
+    resolvidos, criados = resolver_alimentos_em_lote(db, [nome])
+    if criados:
+        try:
+            db.commit()
+        except Exception as e:
+            logger.error(f"❌ Erro ao criar novo alimento '{nome}': {e}")
+            db.rollback()
+            return None
+        # Os índices em memória precisam enxergar o novo alimento
+        _invalidar_indices_alimentos(criados)
+    return resolvidos.get(normalizar_nome_alimento(nome))
+
 # --- CRUD para Refeição Salva (VERSÃO ATUALIZADA) ---
 
 def create_refeicao_salva(db: Session,
                          refeicao_data: RefeicaoSalvaCreate,
-                         user_id: int) -> RefeicaoSalva:
+                         user_id: int,
+                         antes_de_consultar_gemini: Optional[Callable[[int], None]] = None) -> RefeicaoSalva:
     """
     Cria uma nova refeição salva com seus alimentos,
     vinculando cada alimento à tabela 'alimentos' (TACO + IA auto-aprendizagem).
 
-    Fluxo para cada alimento:
-    1. Procura na tabela 'alimentos' (TACO + já criados)
-    2. Se não achar, chama Gemini → cria novo registro em 'alimentos'
-    3. Salva AlimentoSalvo com alimento_id preenchido
+    Os nomes são resolvidos em lote (ver resolver_alimentos_em_lote):
+    1. Procura na tabela 'alimentos' (TACO + já criados) — busca exata + similaridade
+    2. Os que faltarem vão ao Gemini em paralelo → novos registros em 'alimentos'
+    3. Salva cada AlimentoSalvo com alimento_id preenchido, tudo em um único commit
+
+    'antes_de_consultar_gemini' é repassado a resolver_alimentos_em_lote (ex.: cobrar as chamadas ao modelo).
     """
     logger.info(f"🛠️ Criando refeição salva para user_id {user_id} com {len(refeicao_data.alimentos)} alimentos")
 
@@ -156,29 +301,28 @@ def create_refeicao_salva(db: Session,
     db.add(db_refeicao)
     db.flush()  # Gera o ID da refeição antes de inserir alimentos
 
-    # 2️⃣ Processa cada alimento detectado
-    alimentos_processados = []
-    for i, alimento_data in enumerate(refeicao_data.alimentos):
-        try:
-            # Pega os dados do Pydantic (v2 ou v1)
-            if hasattr(alimento_data, 'model_dump'):
-                payload = alimento_data.model_dump()
-            else:
-                payload = alimento_data.dict()
+    # Pega os dados do Pydantic (v2 ou v1)
+    payloads = [
+        alimento_data.model_dump() if hasattr(alimento_data, 'model_dump') else alimento_data.dict()
+        for alimento_data in refeicao_data.alimentos
+    ]
 
-            nome_alimento = payload.get("nome", "")
-            logger.info(f"  📋 Processando alimento {i+1}: '{nome_alimento}'")
+    # 2️⃣ Resolve todos os alimentos de uma vez (sem commits intermediários)
+    alimentos_resolvidos, alimentos_criados = resolver_alimentos_em_lote(
+        db, [payload.get("nome", "") for payload in payloads], antes_de_consultar_gemini
+    )
 
-            # 3️⃣ Tenta encontrar/criar o alimento na tabela 'alimentos'
-            alimento_registro = get_or_create_alimento_by_nome(db, nome_alimento)
+    # 3️⃣ Cria os AlimentoSalvo já amarrados ao alimento_id
+    alimentos_processados = []
+    for i, payload in enumerate(payloads):
+        nome_alimento = payload.get("nome", "")
+        try:
+            alimento_registro = alimentos_resolvidos.get(normalizar_nome_alimento(nome_alimento))
             alimento_id = alimento_registro.id if alimento_registro else None
 
             if not alimento_id:
                 logger.warning(f"  ⚠️ Não foi possível obter dados para '{nome_alimento}'. Salvando AlimentoSalvo sem vínculo com a tabela 'alimentos'.")
-            else:
-                logger.info(f"  ✅ Alimento vinculado (ID: {alimento_id})")
 
-            # 4️⃣ Cria o AlimentoSalvo já amarrado ao alimento_id
             db_alimento_salvo = AlimentoSalvo(
                 **payload,
                 refeicao_id=db_refeicao.id,
@@ -196,11 +340,15 @@ def create_refeicao_salva(db: Session,
             logger.error(f"❌ Erro ao processar alimento '{nome_alimento}': {e}")
             # Continua processando os outros alimentos mesmo se um falhar
 
-    # 5️⃣ Finaliza a transação
+    # 4️⃣ Finaliza a transação
     try:
         db.commit()
         db.refresh(db_refeicao)
 
+        if alimentos_criados:
+            # Os índices em memória precisam enxergar os novos alimentos
+            _invalidar_indices_alimentos(alimentos_criados)
+
         logger.info(f"✅ Refeição salva criada (ID: {db_refeicao.id}) com {len(alimentos_processados)} alimentos processados")
         for alimento in alimentos_processados:
             status = "vinculado" if alimento["alimento_id"] else "sem vínculo"
@@ -235,11 +383,56 @@ def update_refeicao_status(db: Session, db_refeicao: RefeicaoSalva, status: Refe
     db.refresh(db_refeicao)
     return db_refeicao
 
-def get_historico_refeicoes_por_usuario(db: Session, user_id: int) -> List[RefeicaoSalva]:
-    """Busca todas as refeições de um usuário para a lista de histórico."""
-    return db.query(RefeicaoSalva).filter(
-        RefeicaoSalva.owner_id == user_id
-    ).order_by(RefeicaoSalva.created_at.desc()).all()
+def codificar_cursor_historico(created_at: datetime, meal_id: int, pagina: int) -> str:
+    """Cursor opaco da próxima página: posição (created_at, id) do último item + número da página."""
+    dados = json.dumps({"c": created_at.isoformat(), "i": meal_id, "p": pagina}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(dados.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor_historico(cursor: str) -> Tuple[datetime, int, int]:
+    """Inverso de codificar_cursor_historico. Levanta ValueError para cursores inválidos."""
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(dados["c"]), int(dados["i"]), int(dados["p"])
+    except Exception as e:
+        raise ValueError("Cursor de paginação inválido.") from e
+
+
+def get_historico_refeicoes_por_usuario(
+    db: Session, user_id: int, limit: int = 20, cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str], int]:
+    """
+    Uma página do histórico do usuário, da refeição mais recente para a mais antiga.
+
+    Paginação por cursor (keyset) sobre (created_at, id), servida pelo índice
+    ix_refeicoes_salvas_owner_created_id: o custo de cada página não depende do
+    tamanho do histórico. Só as colunas do RefeicaoHistoricoItem são lidas
+    (nada do analysis_result_json).
+
+    Retorna (linhas, cursor da próxima página ou None, número desta página).
+    """
+    pagina = 1
+    consulta = (
+        select(RefeicaoSalva.id, RefeicaoSalva.created_at, RefeicaoSalva.imagem_url, RefeicaoSalva.total_calorias)
+        .where(RefeicaoSalva.owner_id == user_id)
+        .order_by(RefeicaoSalva.created_at.desc(), RefeicaoSalva.id.desc())
+        .limit(limit + 1)  # um a mais só para saber se existe próxima página
+    )
+    if cursor:
+        created_at, meal_id, pagina = decodificar_cursor_historico(cursor)
+        consulta = consulta.where(tuple_(RefeicaoSalva.created_at, RefeicaoSalva.id) < (created_at, meal_id))
+
+    linhas = db.execute(consulta).all()
+    proximo_cursor = None
+    if len(linhas) > limit:
+        linhas = linhas[:limit]
+        proximo_cursor = codificar_cursor_historico(linhas[-1].created_at, linhas[-1].id, pagina + 1)
+    return linhas, proximo_cursor, pagina
+
+
+def contar_refeicoes_por_usuario(db: Session, user_id: int) -> int:
+    """Total de refeições do usuário (contagem só no índice de owner_id)."""
+    return db.query(func.count(RefeicaoSalva.id)).filter(RefeicaoSalva.owner_id == user_id).scalar() or 0
 
 def get_detalhe_refeicao_por_id(db: Session, meal_id: int, user_id: int) -> Optional[RefeicaoSalva]:
     """
@@ -253,140 +446,183 @@ def get_detalhe_refeicao_por_id(db: Session, meal_id: int, user_id: int) -> Opti
         joinedload(RefeicaoSalva.alimentos).joinedload(AlimentoSalvo.alimento_detalhes)
     ).first()
 
-def get_consumo_macros_hoje(db: Session, user_id: int) -> dict:
-    """Soma o total de calorias, proteínas, carboidratos e gorduras de todas as refeições de hoje."""
-    hoje = date.today()
-
-    refeicoes_hoje = (
-        db.query(RefeicaoSalva)
-        .filter(
-            RefeicaoSalva.owner_id == user_id,
-            func.date(RefeicaoSalva.created_at) == hoje
-        )
-        .all()
-    )
+# --- TOTAIS NUMÉRICOS DA ANÁLISE E AGREGADO DIÁRIO ---
 
-    total_calorias = 0.0
-    total_proteinas_g = 0.0
-    total_carboidratos_g = 0.0
-    total_gorduras_g = 0.0
+CAMPOS_TOTAIS = ("total_calorias", "total_proteinas_g", "total_carboidratos_g", "total_gorduras_g")
 
-    for refeicao in refeicoes_hoje:
-        if refeicao.analysis_result_json:
-            try:
-                analise = json.loads(refeicao.analysis_result_json)
 
-                analise_nutricional = analise.get("analise_nutricional", {})
-                macros = analise_nutricional.get("macronutrientes", {})
+def extrair_totais_analise(analise: Dict[str, Any]) -> Dict[str, float]:
+    """Lê calorias e macros do dict da análise detalhada (formato de AnaliseCompletaResponseSchema)."""
+    analise_nutricional = analise.get("analise_nutricional") or {}
+    macros = analise_nutricional.get("macronutrientes") or {}
+    return {
+        "total_calorias": float(analise_nutricional.get("calorias_totais") or 0),
+        "total_proteinas_g": float(macros.get("proteinas_g") or 0),
+        "total_carboidratos_g": float(macros.get("carboidratos_g") or 0),
+        "total_gorduras_g": float(macros.get("gorduras_g") or 0),
+    }
 
-                total_calorias += analise_nutricional.get("calorias_totais", 0)
-                total_proteinas_g += macros.get("proteinas_g", 0)
-                total_carboidratos_g += macros.get("carboidratos_g", 0)
-                total_gorduras_g += macros.get("gorduras_g", 0)
 
-            except Exception as e:
-                print(f"Erro ao processar JSON da refeição ID {refeicao.id}: {e}")
+def dia_da_refeicao(refeicao: RefeicaoSalva) -> date:
+    """Dia (calendário de São Paulo) ao qual a refeição pertence; mesmo critério de get_resumo_refeicoes_hoje."""
+    if refeicao.created_at is None:
+        return datetime.now(ZoneInfo('America/Sao_Paulo')).date()
+    return refeicao.created_at.date()
 
-    return {
-        "total_calorias": round(total_calorias, 1),
-        "total_proteinas_g": round(total_proteinas_g, 1),
-        "total_carboidratos_g": round(total_carboidratos_g, 1),
-        "total_gorduras_g": round(total_gorduras_g, 1)
-    }
 
-def get_refeicoes_hoje_por_usuario(db: Session, user_id: int) -> List[RefeicaoSalva]:
+def somar_consumo_diario(db: Session, user_id: int, dia: date, delta: Dict[str, float], refeicoes: int) -> None:
     """
-    Busca todas as refeições do usuário de hoje
-    que já tiveram a análise concluída.
+    Soma 'delta' aos totais do dia do usuário, criando a linha se ainda não existir.
+    O incremento é feito pelo banco (total = total + delta), então análises simultâneas
+    de refeições diferentes não se sobrescrevem. Não faz commit.
     """
-    today = datetime.now(ZoneInfo('America/Sao_Paulo')).date()
+    valores = {campo: delta.get(campo, 0.0) for campo in CAMPOS_TOTAIS}
+    valores["refeicoes_analisadas"] = refeicoes
+
+    if db.get_bind().dialect.name == "postgresql":
+        insercao = postgresql.insert(ConsumoDiario).values(owner_id=user_id, dia=dia, **valores)
+        db.execute(insercao.on_conflict_do_update(
+            index_elements=[ConsumoDiario.owner_id, ConsumoDiario.dia],
+            set_={
+                **{campo: getattr(ConsumoDiario, campo) + getattr(insercao.excluded, campo) for campo in valores},
+                "updated_at": func.now(),
+            },
+        ))
+        return
+
+    incrementos = {getattr(ConsumoDiario, campo): getattr(ConsumoDiario, campo) + valor for campo, valor in valores.items()}
+    filtro = (ConsumoDiario.owner_id == user_id, ConsumoDiario.dia == dia)
+    if db.query(ConsumoDiario).filter(*filtro).update(incrementos, synchronize_session=False):
+        return
+    try:
+        with db.begin_nested():
+            db.add(ConsumoDiario(owner_id=user_id, dia=dia, **valores))
+            db.flush()
+    except IntegrityError:
+        # Outra requisição criou a linha entre o UPDATE e o INSERT
+        db.query(ConsumoDiario).filter(*filtro).update(incrementos, synchronize_session=False)
 
-    return db.query(RefeicaoSalva).filter(
-        RefeicaoSalva.owner_id == user_id,
-        cast(RefeicaoSalva.created_at, Date) == today,
-        RefeicaoSalva.status == RefeicaoStatus.ANALYSIS_COMPLETE
-    ).order_by(RefeicaoSalva.created_at.asc()).all()
 
-def enriquecer_refeicao_com_analise(refeicao: RefeicaoSalva) -> dict:
+def registrar_totais_refeicao(db: Session, db_refeicao: RefeicaoSalva, analise: Dict[str, Any]) -> None:
     """
-    Extrai dados da análise JSON e dos alimentos salvos
-    para enriquecer a resposta do dashboard.
-
-    🔹 NOVO: Se tiver alimento_id, pode acessar dados mais precisos da tabela 'alimentos'
+    Grava os totais da análise nas colunas da refeição e atualiza o consumo_diario
+    do dono, na transação corrente (o chamador faz o commit junto com o JSON da análise).
+    Numa reanálise, soma só a diferença em relação aos totais anteriores.
     """
-    resultado = {
-        "id": refeicao.id,
-        "tipo": None,
-        "kcal_estimadas": None,
-        "imagem_url": refeicao.imagem_url,
-        "proteinas_g": None,
-        "carboidratos_g": None,
-        "gorduras_g": None,
-        "suggested_name": None,
-        "alimentos_principais": [],
-        # 🔹 NOVO: Informações sobre vínculo com tabela alimentos
-        "alimentos_vinculados": 0,
-        "alimentos_sem_vinculo": 0
-    }
+    # Relê os totais anteriores com lock da linha: reanálises simultâneas da mesma refeição não contam em dobro
+    db.refresh(db_refeicao, attribute_names=list(CAMPOS_TOTAIS), with_for_update=True)
+    ja_contabilizada = db_refeicao.total_calorias is not None
 
-    # 1️⃣ Extrair dados da análise JSON (se existir) - MANTIDO
-    if refeicao.analysis_result_json:
-        try:
-            analise = json.loads(refeicao.analysis_result_json)
+    novos = extrair_totais_analise(analise)
+    delta = {campo: novos[campo] - (getattr(db_refeicao, campo) or 0.0) for campo in CAMPOS_TOTAIS}
+    for campo, valor in novos.items():
+        setattr(db_refeicao, campo, valor)
 
-            # Extrair calorias
-            analise_nutricional = analise.get("analise_nutricional", {})
-            resultado["kcal_estimadas"] = analise_nutricional.get("calorias_totais")
+    somar_consumo_diario(db, db_refeicao.owner_id, dia_da_refeicao(db_refeicao), delta, 0 if ja_contabilizada else 1)
 
-            # Extrair macros
-            macros = analise_nutricional.get("macronutrientes", {})
-            resultado["proteinas_g"] = macros.get("proteinas_g")
-            resultado["carboidratos_g"] = macros.get("carboidratos_g")
-            resultado["gorduras_g"] = macros.get("gorduras_g")
 
-        except Exception as e:
-            print(f"Erro ao processar JSON da refeição ID {refeicao.id}: {e}")
-
-    # 2️⃣ Extrair lista de alimentos principais E contar vínculos - ATUALIZADO
-    if refeicao.alimentos:
-        alimentos_vinculados = 0
-        alimentos_sem_vinculo = 0
-
-        # Pega os 3 primeiros alimentos para o nome sugerido
-        alimentos_principais = []
-        for alimento in refeicao.alimentos[:3]:
-            alimentos_principais.append(alimento.nome)
-
-            # Conta vínculos com tabela alimentos
-            if alimento.alimento_id:
-                alimentos_vinculados += 1
-            else:
-                alimentos_sem_vinculo += 1
-
-        resultado["alimentos_principais"] = alimentos_principais
-        resultado["alimentos_vinculados"] = alimentos_vinculados
-        resultado["alimentos_sem_vinculo"] = alimentos_sem_vinculo
-
-        # Gera um nome sugerido baseado nos alimentos
-        if len(alimentos_principais) > 0:
-            if len(alimentos_principais) == 1:
-                resultado["suggested_name"] = alimentos_principais[0]
-            elif len(alimentos_principais) == 2:
-                resultado["suggested_name"] = f"{alimentos_principais[0]} e {alimentos_principais[1]}"
-            else:
-                resultado["suggested_name"] = f"{alimentos_principais[0]}, {alimentos_principais[1]} e mais"
-
-    # 3️⃣ Inferir tipo de refeição baseado no horário - MANTIDO
-    hora_criacao = refeicao.created_at.hour
+def get_consumo_macros_hoje(db: Session, user_id: int) -> dict:
+    """Totais de calorias e macros de hoje: leitura da linha do usuário em consumo_diario."""
+    hoje = datetime.now(ZoneInfo('America/Sao_Paulo')).date()
+    consumo = db.get(ConsumoDiario, (user_id, hoje))
+
+    return {
+        campo: round(getattr(consumo, campo), 1) if consumo else 0.0
+        for campo in CAMPOS_TOTAIS
+    }
+
+def _intervalo_de_hoje() -> Tuple[datetime, datetime]:
+    """[início, fim) do dia de hoje em São Paulo, no mesmo formato (sem fuso) de created_at."""
+    hoje = datetime.now(ZoneInfo('America/Sao_Paulo')).date()
+    inicio = datetime.combine(hoje, datetime.min.time())
+    return inicio, inicio + timedelta(days=1)
+
+
+def _tipo_refeicao_pelo_horario(criada_em: datetime) -> str:
+    hora_criacao = criada_em.hour
     if 5 <= hora_criacao < 11:
-        resultado["tipo"] = "Café da Manhã"
-    elif 11 <= hora_criacao < 15:
-        resultado["tipo"] = "Almoço"
-    elif 15 <= hora_criacao < 18:
-        resultado["tipo"] = "Lanche da Tarde"
-    elif 18 <= hora_criacao < 23:
-        resultado["tipo"] = "Jantar"
-    else:
-        resultado["tipo"] = "Lanche da Madrugada"
-
-    return resultado
+        return "Café da Manhã"
+    if 11 <= hora_criacao < 15:
+        return "Almoço"
+    if 15 <= hora_criacao < 18:
+        return "Lanche da Tarde"
+    if 18 <= hora_criacao < 23:
+        return "Jantar"
+    return "Lanche da Madrugada"
+
+
+def _nome_sugerido(alimentos_principais: List[str]) -> Optional[str]:
+    if not alimentos_principais:
+        return None
+    if len(alimentos_principais) == 1:
+        return alimentos_principais[0]
+    if len(alimentos_principais) == 2:
+        return f"{alimentos_principais[0]} e {alimentos_principais[1]}"
+    return f"{alimentos_principais[0]}, {alimentos_principais[1]} e mais"
+
+
+def get_resumo_refeicoes_hoje(db: Session, user_id: int) -> List[Dict[str, Any]]:
+    """
+    Refeições de hoje (análise concluída) para o dashboard, numa única consulta:
+    totais pelas colunas da refeição e, por uma subconsulta com funções de janela
+    sobre alimentos_salvos, os 3 primeiros alimentos e a contagem de vínculos
+    com a tabela 'alimentos'. Sem lazy load por refeição e sem ler o JSON da análise.
+    """
+    inicio, fim = _intervalo_de_hoje()
+    filtro_hoje = (
+        RefeicaoSalva.owner_id == user_id,
+        RefeicaoSalva.created_at >= inicio,
+        RefeicaoSalva.created_at < fim,
+        RefeicaoSalva.status == RefeicaoStatus.ANALYSIS_COMPLETE,
+    )
+
+    por_refeicao = {"partition_by": AlimentoSalvo.refeicao_id}
+    alimentos = select(
+        AlimentoSalvo.refeicao_id,
+        AlimentoSalvo.nome,
+        func.row_number().over(order_by=AlimentoSalvo.id, **por_refeicao).label("posicao"),
+        func.count(AlimentoSalvo.alimento_id).over(**por_refeicao).label("vinculados"),
+        func.count().over(**por_refeicao).label("quantidade"),
+    ).where(
+        AlimentoSalvo.refeicao_id.in_(select(RefeicaoSalva.id).where(*filtro_hoje))
+    ).subquery()
+
+    linhas = db.execute(
+        select(
+            RefeicaoSalva.id,
+            RefeicaoSalva.created_at,
+            RefeicaoSalva.imagem_url,
+            *(getattr(RefeicaoSalva, campo) for campo in CAMPOS_TOTAIS),
+            alimentos.c.nome,
+            alimentos.c.vinculados,
+            alimentos.c.quantidade,
+        )
+        .outerjoin(alimentos, (alimentos.c.refeicao_id == RefeicaoSalva.id) & (alimentos.c.posicao <= 3))
+        .where(*filtro_hoje)
+        .order_by(RefeicaoSalva.created_at.asc(), RefeicaoSalva.id.asc(), alimentos.c.posicao.asc())
+    ).all()
+
+    # Até 3 linhas por refeição (uma por alimento principal), já na ordem da resposta
+    resumos: Dict[int, Dict[str, Any]] = {}
+    for linha in linhas:
+        resumo = resumos.get(linha.id)
+        if resumo is None:
+            resumo = resumos[linha.id] = {
+                "id": linha.id,
+                "tipo": _tipo_refeicao_pelo_horario(linha.created_at),
+                "kcal_estimadas": linha.total_calorias,
+                "imagem_url": linha.imagem_url,
+                "proteinas_g": linha.total_proteinas_g,
+                "carboidratos_g": linha.total_carboidratos_g,
+                "gorduras_g": linha.total_gorduras_g,
+                "suggested_name": None,
+                "alimentos_principais": [],
+                "alimentos_vinculados": linha.vinculados or 0,
+                "alimentos_sem_vinculo": (linha.quantidade or 0) - (linha.vinculados or 0),
+            }
+        if linha.nome is not None:
+            resumo["alimentos_principais"].append(linha.nome)
+
+    for resumo in resumos.values():
+        resumo["suggested_name"] = _nome_sugerido(resumo["alimentos_principais"])
+    return list(resumos.values())
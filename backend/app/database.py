@@ -1,10 +1,42 @@
-# app/database.py - VERSÃO SIMPLIFICADA
+# app/database.py
+#
+# Engine e sessões do SQLAlchemy. criar_engine monta o engine a partir das
+# configurações DB_* (app/config.py):
+#
+# - pool: tamanho, overflow, timeout do checkout e reciclagem. Sem pre_ping por
+#   padrão (um SELECT 1 a mais em cada checkout); DB_POOL_RECYCLE_SEGUNDOS abaixo
+#   do autosuspend do Neon já descarta as conexões que atravessariam uma suspensão.
+# - statement_timeout e application_name enviados na abertura da conexão.
+# - pooler em modo transação (PgBouncer/pooler do Neon, host "...-pooler..."):
+#   cada transação pode cair numa conexão diferente do servidor, então nada de
+#   prepared statements nomeados nem parâmetros de sessão na conexão
+#   (statement_timeout fica para o papel: ALTER ROLE ... SET statement_timeout).
+#
+# estatisticas_pool() mostra a ocupação e a espera no checkout (também em
+# /metrics e /debug/db-pool) para dimensionar o pool com dados.
+#
+# Engine assíncrono (asyncpg; aiosqlite no SQLite de desenvolvimento) para as
+# rotas de leitura: get_async_db entrega uma AsyncSession e as rotas reaproveitam
+# as funções síncronas do crud com AsyncSession.run_sync (mesmo SQL; a espera
+# pela rede acontece no event loop, sem ocupar uma thread do threadpool).
 
+import logging
 import os
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 
+from app import perfil_sql
+from app.config import settings
+from app.metricas import AsyncQueuePoolMedido, QueuePoolMedido, instrumentar_engine
+
+logger = logging.getLogger(__name__)
+
 # Para desenvolvimento local, carregar .env
 if os.environ.get('APP_ENV') == 'development':
     from dotenv import load_dotenv
@@ -12,20 +44,130 @@ if os.environ.get('APP_ENV') == 'development':
 
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
-# ✅ SOLUÇÃO SIMPLES: Neon.tech geralmente funciona sem config SSL explícita
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-    # ✅ REMOVA completamente connect_args para Neon.tech
-)
+
+def usa_pooler_transacao(url: URL) -> bool:
+    """DB_POOLER_TRANSACAO=true/false, ou 'auto': hosts de pooler do Neon têm '-pooler' no nome."""
+    if settings.DB_POOLER_TRANSACAO in ("true", "false"):
+        return settings.DB_POOLER_TRANSACAO == "true"
+    return "-pooler" in (url.host or "")
+
+
+def argumentos_conexao(url: URL, pooler: bool) -> Dict[str, Any]:
+    """connect_args do driver (psycopg2, psycopg ou asyncpg) para o modo de conexão."""
+    if url.get_backend_name() != "postgresql":
+        return {}
+    timeout_ms = settings.DB_STATEMENT_TIMEOUT_MS
+
+    if url.get_driver_name() == "asyncpg":
+        parametros = {"application_name": settings.DB_APPLICATION_NAME}
+        if timeout_ms and not pooler:
+            parametros["statement_timeout"] = str(timeout_ms)
+        argumentos: Dict[str, Any] = {"server_settings": parametros}
+        if pooler:
+            # Sem cache de prepared statements (asyncpg e SQLAlchemy) e com nomes únicos
+            # para os que o asyncpg ainda prepara: o próximo uso pode ser em outra conexão
+            argumentos.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+            )
+        return argumentos
+
+    argumentos = {"application_name": settings.DB_APPLICATION_NAME}
+    if timeout_ms and not pooler:
+        argumentos["options"] = f"-c statement_timeout={timeout_ms}"
+    if pooler and url.get_driver_name() == "psycopg":
+        # psycopg 3 prepara consultas repetidas no servidor; o psycopg2 nunca prepara
+        argumentos["prepare_threshold"] = None
+    return argumentos
+
+
+def opcoes_engine(url: URL, pool_size: Optional[int] = None, max_overflow: Optional[int] = None) -> Dict[str, Any]:
+    """Argumentos de create_engine/create_async_engine (pool + connect_args)."""
+    pooler = usa_pooler_transacao(url)
+    opcoes: Dict[str, Any] = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SEGUNDOS,
+        "connect_args": argumentos_conexao(url, pooler),
+    }
+    if url.get_backend_name() != "sqlite":
+        opcoes.update(
+            pool_size=settings.DB_POOL_SIZE if pool_size is None else pool_size,
+            max_overflow=settings.DB_MAX_OVERFLOW if max_overflow is None else max_overflow,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SEGUNDOS,
+        )
+    return opcoes
+
+
+def criar_engine(url: Optional[str] = None) -> Engine:
+    """Engine síncrono instrumentado (métricas e perfil SQL)."""
+    url = make_url(url or DATABASE_URL)
+    opcoes = opcoes_engine(url)
+    novo = create_engine(url, poolclass=QueuePoolMedido, **opcoes)  # ✅ mede a espera no checkout (métricas)
+    instrumentar_engine(novo)
+    perfil_sql.instrumentar_engine(novo)
+    if url.get_backend_name() == "postgresql":
+        logger.info(
+            f"🗄️ Engine {url.get_driver_name()} em {url.host}: pool {settings.DB_POOL_SIZE}+{settings.DB_MAX_OVERFLOW}, "
+            f"timeout {settings.DB_POOL_TIMEOUT_SEGUNDOS}s, pooler em modo transação: "
+            f"{'sim' if usa_pooler_transacao(url) else 'não'}"
+        )
+        if usa_pooler_transacao(url) and settings.DB_STATEMENT_TIMEOUT_MS:
+            logger.info("ℹ️ Com o pooler em modo transação, o statement_timeout deve ser definido no papel do banco.")
+    return novo
+
+
+def url_assincrona(url: URL) -> URL:
+    """A mesma URL no driver assíncrono (postgresql -> asyncpg, sqlite -> aiosqlite)."""
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    if url.get_backend_name() != "postgresql":
+        return url
+    query = dict(url.query)
+    # Parâmetros da URL do Neon no formato libpq, que o asyncpg não reconhece
+    sslmode = query.pop("sslmode", None)
+    query.pop("channel_binding", None)
+    if sslmode and "ssl" not in query:
+        query["ssl"] = sslmode
+    return url.set(drivername="postgresql+asyncpg", query=query)
+
+
+def criar_engine_assincrono(url: Optional[str] = None) -> AsyncEngine:
+    """Engine assíncrono instrumentado; os eventos ficam no sync_engine."""
+    url = url_assincrona(make_url(url or DATABASE_URL))
+    opcoes = opcoes_engine(url, pool_size=settings.DB_ASYNC_POOL_SIZE, max_overflow=settings.DB_ASYNC_MAX_OVERFLOW)
+    novo = create_async_engine(url, poolclass=AsyncQueuePoolMedido, **opcoes)
+    instrumentar_engine(novo.sync_engine)
+    perfil_sql.instrumentar_engine(novo.sync_engine)
+    return novo
+
+
+engine = criar_engine()
+async_engine = criar_engine_assincrono()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: objetos lidos continuam acessíveis fora do greenlet da sessão
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
+
+def estatisticas_pool() -> Dict[str, Any]:
+    return engine.pool.estatisticas()
+
+
+def estatisticas_pool_assincrono() -> Dict[str, Any]:
+    return async_engine.pool.estatisticas()
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """Dependência das rotas de leitura (AsyncSession)."""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,7 +1,11 @@
+from google.api_core.exceptions import NotFound, PreconditionFailed
 from google.cloud import storage
+from typing import Optional
 import os
 from dotenv import load_dotenv
 
+from app.metricas import medir_upload_gcs
+
 # 🚀 Carrega variáveis do .env apenas se estiver rodando localmente
 load_dotenv()
 
@@ -48,7 +52,8 @@ def upload_to_gcs(bucket_name: str, file_bytes: bytes,
         blob = bucket.blob(destination_blob_name)
 
         print("📤 Fazendo upload para o bucket...")
-        blob.upload_from_string(file_bytes, content_type=content_type)
+        with medir_upload_gcs(len(file_bytes)):
+            blob.upload_from_string(file_bytes, content_type=content_type)
 
         # ⚠️ Não use make_public() — UBLA proíbe ACLs individuais
         url = blob.public_url
@@ -58,3 +63,37 @@ def upload_to_gcs(bucket_name: str, file_bytes: bytes,
     except Exception as e:
         print(f"❌ ERRO no upload GCS: {e}")
         raise
+
+
+def promover_blob_gcs(
+    bucket_name: str, origem_blob_name: str, destino_blob_name: str, geracao: Optional[int] = None
+) -> Optional[str]:
+    """
+    Copia um objeto dentro do bucket (sem trafegar os bytes pela API), apaga a origem e retorna a URL pública.
+    Com 'geracao', só a primeira promoção daquela versão da origem vence: as demais (ex.: envio duplo)
+    desfazem a cópia e retornam None, assim como uma origem que já não existe.
+    """
+    client = get_storage_client()
+    bucket = client.bucket(bucket_name)
+    origem = bucket.blob(origem_blob_name)
+    try:
+        destino = bucket.copy_blob(origem, bucket, destino_blob_name, source_generation=geracao)
+    except NotFound:
+        return None
+    try:
+        origem.delete(if_generation_match=geracao)
+    except (NotFound, PreconditionFailed):
+        # Outra requisição promoveu (e apagou) a mesma origem primeiro
+        try:
+            destino.delete()
+        except NotFound:
+            pass
+        return None
+    print(f"✅ Objeto promovido: {origem_blob_name} -> {destino_blob_name}")
+    return destino.public_url
+
+
+def listar_blobs_gcs(bucket_name: str, prefixo: str) -> list:
+    """Lista os objetos de um prefixo (com metadados como time_created)."""
+    client = get_storage_client()
+    return list(client.list_blobs(bucket_name, prefix=prefixo))
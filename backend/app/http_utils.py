@@ -0,0 +1,106 @@
+# app/http_utils.py
+#
+# Cliente HTTP assíncrono compartilhado para as chamadas REST externas (IA).
+# Criado no startup da aplicação e fechado no shutdown: mantém conexões
+# keep-alive (sem novo handshake TLS por chamada), usa HTTP/2 quando o pacote
+# 'h2' está instalado, limita a concorrência e repete falhas transitórias
+# com backoff exponencial e jitter.
+
+import asyncio
+import random
+import logging
+from typing import Optional
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Respostas que valem uma nova tentativa (limite de taxa / indisponibilidade)
+STATUS_REPETIVEIS = {429, 500, 502, 503, 504}
+
+try:
+    import h2  # noqa: F401  (habilita HTTP/2 no httpx)
+    HTTP2_DISPONIVEL = True
+except ImportError:
+    HTTP2_DISPONIVEL = False
+
+_cliente: Optional[httpx.AsyncClient] = None
+_semaforo: Optional[asyncio.Semaphore] = None
+
+
+def _criar_cliente() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2_DISPONIVEL,
+        timeout=httpx.Timeout(settings.HTTP_TIMEOUT_SEGUNDOS, connect=settings.HTTP_TIMEOUT_CONEXAO_SEGUNDOS),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONEXOES,
+            max_keepalive_connections=settings.HTTP_MAX_CONEXOES_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_SEGUNDOS,
+        ),
+    )
+
+
+async def iniciar_cliente_http() -> None:
+    """Cria o cliente do processo (chamado no startup da aplicação)."""
+    global _cliente, _semaforo
+    if _cliente is None:
+        _cliente = _criar_cliente()
+        _semaforo = asyncio.Semaphore(settings.HTTP_MAX_CONCORRENCIA)
+        logger.info(f"🌐 Cliente HTTP compartilhado criado (HTTP/2: {'sim' if HTTP2_DISPONIVEL else 'não'}).")
+
+
+def get_cliente_http() -> httpx.AsyncClient:
+    """Retorna o cliente compartilhado (criado sob demanda fora do ciclo de vida do app, ex.: scripts)."""
+    global _cliente, _semaforo
+    if _cliente is None:
+        _cliente = _criar_cliente()
+        _semaforo = asyncio.Semaphore(settings.HTTP_MAX_CONCORRENCIA)
+    return _cliente
+
+
+async def fechar_cliente_http() -> None:
+    """Fecha as conexões do pool (chamado no shutdown da aplicação)."""
+    global _cliente, _semaforo
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
+        _semaforo = None
+
+
+def _espera_backoff(tentativa: int, resposta: Optional[httpx.Response]) -> float:
+    """Backoff exponencial com 'full jitter'; respeita Retry-After (em segundos) quando enviado."""
+    if resposta is not None:
+        retry_after = resposta.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), settings.HTTP_BACKOFF_MAX_SEGUNDOS)
+    teto = min(settings.HTTP_BACKOFF_MAX_SEGUNDOS, settings.HTTP_BACKOFF_BASE_SEGUNDOS * (2 ** tentativa))
+    return random.uniform(0, teto)
+
+
+async def requisicao_http(metodo: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Faz a requisição pelo cliente compartilhado, com no máximo HTTP_MAX_CONCORRENCIA
+    chamadas simultâneas e até HTTP_TENTATIVAS tentativas para erros de rede,
+    timeouts e status em STATUS_REPETIVEIS. Levanta httpx.HTTPError se todas falharem.
+    """
+    cliente = get_cliente_http()
+    tentativas = max(1, settings.HTTP_TENTATIVAS)
+    for tentativa in range(tentativas):
+        resposta = None
+        try:
+            async with _semaforo:
+                resposta = await cliente.request(metodo, url, **kwargs)
+            if resposta.status_code not in STATUS_REPETIVEIS:
+                resposta.raise_for_status()
+                return resposta
+            if tentativa == tentativas - 1:
+                resposta.raise_for_status()
+        except httpx.TransportError as e:  # inclui timeouts
+            if tentativa == tentativas - 1:
+                raise
+            logger.warning(f"⚠️ Falha de rede em {metodo} {url.split('?')[0]} ({e.__class__.__name__}); nova tentativa.")
+
+        await asyncio.sleep(_espera_backoff(tentativa, resposta))
+    raise RuntimeError("Tentativas esgotadas")
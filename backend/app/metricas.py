@@ -0,0 +1,272 @@
+# app/metricas.py
+#
+# Métricas Prometheus do processo, expostas em /metrics (main.py).
+#
+# - HTTP: latência por rota (template, ex.: /api/v1/refeicoes/detalhe/{meal_id}),
+#   requisições em andamento e consultas SQL por requisição (MiddlewareMetricas).
+# - Gemini: latência, tokens e erros por função de app/vision.py (medir_gemini).
+# - GCS: bytes e latência dos uploads (upload_to_gcs).
+# - Banco: consultas executadas e espera no checkout do pool (instrumentar_engine).
+# - Contadores já existentes (cache do scan, cache do principal, Gemini de
+#   alimentos, fila de análises), lidos na hora do scrape.
+#
+# Tudo é contador/histograma em memória (sem I/O no caminho da requisição);
+# o custo por requisição é de alguns microssegundos.
+
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.perfil_sql import medir_consultas
+
+logger = logging.getLogger(__name__)
+
+ROTA_DESCONHECIDA = "<sem_rota>"
+
+HTTP_SEGUNDOS = Histogram(
+    "nutriscan_http_requisicao_segundos", "Latência das requisições HTTP por rota",
+    ["metodo", "rota", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+HTTP_EM_ANDAMENTO = Gauge(
+    "nutriscan_http_requisicoes_em_andamento", "Requisições HTTP em andamento", ["metodo"]
+)
+HTTP_CONSULTAS_SQL = Histogram(
+    "nutriscan_http_consultas_sql", "Consultas SQL executadas por requisição", ["rota"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+
+SQL_CONSULTAS = Counter("nutriscan_sql_consultas_total", "Consultas SQL executadas")
+POOL_TIMEOUTS = Counter("nutriscan_db_pool_timeouts_total", "Checkouts que esgotaram DB_POOL_TIMEOUT_SEGUNDOS")
+POOL_CHECKOUT_SEGUNDOS = Histogram(
+    "nutriscan_db_pool_checkout_segundos", "Espera para obter uma conexão do pool (inclui abrir conexão nova)",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+GEMINI_SEGUNDOS = Histogram(
+    "nutriscan_gemini_chamada_segundos", "Latência das chamadas ao Gemini", ["funcao"],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60),
+)
+GEMINI_TOKENS = Counter("nutriscan_gemini_tokens_total", "Tokens consumidos no Gemini", ["funcao", "tipo"])
+GEMINI_ERROS = Counter("nutriscan_gemini_erros_total", "Chamadas ao Gemini com erro", ["funcao", "erro"])
+
+GCS_UPLOAD_SEGUNDOS = Histogram(
+    "nutriscan_gcs_upload_segundos", "Latência dos uploads para o GCS",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+GCS_UPLOAD_BYTES = Counter("nutriscan_gcs_upload_bytes_total", "Bytes enviados ao GCS")
+GCS_UPLOAD_ERROS = Counter("nutriscan_gcs_upload_erros_total", "Uploads para o GCS com erro")
+
+LIMITE_TAXA_RECUSADAS = Counter(
+    "nutriscan_limite_taxa_recusadas_total", "Requisições recusadas pelo limite de taxa (429)", ["balde"]
+)
+
+
+# --- Banco -----------------------------------------------------------------
+
+def _ao_executar_consulta(conn, cursor, statement, parameters, context, executemany) -> None:
+    SQL_CONSULTAS.inc()
+
+
+class _CheckoutMedido:
+    """Mixin de pool: registra o tempo de espera de cada checkout (histograma e totais em estatisticas())."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock_medicao = threading.Lock()
+        self.checkouts = 0
+        self.segundos_espera = 0.0
+        self.espera_maxima = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        esgotou = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            esgotou = True
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            POOL_CHECKOUT_SEGUNDOS.observe(espera)
+            with self._lock_medicao:
+                self.checkouts += 1
+                self.segundos_espera += espera
+                self.espera_maxima = max(self.espera_maxima, espera)
+                if esgotou:
+                    self.timeouts += 1
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Ocupação atual e espera acumulada no checkout, para dimensionar DB_POOL_SIZE/DB_MAX_OVERFLOW."""
+        with self._lock_medicao:
+            checkouts, segundos, maxima, timeouts = self.checkouts, self.segundos_espera, self.espera_maxima, self.timeouts
+        return {
+            "tamanho": self.size(),
+            "capacidade": self.size() + self._max_overflow,
+            "em_uso": self.checkedout(),
+            "ociosas": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": checkouts,
+            "espera_media_ms": round(segundos / checkouts * 1000, 3) if checkouts else 0.0,
+            "espera_max_ms": round(maxima * 1000, 3),
+            "timeouts": timeouts,
+        }
+
+
+class QueuePoolMedido(_CheckoutMedido, QueuePool):
+    """QueuePool do engine síncrono."""
+
+
+class AsyncQueuePoolMedido(_CheckoutMedido, AsyncAdaptedQueuePool):
+    """Pool do engine assíncrono (asyncpg/aiosqlite)."""
+
+
+def instrumentar_engine(engine) -> None:
+    """Conta as consultas executadas pelo engine (as por requisição vêm de app/perfil_sql.py)."""
+    event.listen(engine, "before_cursor_execute", _ao_executar_consulta)
+
+
+# --- HTTP -----------------------------------------------------------------
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI (sem BaseHTTPMiddleware): mede a resposta inteira, inclusive
+    StreamingResponse/SSE, e usa o template da rota para não explodir a cardinalidade.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metodo = scope["method"]
+        status = [500]
+
+        async def send_com_status(mensagem):
+            if mensagem["type"] == "http.response.start":
+                status[0] = mensagem["status"]
+            await send(mensagem)
+
+        em_andamento = HTTP_EM_ANDAMENTO.labels(metodo)
+        em_andamento.inc()
+        inicio = time.perf_counter()
+        with medir_consultas() as perfil:
+            try:
+                await self.app(scope, receive, send_com_status)
+            finally:
+                duracao = time.perf_counter() - inicio
+                em_andamento.dec()
+                # O roteador grava a rota encontrada no próprio scope
+                rota = scope.get("route")
+                template = getattr(rota, "path", None) or ROTA_DESCONHECIDA
+                HTTP_SEGUNDOS.labels(metodo, template, str(status[0])).observe(duracao)
+                HTTP_CONSULTAS_SQL.labels(template).observe(perfil.total)
+
+
+# --- Gemini ---------------------------------------------------------------
+
+@contextmanager
+def medir_gemini(funcao: str) -> Iterator[None]:
+    """Mede uma chamada ao Gemini; exceções são contadas como erro e propagadas."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except asyncio.TimeoutError:
+        GEMINI_ERROS.labels(funcao, "timeout").inc()
+        raise
+    except Exception as e:
+        GEMINI_ERROS.labels(funcao, e.__class__.__name__).inc()
+        raise
+    finally:
+        GEMINI_SEGUNDOS.labels(funcao).observe(time.perf_counter() - inicio)
+
+
+def registrar_tokens_gemini(funcao: str, resposta: Any) -> None:
+    """Soma os tokens de 'usage_metadata' da resposta (quando o SDK/modelo informa)."""
+    uso = getattr(resposta, "usage_metadata", None)
+    if uso is None:
+        return
+    entrada = getattr(uso, "prompt_token_count", 0) or 0
+    saida = getattr(uso, "candidates_token_count", 0) or 0
+    if entrada:
+        GEMINI_TOKENS.labels(funcao, "entrada").inc(entrada)
+    if saida:
+        GEMINI_TOKENS.labels(funcao, "saida").inc(saida)
+
+
+# --- GCS ------------------------------------------------------------------
+
+@contextmanager
+def medir_upload_gcs(tamanho_bytes: int) -> Iterator[None]:
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        GCS_UPLOAD_ERROS.inc()
+        raise
+    else:
+        GCS_UPLOAD_BYTES.inc(tamanho_bytes)
+    finally:
+        GCS_UPLOAD_SEGUNDOS.observe(time.perf_counter() - inicio)
+
+
+# --- Estatísticas dos serviços -------------------------------------------
+
+class _ColetorEstatisticas:
+    """Expõe como gauges os campos numéricos de estatisticas() dos serviços registrados."""
+
+    def __init__(self):
+        self.fontes: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self.ultimos: Dict[str, Dict[str, Any]] = {}
+
+    def collect(self):
+        for componente, fonte in list(self.fontes.items()):
+            try:
+                valores = fonte()
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao coletar estatísticas de '{componente}': {e}")
+                continue
+            yield from self._familias(componente, valores)
+        for componente, valores in list(self.ultimos.items()):
+            yield from self._familias(componente, valores)
+
+    @staticmethod
+    def _familias(componente: str, valores: Dict[str, Any]):
+        for chave, valor in valores.items():
+            if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                continue
+            yield GaugeMetricFamily(f"nutriscan_{componente}_{chave}", f"{componente}: {chave}", value=valor)
+
+
+_coletor = _ColetorEstatisticas()
+REGISTRY.register(_coletor)
+
+
+def registrar_estatisticas(componente: str, fonte: Callable[[], Dict[str, Any]]) -> None:
+    """Registra um estatisticas() síncrono, lido a cada scrape."""
+    _coletor.fontes[componente] = fonte
+
+
+def atualizar_estatisticas(componente: str, valores: Dict[str, Any]) -> None:
+    """Para fontes assíncronas (ex.: fila no Redis): o endpoint lê antes de gerar a saída."""
+    _coletor.ultimos[componente] = valores
+
+
+def gerar_saida() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+TIPO_CONTEUDO = CONTENT_TYPE_LATEST
@@ -0,0 +1,78 @@
+# app/migracoes.py
+#
+# Aplica os arquivos SQL de backend/migrations/ (em ordem de nome) que ainda não
+# foram registrados na tabela schema_migracoes. Só roda em PostgreSQL; em outros
+# bancos as tabelas vêm do create_all e as buscas usam os fallbacks em memória.
+# Migrações que exigem um passo de dados (POS_MIGRACAO) o executam na sequência.
+#
+# Uso (a partir de backend/):
+#   python -m app.migracoes
+
+import logging
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_MIGRACOES = Path(__file__).resolve().parent.parent / "migrations"
+
+
+def _backfill_totais(engine: Engine) -> None:
+    """002: refeições analisadas antes da migração só têm o JSON; preenche os totais e o consumo_diario."""
+    from app.backfill_totais import preencher_totais_refeicoes, reconstruir_consumo_diario
+
+    with Session(engine) as db:
+        atualizadas = preencher_totais_refeicoes(db)
+        dias = reconstruir_consumo_diario(db)
+    logger.info(f"✅ Backfill dos totais: {atualizadas} refeições, {dias} linhas em consumo_diario.")
+
+
+# Passos de dados executados logo depois do SQL da migração (idempotentes, como os arquivos SQL)
+POS_MIGRACAO: Dict[str, Callable[[Engine], None]] = {
+    "002_totais_refeicoes.sql": _backfill_totais,
+}
+
+
+def aplicar_migracoes(engine: Engine) -> List[str]:
+    """Aplica as migrações pendentes e retorna os nomes das que foram executadas."""
+    if engine.dialect.name != "postgresql":
+        logger.info("Migrações SQL ignoradas (banco não é PostgreSQL).")
+        return []
+
+    aplicadas = []
+    with engine.begin() as conexao:
+        conexao.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migracoes ("
+            " nome VARCHAR(255) PRIMARY KEY,"
+            " aplicada_em TIMESTAMPTZ NOT NULL DEFAULT now())"
+        ))
+        ja_aplicadas = set(conexao.execute(text("SELECT nome FROM schema_migracoes")).scalars())
+
+    for arquivo in sorted(DIRETORIO_MIGRACOES.glob("*.sql")):
+        if arquivo.name in ja_aplicadas:
+            continue
+        logger.info(f"🗄️ Aplicando migração {arquivo.name}...")
+        with engine.begin() as conexao:
+            # Direto no cursor do driver, sem parâmetros: com exec_driver_sql o psycopg2 trataria
+            # cada '%' do arquivo (LIKE '%termo%', operador %) como marcador de parâmetro
+            conexao.connection.cursor().execute(arquivo.read_text(encoding="utf-8"))
+        # Só registra depois do passo de dados: se ele falhar, SQL e passo rodam de novo no próximo startup
+        if arquivo.name in POS_MIGRACAO:
+            POS_MIGRACAO[arquivo.name](engine)
+        with engine.begin() as conexao:
+            conexao.execute(text("INSERT INTO schema_migracoes (nome) VALUES (:nome)"), {"nome": arquivo.name})
+        aplicadas.append(arquivo.name)
+
+    logger.info(f"✅ Migrações aplicadas: {aplicadas or 'nenhuma pendente'}")
+    return aplicadas
+
+
+if __name__ == "__main__":
+    from app.database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    aplicar_migracoes(engine)
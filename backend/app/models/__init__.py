@@ -2,10 +2,10 @@
 # que fiquem acessíveis como "models.NomeDoModelo"
 
 # Assumindo que você tem um app/models/refeicoes.py
-from .refeicoes import RefeicaoSalva, AlimentoSalvo, RefeicaoStatus
+from .refeicoes import RefeicaoSalva, AlimentoSalvo, RefeicaoStatus, ConsumoDiario
 
 # Assumindo que você tem um app/models/usuario.py
-from .usuario import Usuario
+from .usuario import Usuario, TokenRenovacao
 
 # Assumindo que você tem um app/models/alimentos.py
 from .alimentos import Alimento
@@ -17,6 +17,7 @@ class Alimento(Base):
     alimento_normalizado = Column(String(255), unique=True, index=True)
     alimentos = Column(String(255))
     alimento = Column(String(255))
+    # Busca: colunas geradas busca_nome/busca_documento e índices GIN em migrations/001 e 004
 
     # --- Macronutrientes (por 100g) ---
     energia_kcal_100g = Column(Float)
@@ -1,5 +1,5 @@
 # app/models/refeicoes.py
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Enum as SQLEnum, Float, func, text
+from sqlalchemy import Column, Integer, String, DateTime, Date, Text, ForeignKey, Enum as SQLEnum, Float, Index, func, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import TIMESTAMP
 from app.database import Base
@@ -22,6 +22,13 @@ class RefeicaoSalva(Base):
     imagem_url = Column(String(512), nullable=True)  # Guarda a URL pública do GCS
     analysis_result_json = Column(Text, nullable=True)
 
+    # Totais da análise detalhada (cópia numérica do analysis_result_json, para
+    # histórico e dashboard não precisarem decodificar o JSON)
+    total_calorias = Column(Float, nullable=True)
+    total_proteinas_g = Column(Float, nullable=True)
+    total_carboidratos_g = Column(Float, nullable=True)
+    total_gorduras_g = Column(Float, nullable=True)
+
     created_at = Column(DateTime(timezone=True),
                        default=text("TIMEZONE('America/Sao_Paulo', CURRENT_TIMESTAMP)"))
     updated_at = Column(DateTime(timezone=True),
@@ -32,6 +39,11 @@ class RefeicaoSalva(Base):
     alimentos = relationship("AlimentoSalvo", back_populates="refeicao", cascade="all, delete-orphan")
     owner = relationship("Usuario", back_populates="refeicoes_salvas")
 
+    __table_args__ = (
+        # Paginação por cursor do histórico e refeições do dia: (owner_id, created_at, id)
+        Index("ix_refeicoes_salvas_owner_created_id", "owner_id", "created_at", "id"),
+    )
+
 class AlimentoSalvo(Base):
     __tablename__ = "alimentos_salvos"
 
@@ -52,3 +64,21 @@ class AlimentoSalvo(Base):
     refeicao = relationship("RefeicaoSalva", back_populates="alimentos")
     # 🔹 NOVO: Acesso aos dados nutricionais completos (kcal, macros, micros)
     alimento_detalhes = relationship("Alimento", back_populates="alimentos_salvos")
+
+class ConsumoDiario(Base):
+    """
+    Totais do dia por usuário, somados a cada análise detalhada concluída
+    (na mesma transação que grava a análise). O resumo do dashboard é uma leitura desta linha.
+    """
+    __tablename__ = "consumo_diario"
+
+    owner_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), primary_key=True)
+    dia = Column(Date, primary_key=True)
+
+    total_calorias = Column(Float, nullable=False, default=0)
+    total_proteinas_g = Column(Float, nullable=False, default=0)
+    total_carboidratos_g = Column(Float, nullable=False, default=0)
+    total_gorduras_g = Column(Float, nullable=False, default=0)
+    refeicoes_analisadas = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
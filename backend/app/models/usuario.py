@@ -76,4 +76,20 @@ class HistoricoUsuario(Base):
     updated_at = Column(TIMESTAMP(timezone=True), onupdate=func.now())
 
     # Relacionamento de volta para o usuário
-    usuario = relationship("Usuario")
\ No newline at end of file
+    usuario = relationship("Usuario")
+
+class TokenRenovacao(Base):
+    """
+    Refresh token (só o SHA-256 é guardado). Cada uso gera um token novo da mesma
+    'familia' e marca o anterior como usado; reapresentar um token usado revoga a família.
+    """
+    __tablename__ = "tokens_renovacao"
+
+    id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), nullable=False, unique=True)
+    familia = Column(String(32), nullable=False, index=True)
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+    expira_em = Column(TIMESTAMP(timezone=True), nullable=False)
+    usado_em = Column(TIMESTAMP(timezone=True), nullable=True)
+    revogado_em = Column(TIMESTAMP(timezone=True), nullable=True)
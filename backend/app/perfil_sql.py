@@ -0,0 +1,214 @@
+# app/perfil_sql.py
+#
+# Perfil das consultas SQL de cada requisição, por eventos do SQLAlchemy:
+# quantas consultas, tempo total no banco e quais "formatos" de consulta se
+# repetem (o mesmo SQL, com parâmetros diferentes, executado várias vezes na
+# mesma requisição costuma ser um N+1, ex.: um lazy load dentro de um loop).
+#
+# - MiddlewarePerfilSql abre um perfil por requisição, escreve o resumo nos
+#   headers X-SQL-* (SQL_PERFIL_HEADER) e registra no log os formatos repetidos
+#   e as requisições com consultas demais.
+# - limitar_consultas / verificar_consultas_resposta: para testes fixarem o
+#   número máximo de consultas de uma função ou de um endpoint.
+
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_CHAVE_INICIOS = "perfil_sql_inicios"
+# Listas de parâmetros (IN (?, ?, ?) / IN (%(p_1)s, ...)) viram um único formato
+_LISTA_PARAMETROS = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)\s*\)")
+_ESPACOS = re.compile(r"\s+")
+
+
+def formato_consulta(statement: str) -> str:
+    """SQL normalizado: espaços colapsados e listas de parâmetros de qualquer tamanho iguais."""
+    return _LISTA_PARAMETROS.sub("(...)", _ESPACOS.sub(" ", statement).strip())
+
+
+class PerfilConsultas:
+    __slots__ = ("total", "segundos", "por_statement")
+
+    def __init__(self):
+        self.total = 0
+        self.segundos = 0.0
+        # statement bruto -> [execuções, segundos]; a normalização só é feita no relatório
+        self.por_statement: Dict[str, List[float]] = {}
+
+    def registrar(self, statement: str, segundos: float) -> None:
+        self.total += 1
+        self.segundos += segundos
+        acumulado = self.por_statement.get(statement)
+        if acumulado is None:
+            self.por_statement[statement] = [1, segundos]
+        else:
+            acumulado[0] += 1
+            acumulado[1] += segundos
+
+    def formatos(self) -> Dict[str, Tuple[int, float]]:
+        """{formato: (execuções, segundos)}"""
+        agrupados: Dict[str, List[float]] = {}
+        for statement, (execucoes, segundos) in self.por_statement.items():
+            acumulado = agrupados.setdefault(formato_consulta(statement), [0, 0.0])
+            acumulado[0] += execucoes
+            acumulado[1] += segundos
+        return {formato: (int(execucoes), segundos) for formato, (execucoes, segundos) in agrupados.items()}
+
+    def repetidas(self, limite: Optional[int] = None) -> List[Tuple[str, int, float]]:
+        """Formatos executados pelo menos 'limite' vezes (SQL_N_MAIS_1_LIMITE), do mais repetido ao menos."""
+        limite = settings.SQL_N_MAIS_1_LIMITE if limite is None else limite
+        return sorted(
+            ((formato, execucoes, segundos) for formato, (execucoes, segundos) in self.formatos().items() if execucoes >= limite),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+
+_perfil_atual: ContextVar[Optional[PerfilConsultas]] = ContextVar("perfil_sql", default=None)
+
+
+def perfil_atual() -> Optional[PerfilConsultas]:
+    return _perfil_atual.get()
+
+
+@contextmanager
+def medir_consultas() -> Iterator[PerfilConsultas]:
+    """
+    Perfil das consultas feitas dentro do bloco. Se já houver um perfil ativo
+    (ex.: o da requisição), ele é reutilizado. O objeto é compartilhado com as
+    threads do threadpool (rotas síncronas copiam o contexto).
+    """
+    perfil = _perfil_atual.get()
+    if perfil is not None:
+        yield perfil
+        return
+    perfil = PerfilConsultas()
+    token = _perfil_atual.set(perfil)
+    try:
+        yield perfil
+    finally:
+        _perfil_atual.reset(token)
+
+
+def _antes_de_executar(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _perfil_atual.get() is not None:
+        conn.info.setdefault(_CHAVE_INICIOS, []).append(time.perf_counter())
+
+
+def _depois_de_executar(conn, cursor, statement, parameters, context, executemany) -> None:
+    perfil = _perfil_atual.get()
+    inicios = conn.info.get(_CHAVE_INICIOS)
+    if perfil is not None and inicios:
+        perfil.registrar(statement, time.perf_counter() - inicios.pop())
+
+
+def instrumentar_engine(engine) -> None:
+    """Liga o perfil de consultas ao engine (custo desprezível fora de um perfil ativo)."""
+    event.listen(engine, "before_cursor_execute", _antes_de_executar)
+    event.listen(engine, "after_cursor_execute", _depois_de_executar)
+
+
+# --- Requisições ----------------------------------------------------------
+
+def _resumir(texto: str, tamanho: int = 160) -> str:
+    return texto if len(texto) <= tamanho else texto[:tamanho] + "..."
+
+
+def relatar(perfil: PerfilConsultas, descricao: str) -> None:
+    """Log dos formatos repetidos (N+1 provável) e do excesso de consultas."""
+    for formato, execucoes, segundos in perfil.repetidas():
+        logger.warning(
+            f"🔁 Possível N+1 em {descricao}: {execucoes}x ({segundos * 1000:.1f} ms) '{_resumir(formato)}'"
+        )
+    if perfil.total > settings.SQL_CONSULTAS_AVISO:
+        logger.warning(
+            f"🐢 {descricao} executou {perfil.total} consultas SQL ({perfil.segundos * 1000:.1f} ms no banco)"
+        )
+    else:
+        logger.debug(f"🗄️ {descricao}: {perfil.total} consultas SQL ({perfil.segundos * 1000:.1f} ms)")
+
+
+class MiddlewarePerfilSql:
+    """Middleware ASGI: um perfil por requisição, com headers X-SQL-* e log dos N+1."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with medir_consultas() as perfil:
+            async def send_com_headers(mensagem):
+                # Consultas feitas depois do início da resposta (streaming) só entram no log
+                if mensagem["type"] == "http.response.start" and settings.SQL_PERFIL_HEADER:
+                    mensagem["headers"] = list(mensagem.get("headers", [])) + [
+                        (b"x-sql-consultas", str(perfil.total).encode()),
+                        (b"x-sql-tempo-ms", f"{perfil.segundos * 1000:.1f}".encode()),
+                        (b"x-sql-repetidas", str(len(perfil.repetidas())).encode()),
+                    ]
+                await send(mensagem)
+
+            try:
+                await self.app(scope, receive, send_com_headers)
+            finally:
+                rota = getattr(scope.get("route"), "path", None) or scope.get("path", "")
+                relatar(perfil, f"{scope['method']} {rota}")
+
+
+# --- Testes ---------------------------------------------------------------
+
+class ConsultasDemaisError(AssertionError):
+    pass
+
+
+def _detalhar(perfil: PerfilConsultas) -> str:
+    linhas = [f"{execucoes}x {_resumir(formato)}" for formato, (execucoes, _) in
+              sorted(perfil.formatos().items(), key=lambda item: item[1][0], reverse=True)]
+    return "\n".join(linhas)
+
+
+@contextmanager
+def limitar_consultas(maximo: int) -> Iterator[PerfilConsultas]:
+    """
+    Para testes: falha se o bloco executar mais de 'maximo' consultas.
+
+        with limitar_consultas(2):
+            crud.get_resumo_refeicoes_hoje(db, user_id)
+    """
+    with medir_consultas() as perfil:
+        inicial = perfil.total
+        yield perfil
+    executadas = perfil.total - inicial
+    if executadas > maximo:
+        raise ConsultasDemaisError(
+            f"{executadas} consultas SQL executadas (máximo {maximo}):\n{_detalhar(perfil)}"
+        )
+
+
+def verificar_consultas_resposta(resposta, maximo: int) -> int:
+    """
+    Para testes de endpoint (TestClient roda o app em outra thread, então o
+    perfil vem pelo header X-SQL-Consultas; requer SQL_PERFIL_HEADER).
+    Retorna o número de consultas.
+    """
+    valor = resposta.headers.get("x-sql-consultas")
+    if valor is None:
+        raise AssertionError("Resposta sem o header X-SQL-Consultas (SQL_PERFIL_HEADER desligado?)")
+    executadas = int(valor)
+    if executadas > maximo:
+        raise ConsultasDemaisError(
+            f"{resposta.request.method} {resposta.request.url.path}: {executadas} consultas SQL (máximo {maximo}); "
+            f"{resposta.headers.get('x-sql-repetidas', '0')} formatos repetidos"
+        )
+    return executadas
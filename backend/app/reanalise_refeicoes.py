@@ -0,0 +1,267 @@
+# app/reanalise_refeicoes.py
+#
+# Reanálise em lote das refeições já analisadas, depois de corrigir valores da
+# tabela 'alimentos' (TACO ou um alimento gerado pelo Gemini com dados errados).
+# As refeições afetadas são encontradas por alimentos_salvos.alimento_id e lidas
+# com cursor em streaming (yield_per); cada lote tem os nutrientes recalculados
+# num único produto do motor NumPy e é regravado com um UPDATE em massa
+# (JSON da análise, colunas de totais e a diferença em consumo_diario).
+#
+# Por padrão as recomendações da IA são mantidas; com --com-ia cada refeição
+# passa pela análise completa (uma chamada ao Gemini por refeição, todas no
+# mesmo event loop); refeições em que a IA falha ficam como estavam.
+#
+# Uso (a partir de backend/):
+#   python -m app.reanalise_refeicoes --alimento 123 --alimento 456
+#   python -m app.reanalise_refeicoes --todas --lote 1000
+#   python -m app.reanalise_refeicoes --alimento 123 --simular
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app import crud
+from app.models.refeicoes import RefeicaoSalva, AlimentoSalvo, RefeicaoStatus
+from app.services.analise_detalhada import (
+    campos_nutricionais,
+    montar_resultado,
+    preparar_analise,
+    salvar_resultado,
+    totais_para_ia,
+)
+from app.services.motor_nutrientes import motor_nutrientes, como_dict
+from app.vision import gerar_recomendacoes_detalhadas_ia_async
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RelatorioReanalise:
+    refeicoes: int = 0
+    lotes: int = 0
+    ignoradas: int = 0
+    segundos_leitura: float = 0.0
+    segundos_calculo: float = 0.0
+    segundos_escrita: float = 0.0
+    inicio: float = field(default_factory=time.perf_counter)
+
+    @property
+    def segundos_total(self) -> float:
+        return time.perf_counter() - self.inicio
+
+    @property
+    def refeicoes_por_segundo(self) -> float:
+        total = self.segundos_total
+        return self.refeicoes / total if total else 0.0
+
+    def resumo(self) -> str:
+        return (
+            f"{self.refeicoes} refeições em {self.lotes} lotes, {self.segundos_total:.1f}s "
+            f"({self.refeicoes_por_segundo:.0f} refeições/s; leitura {self.segundos_leitura:.1f}s, "
+            f"cálculo {self.segundos_calculo:.1f}s, escrita {self.segundos_escrita:.1f}s; "
+            f"{self.ignoradas} ignoradas)"
+        )
+
+
+def consulta_refeicoes_afetadas(alimento_ids: Optional[Sequence[int]]):
+    """Refeições com análise concluída que usam algum dos alimentos (todas, se alimento_ids for None)."""
+    consulta = select(
+        RefeicaoSalva.id,
+        RefeicaoSalva.owner_id,
+        RefeicaoSalva.created_at,
+        RefeicaoSalva.analysis_result_json,
+        *(getattr(RefeicaoSalva, campo) for campo in crud.CAMPOS_TOTAIS),
+    ).where(
+        RefeicaoSalva.status == RefeicaoStatus.ANALYSIS_COMPLETE,
+        RefeicaoSalva.analysis_result_json.isnot(None),
+    )
+    if alimento_ids is not None:
+        consulta = consulta.where(RefeicaoSalva.id.in_(
+            select(AlimentoSalvo.refeicao_id).where(AlimentoSalvo.alimento_id.in_(list(alimento_ids)))
+        ))
+    return consulta.order_by(RefeicaoSalva.id)
+
+
+def _lotes(leitura: Session, consulta, lote: int) -> Iterator[list]:
+    """Lotes de linhas lidas com cursor em streaming (server-side no PostgreSQL)."""
+    if leitura.get_bind().dialect.name == "sqlite":
+        # SQLite (desenvolvimento) não aceita escrita de outra conexão com um cursor aberto: lê tudo antes
+        linhas = leitura.execute(consulta).all()
+        for i in range(0, len(linhas), lote):
+            yield linhas[i:i + lote]
+        return
+    yield from leitura.execute(consulta.execution_options(yield_per=lote)).partitions()
+
+
+def _itens_por_refeicao(db: Session, refeicao_ids: List[int]) -> Dict[int, List[Tuple[Optional[int], float]]]:
+    """(alimento_id, gramas) de cada refeição do lote, numa única consulta."""
+    itens: Dict[int, List[Tuple[Optional[int], float]]] = defaultdict(list)
+    linhas = db.execute(
+        select(AlimentoSalvo.refeicao_id, AlimentoSalvo.alimento_id, AlimentoSalvo.quantidade_estimada_g)
+        .where(AlimentoSalvo.refeicao_id.in_(refeicao_ids))
+    )
+    for refeicao_id, alimento_id, gramas in linhas:
+        # Mesmo critério de calcular_macros: sem quantidade ou sem vínculo com 'alimentos' fica de fora
+        if alimento_id is not None and gramas is not None and gramas > 0:
+            itens[refeicao_id].append((alimento_id, gramas))
+    return itens
+
+
+def recalcular_lote(
+    escrita: Session, linhas: list, simular: bool = False, relatorio: Optional[RelatorioReanalise] = None
+) -> int:
+    """Recalcula e regrava um lote de refeições (um commit). Retorna quantas foram regravadas."""
+    t0 = time.perf_counter()
+    ids = [linha.id for linha in linhas]
+    itens = _itens_por_refeicao(escrita, ids)
+    matriz = motor_nutrientes.calcular_lote(escrita, [itens.get(refeicao_id, []) for refeicao_id in ids])
+
+    atualizacoes = []
+    deltas: Dict[tuple, Dict[str, float]] = defaultdict(lambda: dict.fromkeys(crud.CAMPOS_TOTAIS, 0.0))
+    novas_no_dia: Dict[tuple, int] = defaultdict(int)
+    for linha, vetor in zip(linhas, matriz):
+        try:
+            analise = json.loads(linha.analysis_result_json)
+        except Exception as e:
+            logger.warning(f"⚠️ JSON inválido na refeição ID {linha.id}: {e}")
+            continue
+        # Recomendações, vitaminas e minerais da IA são mantidos; só os campos calculados mudam
+        analise.setdefault("analise_nutricional", {}).update(campos_nutricionais(como_dict(vetor)))
+        novos = crud.extrair_totais_analise(analise)
+        atualizacoes.append({"id": linha.id, "analysis_result_json": json.dumps(analise, ensure_ascii=False), **novos})
+
+        chave = (linha.owner_id, crud.dia_da_refeicao(linha))
+        for campo in crud.CAMPOS_TOTAIS:
+            deltas[chave][campo] += novos[campo] - (getattr(linha, campo) or 0.0)
+        if linha.total_calorias is None:
+            novas_no_dia[chave] += 1
+
+    t1 = time.perf_counter()
+    if simular or not atualizacoes:
+        escrita.rollback()
+    else:
+        agora = datetime.now()
+        escrita.execute(update(RefeicaoSalva), [{**valores, "updated_at": agora} for valores in atualizacoes])
+        for (owner_id, dia), delta in deltas.items():
+            crud.somar_consumo_diario(escrita, owner_id, dia, delta, novas_no_dia[(owner_id, dia)])
+        escrita.commit()
+
+    if relatorio is not None:
+        relatorio.segundos_calculo += t1 - t0
+        relatorio.segundos_escrita += time.perf_counter() - t1
+    return len(atualizacoes)
+
+
+async def reanalisar_com_ia(escrita: Session, linhas: list) -> int:
+    """
+    Análise completa (nutrientes + recomendações da IA), refeição por refeição.
+    Se a IA falhar, a refeição é pulada: as recomendações atuais não são trocadas pelos textos padrão.
+    """
+    regravadas = 0
+    for linha in linhas:
+        try:
+            db_refeicao, nutrientes, detalhes_prato, lista_alimentos_para_ia = preparar_analise(escrita, linha.id, linha.owner_id)
+            dados_ia = await gerar_recomendacoes_detalhadas_ia_async(
+                lista_alimentos=lista_alimentos_para_ia, totais=totais_para_ia(nutrientes)
+            )
+            if "erro" in dados_ia:
+                logger.warning(f"⚠️ Reanálise com IA da refeição ID {linha.id} pulada: {dados_ia['erro']}")
+                continue
+            salvar_resultado(escrita, db_refeicao, montar_resultado(nutrientes, detalhes_prato, dados_ia))
+            regravadas += 1
+        except Exception as e:
+            escrita.rollback()
+            logger.warning(f"⚠️ Reanálise com IA da refeição ID {linha.id} falhou: {e.__class__.__name__}: {e}")
+    return regravadas
+
+
+def reanalisar_refeicoes(
+    leitura: Session,
+    escrita: Session,
+    alimento_ids: Optional[Sequence[int]],
+    lote: int = 500,
+    com_ia: bool = False,
+    simular: bool = False,
+) -> RelatorioReanalise:
+    """Percorre as refeições afetadas em lotes; 'leitura' mantém o cursor aberto, 'escrita' faz um commit por lote."""
+    # Um único event loop para a execução inteira: o cliente assíncrono do Gemini
+    # fica preso ao loop da primeira chamada ("Event loop is closed" num segundo asyncio.run)
+    return asyncio.run(_percorrer_lotes(leitura, escrita, alimento_ids, lote, com_ia, simular))
+
+
+async def _percorrer_lotes(
+    leitura: Session,
+    escrita: Session,
+    alimento_ids: Optional[Sequence[int]],
+    lote: int,
+    com_ia: bool,
+    simular: bool,
+) -> RelatorioReanalise:
+    relatorio = RelatorioReanalise()
+    # Os valores corrigidos precisam entrar na matriz antes do primeiro lote
+    motor_nutrientes.invalidar()
+
+    lotes = _lotes(leitura, consulta_refeicoes_afetadas(alimento_ids), lote)
+    while True:
+        t0 = time.perf_counter()
+        linhas = next(lotes, None)
+        t1 = time.perf_counter()
+        relatorio.segundos_leitura += t1 - t0
+        if not linhas:
+            break
+
+        if com_ia:
+            regravadas = await reanalisar_com_ia(escrita, linhas)
+            relatorio.segundos_calculo += time.perf_counter() - t1
+        else:
+            regravadas = recalcular_lote(escrita, linhas, simular=simular, relatorio=relatorio)
+
+        relatorio.lotes += 1
+        relatorio.refeicoes += regravadas
+        relatorio.ignoradas += len(linhas) - regravadas
+        logger.info(f"🔁 Lote {relatorio.lotes}: {regravadas} refeições ({relatorio.refeicoes_por_segundo:.0f} refeições/s acumulado)")
+    return relatorio
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reanálise em lote das refeições após correções na tabela 'alimentos'")
+    alvo = parser.add_mutually_exclusive_group(required=True)
+    alvo.add_argument("--alimento", type=int, action="append", dest="alimentos", metavar="ID",
+                      help="ID do alimento corrigido (pode repetir)")
+    alvo.add_argument("--todas", action="store_true", help="Reanalisa todas as refeições com análise concluída")
+    parser.add_argument("--lote", type=int, default=500, help="Refeições por lote (leitura e commit)")
+    parser.add_argument("--com-ia", action="store_true", help="Gera de novo as recomendações da IA (lento: uma chamada por refeição)")
+    parser.add_argument("--simular", action="store_true", help="Recalcula sem gravar (mede o throughput)")
+    args = parser.parse_args()
+    if args.com_ia and args.simular:
+        parser.error("--simular não se aplica com --com-ia")
+
+    from app.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    leitura, escrita = SessionLocal(), SessionLocal()
+    try:
+        relatorio = reanalisar_refeicoes(
+            leitura, escrita,
+            alimento_ids=None if args.todas else args.alimentos,
+            lote=args.lote,
+            com_ia=args.com_ia,
+            simular=args.simular,
+        )
+        logger.info(f"✅ Reanálise{' (simulação)' if args.simular else ''} concluída: {relatorio.resumo()}")
+    finally:
+        leitura.close()
+        escrita.close()
+
+
+if __name__ == "__main__":
+    main()
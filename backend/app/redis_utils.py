@@ -0,0 +1,43 @@
+# app/redis_utils.py
+#
+# Cliente Redis compartilhado (opcional). Se REDIS_HABILITADO for falso ou a
+# conexão não puder ser criada, as funções retornam None e quem chama deve
+# seguir apenas com o armazenamento local.
+
+import logging
+from typing import Optional
+
+import redis.asyncio as redis_async
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_cliente_async: Optional[redis_async.Redis] = None
+
+
+def get_redis_async() -> Optional[redis_async.Redis]:
+    """Retorna o cliente Redis assíncrono do processo (criado sob demanda)."""
+    global _cliente_async
+    if not settings.REDIS_HABILITADO:
+        return None
+    if _cliente_async is None:
+        try:
+            _cliente_async = redis_async.from_url(
+                settings.REDIS_URL,
+                socket_timeout=settings.REDIS_TIMEOUT_SEGUNDOS,
+                socket_connect_timeout=settings.REDIS_TIMEOUT_SEGUNDOS,
+            )
+            logger.info("🔌 Cliente Redis configurado.")
+        except Exception as e:
+            logger.error(f"❌ Não foi possível configurar o Redis: {e}")
+            return None
+    return _cliente_async
+
+
+async def fechar_redis() -> None:
+    """Fecha o pool de conexões (chamado no shutdown da aplicação)."""
+    global _cliente_async
+    if _cliente_async is not None:
+        await _cliente_async.close()
+        _cliente_async = None
@@ -1,20 +1,25 @@
 # app/routers/alimentos.py
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
-import requests
 import os
 import json
 
 # Importa o modelo de Alimento e o schema de resposta
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, get_async_db
+from app.http_utils import requisicao_http
 from app.models.alimentos import Alimento
 from app.schemas.vision_alimentos_ import AlimentoPublic
+from app.services.busca_alimentos import busca_alimentos
+from app.services.autocomplete_alimentos import autocomplete_alimentos
+from app.services.limite_taxa import cobrar_chamadas_modelo
 
 router = APIRouter(
-    prefix="/api/v1/alimentos",
+    prefix="/alimentos",  # montado em /api/v1 (main.py)
     tags=["Alimentos"]
 )
 
@@ -29,7 +34,7 @@ async def consultar_ia_para_alimento(nome_alimento: str) -> Optional[dict]:
         if not GEMINI_API_KEY:
             return None
             
-        GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={GEMINI_API_KEY}"
+        GEMINI_API_URL = f"{settings.GEMINI_API_BASE_URL}/v1beta/models/gemini-pro:generateContent"
         
         prompt = f"""
         Forneça informações nutricionais aproximadas para o alimento: {nome_alimento}
@@ -55,8 +60,10 @@ async def consultar_ia_para_alimento(nome_alimento: str) -> Optional[dict]:
             }]
         }
         
-        response = requests.post(GEMINI_API_URL, json=payload, timeout=10)
-        response.raise_for_status()
+        # Cliente compartilhado: conexões reaproveitadas, concorrência limitada e retentativas
+        response = await requisicao_http(
+            "POST", GEMINI_API_URL, json=payload, headers={"x-goog-api-key": GEMINI_API_KEY}
+        )
         
         data = response.json()
         text_response = data['candidates'][0]['content']['parts'][0]['text']
@@ -74,12 +81,32 @@ async def consultar_ia_para_alimento(nome_alimento: str) -> Optional[dict]:
     
     return None
 
+@router.get(
+    "/autocomplete",
+    response_model=List[AlimentoPublic],
+    summary="Sugestões de alimentos por prefixo (em memória, sem consultar o banco)"
+)
+async def autocomplete_alimentos_por_prefixo(
+    q: str = Query(..., min_length=1, description="Início do nome do alimento (acentos são ignorados)"),
+    categoria: Optional[str] = Query(None, description="Filtrar por categoria"),
+    limit: int = Query(10, ge=1, le=50, description="Número máximo de sugestões"),
+    db: Session = Depends(get_db),
+):
+    """
+    Autocomplete para o campo de busca: "pao" encontra "Pão de queijo".
+    Usa a trie em memória; o banco só é lido se ela ainda não tiver sido construída.
+    """
+    if not autocomplete_alimentos.pronto:
+        await run_in_threadpool(autocomplete_alimentos.reconstruir, db)
+    return autocomplete_alimentos.sugerir(q, categoria=categoria, limit=limit)
+
 @router.get(
     "/buscar-completo",
     response_model=List[AlimentoPublic],
     summary="Busca alimentos no banco e consulta IA se não encontrar"
 )
 async def buscar_alimentos_completo(
+    request: Request,
     q: str = Query(..., min_length=2, description="Termo de busca pelo nome do alimento"),
     incluir_ia: bool = Query(True, description="Incluir resultados da IA se não encontrar no banco"),
     limit: int = Query(10, ge=1, le=50, description="Número máximo de resultados"),
@@ -92,16 +119,14 @@ async def buscar_alimentos_completo(
     termo_busca_normalizado = q.strip().lower()
     resultados = []
 
-    # 1. Busca no banco de dados
-    query = db.query(Alimento).filter(
-        func.lower(Alimento.alimento).ilike(f"%{termo_busca_normalizado}%")
-    ).order_by(Alimento.alimento.asc())
-    
-    resultados_banco = query.limit(limit).all()
+    # 1. Busca no banco de dados (ranqueada por relevância, usando os índices de busca)
+    resultados_banco = await run_in_threadpool(busca_alimentos.buscar, db, q, None, limit)
     resultados.extend(resultados_banco)
 
     # 2. Se não encontrou no banco e deve incluir IA, consulta a IA
     if not resultados_banco and incluir_ia:
+        # A chamada ao modelo só é cobrada aqui, quando o banco não respondeu
+        await cobrar_chamadas_modelo(request)
         alimento_ia = await consultar_ia_para_alimento(termo_busca_normalizado)
         if alimento_ia:
             # Converte o resultado da IA para o formato AlimentoPublic
@@ -128,23 +153,11 @@ async def buscar_alimentos_completo(
     response_model=List[AlimentoPublic],
     summary="Busca alimentos apenas no banco de dados"
 )
-def buscar_alimentos(
+async def buscar_alimentos(
     q: str = Query(..., min_length=2, description="Termo de busca pelo nome do alimento"),
     categoria: Optional[str] = Query(None, description="Filtrar por categoria"),
     limit: int = Query(10, ge=1, le=50, description="Número máximo de resultados"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    """Busca alimentos apenas no banco de dados (compatibilidade)"""
-    termo_busca_normalizado = q.strip().lower()
-    
-    query = db.query(Alimento).filter(
-        func.lower(Alimento.alimento).ilike(f"%{termo_busca_normalizado}%")
-    )
-    
-    if categoria:
-        categoria_normalizada = categoria.strip().lower()
-        query = query.filter(func.lower(Alimento.categoria).ilike(f"%{categoria_normalizada}%"))
-    
-    resultados = query.order_by(Alimento.alimento.asc()).limit(limit).all()
-    
-    return resultados
\ No newline at end of file
+    """Busca alimentos apenas no banco de dados (compatibilidade), do mais ao menos relevante"""
+    return await db.run_sync(busca_alimentos.buscar, q, categoria=categoria, limit=limit)
\ No newline at end of file
@@ -3,15 +3,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 # Importações dos seus schemas
-from app.schemas.login import UserPublic, UserCreate, Token
+from app.schemas.login import UserPublic, UserCreate, Token, RenovacaoToken
 from app.schemas.registro import UserRegister, UserResponse
 
 # Importações do banco, modelos e segurança
 from app.database import get_db
 from app.models.usuario import Usuario 
 from app import security
+from app.config import settings
+from app.services.hash_senhas import executor_senhas, SobrecargaSenhas
+from app.services import tokens_renovacao
+from app.services.limite_taxa import custo_requisicao
 from app.utils.validators import validar_senha
 
 router = APIRouter(
@@ -25,37 +30,67 @@ def get_user_by_email(email: str, db: Session):
     return db.query(Usuario).filter(Usuario.email == email).first()
 
 
+def _sobrecarga_senhas() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Muitas autenticações em andamento. Tente novamente em instantes.",
+        headers={"Retry-After": str(settings.SENHA_RETRY_AFTER_SEGUNDOS)},
+    )
+
+
+def _inserir_usuario(db: Session, usuario: UserRegister, senha_hash: str) -> Usuario:
+    novo_usuario = Usuario(
+        nome=usuario.nome,
+        apelido=usuario.apelido,
+        email=usuario.email,
+        senha_hash=senha_hash
+    )
+    db.add(novo_usuario)
+    db.commit()
+    db.refresh(novo_usuario)
+    return novo_usuario
+
+
+def _atualizar_hash(db: Session, user: Usuario, senha_hash: str) -> None:
+    user.senha_hash = senha_hash
+    db.commit()
+
+
+def _iniciar_sessao(db: Session, user: Usuario) -> dict:
+    """Par access/refresh do login (nova família de refresh tokens)."""
+    access_token = security.criar_token_usuario(user)
+    tokens_renovacao.limpar_expirados(db, user.id)
+    refresh_token = tokens_renovacao.emitir(db, user.id)
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
 # ✅ ROTA DE REGISTRO (CORRETA)
+# Rotas async: o banco vai para o threadpool e o bcrypt para o pool de processos
 @router.post("/registrar", response_model=UserResponse)
-def registrar(usuario: UserRegister, db: Session = Depends(get_db)):
+@custo_requisicao(unidades=5)  # bcrypt: ~250 ms de CPU
+async def registrar(usuario: UserRegister, db: Session = Depends(get_db)):
     # ✅ VALIDAR SENHA
     senha_valida, mensagem = validar_senha(usuario.password)
     if not senha_valida:
         raise HTTPException(status_code=400, detail=mensagem)
     
     # Verificar se usuário já existe
-    db_user = db.query(Usuario).filter(Usuario.email == usuario.email).first()
+    db_user = await run_in_threadpool(get_user_by_email, usuario.email, db)
     if db_user:
         raise HTTPException(status_code=400, detail="Email já registrado")
     
-    hashed_password = security.gerar_hash_senha(usuario.password)
-    novo_usuario = Usuario(
-        nome=usuario.nome,
-        apelido=usuario.apelido,
-        email=usuario.email,
-        senha_hash=hashed_password
-    )
-    
-    db.add(novo_usuario)
-    db.commit()
-    db.refresh(novo_usuario)
-    
-    return novo_usuario
+    try:
+        hashed_password = await executor_senhas.gerar_hash(usuario.password)
+    except SobrecargaSenhas:
+        raise _sobrecarga_senhas()
+
+    return await run_in_threadpool(_inserir_usuario, db, usuario, hashed_password)
 
 
 # ✅ ROTA DE LOGIN (CORRIGIDA E COMPLETA)
 @router.post("/login", response_model=Token)
-def login_para_access_token(
+@custo_requisicao(unidades=5)
+async def login_para_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)  # ✅ CORREÇÃO: Adicionar dependência do banco
 ):
@@ -68,21 +103,60 @@ def login_para_access_token(
         )
     
     # ✅ CORREÇÃO: Passar o db para a função
-    user = get_user_by_email(form_data.username, db)
+    user = await run_in_threadpool(get_user_by_email, form_data.username, db)
 
     print(f"🔐 [LOGIN DEBUG] Usuário encontrado: {bool(user)}")
     
-    if not user or not security.verificar_senha(form_data.password, user.senha_hash):
+    senha_ok, novo_hash = False, None
+    if user:
+        try:
+            senha_ok, novo_hash = await executor_senhas.verificar(form_data.password, user.senha_hash)
+        except SobrecargaSenhas:
+            raise _sobrecarga_senhas()
+
+    if not senha_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Credenciais incorretas",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # ✅ ADICIONAR: Criar token de acesso (implemente conforme sua lógica)
-    access_token = security.criar_access_token(data={"sub": user.email})
-    
+    if user.is_active is False:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Conta desativada",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Custo do bcrypt mudou (SENHA_BCRYPT_CUSTO): grava o hash refeito com a senha que acabou de conferir
+    if novo_hash is not None:
+        await run_in_threadpool(_atualizar_hash, db, user, novo_hash)
+
+    # ✅ Token com id/nome/ativo assinados (permite autenticar sem consultar o banco)
+    # e refresh token para renovar sem repetir o bcrypt (ver /auth/refresh)
+    return await run_in_threadpool(_iniciar_sessao, db, user)
+
+
+# ✅ RENOVAÇÃO DO ACCESS TOKEN (sem senha, sem bcrypt)
+@router.post("/refresh", response_model=Token)
+async def renovar_token(dados: RenovacaoToken, db: Session = Depends(get_db)):
+    try:
+        user, refresh_token = await run_in_threadpool(tokens_renovacao.renovar, db, dados.refresh_token)
+    except tokens_renovacao.TokenRenovacaoInvalido:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token inválido ou expirado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
     return {
-        "access_token": access_token,
+        "access_token": security.criar_token_usuario(user),
+        "refresh_token": refresh_token,
         "token_type": "bearer"
-    }
\ No newline at end of file
+    }
+
+
+# ✅ LOGOUT: revoga a sessão (família) do refresh token
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(dados: RenovacaoToken, db: Session = Depends(get_db)):
+    await run_in_threadpool(tokens_renovacao.revogar, db, dados.refresh_token)
@@ -1,23 +1,35 @@
 # app/routers/vision_alimentos.py
 # VERSÃO COMPLETA - SUBSTITUA TODO O ARQUIVO
 
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, status, Form
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, status, Form, Response, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func 
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from typing import List, Any, Dict, Optional
 from datetime import datetime
+import asyncio
 import json
+import anyio
 import uuid
 from app.gcs_utils import upload_to_gcs
 import os
 
 # --- Imports Explícitos ---
-from app.database import get_db
+from app.database import get_db, get_async_db
 from app import crud
 from app.models.alimentos import Alimento
 from app.models.usuario import Usuario 
 from app.models.refeicoes import RefeicaoSalva, AlimentoSalvo, RefeicaoStatus
 from app.security import get_current_user # Importa o usuário autenticado
+from app.services.cache_scan import cache_scan
+from app.services.processamento_imagem import preprocessar_imagem, ImagemProcessada
+from app.services.staging_imagens import staging_imagens
+from app.services.fila_analises import fila_analises
+from app.services.limite_taxa import cobrar_chamadas_modelo
+from app.services.analise_detalhada import preparar_analise, analisar_refeicao_em_stream, ErroAnaliseDefinitivo
+from app.config import settings
 from app.crud import (
     create_refeicao_salva,
     get_refeicao_salva, 
@@ -25,7 +37,7 @@ from app.crud import (
     get_historico_refeicoes_por_usuario,
     get_detalhe_refeicao_por_id,
     get_consumo_macros_hoje,
-    get_refeicoes_hoje_por_usuario
+    get_resumo_refeicoes_hoje
 )
 
 
@@ -44,12 +56,13 @@ from app.schemas.vision_alimentos_ import (
     RefeicaoHistoricoItem, # Schema para a lista de histórico
     ResumoDiarioResponse,  # Schema para o resumo do dashboard
     RefeicaoResumoHoje,
+    StatusAnaliseResponse,
 )
 
+# ✅ Versões assíncronas: não bloqueiam o event loop enquanto o Gemini responde
 from app.vision import (
-    escanear_prato_extrair_alimentos,
-    fetch_gemini_nutritional_data,  # <-- A nossa nova função de busca
-    gerar_recomendacoes_detalhadas_ia # <-- A nossa nova função de recomendações
+    escanear_prato_extrair_alimentos_async,
+    gerar_recomendacoes_detalhadas_ia_async
 )
 
 # ✅✅✅ PREFIXO CORRIGIDO ✅✅✅
@@ -58,11 +71,33 @@ router = APIRouter(
     tags=["Refeições e Análise (Vision)"]
 )
 
+async def _guardar_em_staging(user_id: int, imagem_processada: ImagemProcessada) -> Optional[str]:
+    """Guarda a imagem processada no staging e retorna o upload_token (None se falhar)."""
+    if settings.IMAGEM_MANTER_ORIGINAL:
+        return None  # O original só chega no /salvar-scan-editado, então o cliente precisa reenviá-lo
+    try:
+        return await run_in_threadpool(staging_imagens.guardar, user_id, imagem_processada)
+    except Exception as e:
+        print(f"Aviso: falha ao guardar imagem em staging (user {user_id}): {e}")
+        return None
+
+async def _descartar_staging(user_id: int, tarefa_staging: "asyncio.Task") -> None:
+    """Scan com erro: espera o staging em andamento (não dá para interromper a thread) e apaga a imagem."""
+    upload_token = await tarefa_staging
+    if upload_token is None:
+        return
+    try:
+        await run_in_threadpool(staging_imagens.descartar, user_id, upload_token)
+    except Exception as e:
+        print(f"Aviso: falha ao descartar imagem do staging (user {user_id}): {e}")
+
 # ---------------------------------------------------------------
 # ENDPOINT 0: SCAN RÁPIDO (O ENDPOINT QUE FALTAVA)
 # ---------------------------------------------------------------
 @router.post("/scan-rapido", response_model=ScanRapidoResponse, summary="Realiza scan rápido") 
 async def scan_rapido(
+    request: Request,
+    response: Response,
     imagem: UploadFile = File(...),
     db: Session = Depends(get_db), 
     current_user: Usuario = Depends(get_current_user) 
@@ -71,16 +106,43 @@ async def scan_rapido(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Arquivo deve ser uma imagem")
     try:
         imagem_bytes = await imagem.read()
-        resultado_scan = escanear_prato_extrair_alimentos(imagem_bytes) 
-        if not isinstance(resultado_scan, dict):
-             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Formato inesperado da análise de scan.")
-        if "erro" in resultado_scan:
-             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=resultado_scan["erro"])
+        # ✅ Orientação corrigida, lado máximo reduzido e sem metadados (CPU -> threadpool)
+        try:
+            imagem_processada = await run_in_threadpool(preprocessar_imagem, imagem_bytes)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+        # ✅ Mesma foto (retry / toque duplo) -> resposta do cache, sem chamar o Gemini
+        chave_cache = cache_scan.gerar_chave(imagem_processada.conteudo)
+        resultado_scan = await cache_scan.get(chave_cache)
+        response.headers["X-Scan-Cache"] = "HIT" if resultado_scan is not None else "MISS"
+
+        if resultado_scan is not None:
+            upload_token = await _guardar_em_staging(current_user.id, imagem_processada)
+        else:
+            # Cobrado antes do staging: um 429 não deixa imagem para trás
+            await cobrar_chamadas_modelo(request)
+            # ✅ Staging da imagem em paralelo ao Gemini: o salvamento usa só o upload_token
+            tarefa_staging = asyncio.create_task(_guardar_em_staging(current_user.id, imagem_processada))
+            try:
+                resultado_scan = await escanear_prato_extrair_alimentos_async(imagem_processada.conteudo)
+                if not isinstance(resultado_scan, dict):
+                     raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Formato inesperado da análise de scan.")
+                if "erro" in resultado_scan:
+                     raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=resultado_scan["erro"])
+            except Exception:
+                # Scan sem resultado: o cliente não recebe o token, então a imagem não seria promovida
+                await _descartar_staging(current_user.id, tarefa_staging)
+                raise
+            await cache_scan.set(chave_cache, resultado_scan)
+            upload_token = await tarefa_staging
+
         return ScanRapidoResponse(
             status="sucesso", 
             modalidade="scan_rapido",
             resultado=resultado_scan, 
-            timestamp=datetime.now().isoformat()
+            timestamp=datetime.now().isoformat(),
+            upload_token=upload_token
         )
     except HTTPException: raise
     except Exception as e:
@@ -95,8 +157,11 @@ async def scan_rapido(
     summary="Salva scan editado e faz upload da imagem",
 )
 async def salvar_scan_rapido_editado(
-    imagem: UploadFile = File(..., description="A imagem original da refeição"),
+    request: Request,
+    imagem: Optional[UploadFile] = File(None, description="A imagem original da refeição (opcional se 'upload_token' for enviado)"),
     alimentos_json: str = Form(..., description="A lista de alimentos editados em formato JSON string"),
+    upload_token: Optional[str] = Form(None, description="Token devolvido pelo /scan-rapido para a imagem já enviada"),
+    analisar_em_segundo_plano: bool = Form(True, description="Enfileirar a análise detalhada (false quando o cliente vai usar o /stream)"),
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
@@ -132,29 +197,73 @@ async def salvar_scan_rapido_editado(
             detail="A lista de alimentos não pode estar vazia."
         )
 
-    # 3. Lógica de Upload para o Google Cloud Storage
+    # A análise em segundo plano é cobrada antes de salvar: recusada depois, a refeição
+    # ficaria salva sem análise e o cliente, ao repetir, salvaria outra
+    if analisar_em_segundo_plano:
+        await cobrar_chamadas_modelo(request)
+
+    # 3. Imagem: promove a do staging (upload_token) ou faz upload da enviada agora
+    bucket_name = settings.GCS_BUCKET_NAME
+    file_id = f"{current_user.id}_{uuid.uuid4().hex}"
     imagem_url_publica = None
-    try:
-        # from app.gcs_utils import upload_to_gcs # Já importado no topo
-        # print(f"🚀 Tentando fazer upload para GCS...")
+
+    if upload_token:
+        try:
+            imagem_url_publica = await run_in_threadpool(
+                staging_imagens.promover, current_user.id, upload_token, f"refeicoes/{file_id}"
+            )
+        except Exception as exc:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Erro interno ao salvar a imagem: {exc}"
+            )
+        if imagem_url_publica is None and imagem is None:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Token de upload inválido ou expirado. Envie a imagem novamente."
+            )
+
+    if imagem_url_publica is None:
+        if imagem is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Envie a imagem ou o 'upload_token' retornado pelo scan rápido."
+            )
         imagem_bytes = await imagem.read()
-        bucket_name = "nutriscan-imagens-prod"
-        extensao = imagem.filename.split('.')[-1] if '.' in imagem.filename else 'jpg'
-        file_name = f"refeicoes/{current_user.id}_{uuid.uuid4().hex}.{extensao}"
-
-        imagem_url_publica = upload_to_gcs(
-            bucket_name=bucket_name,
-            file_bytes=imagem_bytes,
-            destination_blob_name=file_name,
-            content_type=imagem.content_type
-        )
-        # print(f"✅ Upload concluído! URL: {imagem_url_publica}")
-    except Exception as exc:
-        # print(f"Erro ao fazer upload da imagem para GCS: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Erro interno ao salvar a imagem: {exc}"
-        )
+        try:
+            imagem_processada = await run_in_threadpool(preprocessar_imagem, imagem_bytes)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+        try:
+            # from app.gcs_utils import upload_to_gcs # Já importado no topo
+            file_name = f"refeicoes/{file_id}.{imagem_processada.extensao}"
+
+            # Upload síncrono do SDK do GCS -> threadpool, para não travar o event loop
+            imagem_url_publica = await run_in_threadpool(
+                upload_to_gcs,
+                bucket_name=bucket_name,
+                file_bytes=imagem_processada.conteudo,
+                destination_blob_name=file_name,
+                content_type=imagem_processada.content_type
+            )
+
+            # Original só é guardado quando explicitamente configurado
+            if settings.IMAGEM_MANTER_ORIGINAL:
+                extensao = imagem.filename.split('.')[-1] if '.' in imagem.filename else 'jpg'
+                await run_in_threadpool(
+                    upload_to_gcs,
+                    bucket_name=bucket_name,
+                    file_bytes=imagem_bytes,
+                    destination_blob_name=f"refeicoes/originais/{file_id}.{extensao}",
+                    content_type=imagem.content_type
+                )
+        except Exception as exc:
+            # print(f"Erro ao fazer upload da imagem para GCS: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Erro interno ao salvar a imagem: {exc}"
+            )
 
     # 4. Passar a URL da imagem ao criar a refeição
     refeicao_data = RefeicaoSalvaCreate(
@@ -162,212 +271,180 @@ async def salvar_scan_rapido_editado(
         imagem_url=imagem_url_publica # <-- Passando a URL salva!
     )
 
+    def cobrar_consultas_gemini(quantidade: int) -> None:
+        # Chamado no threadpool, antes de create_refeicao_salva mandar os nomes desconhecidos ao Gemini
+        anyio.from_thread.run(cobrar_chamadas_modelo, request, quantidade)
+
     try:
-        db_refeicao = create_refeicao_salva(db=db, refeicao_data=refeicao_data, user_id=current_user.id)
+        # create_refeicao_salva pode consultar o Gemini (auto-aprendizagem) de forma síncrona
+        db_refeicao = await run_in_threadpool(
+            create_refeicao_salva, db=db, refeicao_data=refeicao_data, user_id=current_user.id,
+            antes_de_consultar_gemini=cobrar_consultas_gemini
+        )
         if not db_refeicao:
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Não foi possível criar a refeição no banco.")
-        return RefeicaoSalvaIdResponse(meal_id=db_refeicao.id)
+    except HTTPException:
+        # 429 das consultas ao Gemini: nada foi gravado (get_db faz o rollback ao fechar)
+        raise
     except Exception as exc:
         # print(f"Erro ao salvar refeição editada user {current_user.id}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erro interno ao salvar a refeição: {exc}"
         )
-    # print(f"✅ Refeição salva com ID: {db_refeicao.id}")
-    # print("=" * 80)
+
+    # 5. Análise detalhada em segundo plano (acompanhar por GET /analise/{meal_id})
+    if analisar_em_segundo_plano:
+        try:
+            await fila_analises.enfileirar(db_refeicao.id, current_user.id)
+        except Exception as exc:
+            # A refeição já está salva; o cliente pode pedir a análise em /analisar-detalhadamente
+            print(f"Aviso: falha ao enfileirar análise da refeição {db_refeicao.id}: {exc}")
+    return RefeicaoSalvaIdResponse(meal_id=db_refeicao.id)
 
 
 # ==========================================================
-# ✅ ENDPOINT DE ANÁLISE DETALHADA (Substituído pela nova lógica)
+# ✅ ENDPOINT DE ANÁLISE DETALHADA (fila + consulta de status)
 # ==========================================================
 
+async def _status_analise(db_refeicao: RefeicaoSalva) -> StatusAnaliseResponse:
+    """Monta o status da análise a partir da refeição (status/JSON) e do job na fila (tentativas/erro)."""
+    estado = await fila_analises.estado(db_refeicao.id) or {}
+    resposta = StatusAnaliseResponse(
+        meal_id=db_refeicao.id,
+        status=db_refeicao.status or RefeicaoStatus.PENDING_ANALYSIS,
+        tentativas=estado.get("tentativas", 0),
+        erro=estado.get("erro"),
+    )
+    if resposta.status == RefeicaoStatus.ANALYSIS_COMPLETE and db_refeicao.analysis_result_json:
+        resposta.resultado = AnaliseCompletaResponseSchema(**json.loads(db_refeicao.analysis_result_json))
+    return resposta
+
+
 @router.post("/analisar-detalhadamente/{meal_id}",
-             response_model=AnaliseCompletaResponseSchema,
-             summary="Analisa refeição salva por ID")
+             response_model=StatusAnaliseResponse,
+             status_code=status.HTTP_202_ACCEPTED,
+             summary="Enfileira a análise detalhada de uma refeição salva")
 async def analisar_refeicao_detalhadamente_por_id(
     meal_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    # 1. Obter a refeição e os alimentos
-    # É crucial que get_refeicao_salva carregue os relacionamentos de forma eager (ver crud.py)
+    """
+    Responde na hora: a análise roda nos workers da fila. Se ela já estiver
+    concluída, devolve o resultado (200); senão enfileira (uma vez só por
+    refeição) e devolve 202. Acompanhar por GET /analise/{meal_id}.
+    """
     db_refeicao: Optional[RefeicaoSalva] = crud.get_refeicao_salva(db=db, meal_id=meal_id, user_id=current_user.id)
     if not db_refeicao:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Refeição não encontrada.")
-
-    alimentos_salvos: List[AlimentoSalvo] = db_refeicao.alimentos
-    if not alimentos_salvos:
+    if not db_refeicao.alimentos:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Refeição sem alimentos.")
 
-    # --- Início da Lógica de Análise ---
-    lista_alimentos_para_ia = []  # Lista de dicts para a IA (recomendações)
-    detalhes_prato_resposta = []  # Lista de schemas para a resposta
+    if db_refeicao.status == RefeicaoStatus.ANALYSIS_COMPLETE and db_refeicao.analysis_result_json:
+        response.status_code = status.HTTP_200_OK
+        return await _status_analise(db_refeicao)
 
-    total_calorias = 0.0
-    total_proteinas = 0.0
-    total_carboidratos = 0.0
-    total_gorduras = 0.0
+    if await fila_analises.ativo(meal_id):
+        # Já na fila ou em execução: nada a enfileirar nem a cobrar
+        return await _status_analise(db_refeicao)
 
-    print(f"--- Iniciando Análise Detalhada (com Auto-Aprendizagem) para Refeição ID: {meal_id} ---")
+    await cobrar_chamadas_modelo(request)
+    if db_refeicao.status == RefeicaoStatus.ANALYSIS_FAILED:
+        # Nova chance depois de esgotadas as tentativas
+        db_refeicao = crud.update_refeicao_status(db=db, db_refeicao=db_refeicao, status=RefeicaoStatus.PENDING_ANALYSIS)
+    await fila_analises.enfileirar(meal_id, current_user.id)
+    return await _status_analise(db_refeicao)
 
-    try:
-        # 2. Loop por cada alimento salvo
-        for alimento_salvo in alimentos_salvos:
-            if alimento_salvo.quantidade_estimada_g is None or alimento_salvo.quantidade_estimada_g <= 0:
-                print(f"Aviso: Pulando alimento '{alimento_salvo.nome}' por não ter quantidade.")
-                continue
-
-            # 3. ✅ MUDANÇA PRINCIPAL AQUI: Acessar os dados nutricionais do relacionamento
-            #    'alimento_detalhes' que já foi populado pelo crud.get_or_create_alimento_by_nome
-            alimento_detalhes = alimento_salvo.alimento_detalhes
-
-            if not alimento_detalhes:
-                # Este caso não deveria ocorrer se create_refeicao_salva funcionou corretamente,
-                # mas é um bom fallback para garantir que a análise não pare.
-                print(f"⚠️ Alimento '{alimento_salvo.nome}' (ID: {alimento_salvo.id}) não tem detalhes nutricionais vinculados na tabela 'alimentos'. Isso indica um problema no fluxo de criação/vinculação. Pulando este alimento para a análise de macros.")
-                continue # Pula este alimento se não há dados nutricionais vinculados
-
-            # Usar os dados já carregados do banco (TACO ou Gemini salvo anteriormente)
-            dados_nutricionais_fonte = {
-                "energia_kcal_100g": alimento_detalhes.energia_kcal_100g,
-                "proteina_g_100g": alimento_detalhes.proteina_g_100g,
-                "carboidrato_g_100g": alimento_detalhes.carboidrato_g_100g,
-                "lipidios_g_100g": alimento_detalhes.lipidios_g_100g,
-                "unidades": alimento_detalhes.unidades,
-                "un_medida_caseira": alimento_detalhes.un_medida_caseira,
-                "peso_aproximado_g": alimento_detalhes.peso_aproximado_g,
-            }
-            print(f"✅ Usando dados do banco para '{alimento_salvo.nome}' (ID Alimento: {alimento_detalhes.id})")
-
-
-            # 4. FAZER OS CÁLCULOS EM PYTHON com os dados da fonte (banco)
-            ratio = alimento_salvo.quantidade_estimada_g / 100.0
-
-            calorias_item = (dados_nutricionais_fonte.get("energia_kcal_100g") or 0) * ratio
-            proteinas_item = (dados_nutricionais_fonte.get("proteina_g_100g") or 0) * ratio
-            carboidratos_item = (dados_nutricionais_fonte.get("carboidrato_g_100g") or 0) * ratio
-            gorduras_item = (dados_nutricionais_fonte.get("lipidios_g_100g") or 0) * ratio
-
-            total_calorias += calorias_item
-            total_proteinas += proteinas_item
-            total_carboidratos += carboidratos_item
-            total_gorduras += gorduras_item
-
-            # 5. Preparar listas para a resposta e para a IA
-            detalhes_prato_resposta.append(
-                AlimentoDetalhado(
-                    nome=alimento_salvo.nome,
-                    quantidade_gramas=alimento_salvo.quantidade_estimada_g,
-                    metodo_preparo="Não especificado",
-                    # Usar os dados da fonte (banco)
-                    medida_caseira_sugerida=f"{dados_nutricionais_fonte.get('unidades') or 1} {dados_nutricionais_fonte.get('un_medida_caseira') or 'g'}"
-                )
-            )
-            lista_alimentos_para_ia.append({
-                "nome": alimento_salvo.nome,
-                "quantidade_gramas": alimento_salvo.quantidade_estimada_g
-            })
-
-        if not lista_alimentos_para_ia:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nenhum alimento com quantidade válida encontrado para análise.")
-
-        print(f"--- Fim dos Cálculos. Total Kcal: {total_calorias} ---")
-
-        # 6. CHAMAR A IA APENAS PARA RECOMENDAÇÕES (esta parte continua a mesma)
-        totais_calculados = {
-            "kcal": total_calorias,
-            "protein": total_proteinas,
-            "carbs": total_carboidratos,
-            "fats": total_gorduras
-        }
-
-        # Chama a função síncrona do vision.py
-        dados_ia = gerar_recomendacoes_detalhadas_ia(
-            lista_alimentos=lista_alimentos_para_ia,
-            totais=totais_calculados
+
+@router.get("/analise/{meal_id}",
+            response_model=StatusAnaliseResponse,
+            summary="Status (e resultado, quando concluída) da análise detalhada")
+async def get_status_analise(
+    meal_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    # Consultado em polling pelo app: sessão assíncrona, sem bloquear o event loop
+    db_refeicao = (await db.execute(
+        select(RefeicaoSalva).where(
+            RefeicaoSalva.id == meal_id,
+            RefeicaoSalva.owner_id == current_user.id
         )
+    )).scalars().first()
+    if not db_refeicao:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Refeição não encontrada.")
+    return await _status_analise(db_refeicao)
 
-        if "erro" in dados_ia:
-            print(f"AVISO: Falha ao gerar recomendações da IA: {dados_ia['erro']}")
-            dados_ia = {}  # Zera para os 'gets' abaixo funcionarem
-
-        # ✅ 7. SEPARAR VITAMINAS E MINERAIS (CORREÇÃO PRINCIPAL)
-        vitaminas_minerais_lista = dados_ia.get("vitaminas_minerais", [])
-
-        # Listas conhecidas de minerais (em minúsculas para comparação)
-        minerais_conhecidos = [
-            'cálcio', 'calcio', 'ferro', 'magnésio', 'magnesio', 'fósforo', 'fosforo',
-            'potássio', 'potassio', 'sódio', 'sodio', 'selênio', 'selenio', 'zinco',
-            'cobre', 'manganês', 'manganes', 'iodo', 'iodeto'
-        ]
-
-        vitaminas_separadas = []
-        minerais_separados = []
-
-        for item in vitaminas_minerais_lista:
-            texto_lower = item.lower()
-
-            # Se contém "vitamina" ou começa com "vit" => é vitamina
-            if 'vitamina' in texto_lower or texto_lower.startswith('vit'):
-                vitaminas_separadas.append(item)
-            # Se é um mineral conhecido => é mineral
-            elif any(mineral in texto_lower for mineral in minerais_conhecidos):
-                minerais_separados.append(item)
-            # Fallback: se for curto e sem espaço, provavelmente é mineral
-            elif len(texto_lower) <= 12 and ' ' not in texto_lower:
-                minerais_separados.append(item)
-            # Caso contrário, joga em vitaminas
-            else:
-                vitaminas_separadas.append(item)
-
-        print(f"DEBUG - Vitaminas separadas: {vitaminas_separadas}")
-        print(f"DEBUG - Minerais separados: {minerais_separados}")
-
-        # 8. Montar e retornar a resposta final COM VITAMINAS E MINERAIS SEPARADOS
-        resultado_analise = AnaliseCompletaResponseSchema(
-            detalhes_prato=DetalhesPrato(
-                alimentos=detalhes_prato_resposta
-            ),
-            analise_nutricional=AnaliseNutricional(
-                calorias_totais=round(total_calorias),
-                macronutrientes=Macronutrientes(
-                    proteinas_g=round(total_proteinas, 1),
-                    carboidratos_g=round(total_carboidratos, 1),
-                    gorduras_g=round(total_gorduras, 1)
-                ),
-                # ✅ CORREÇÃO: Passar as listas separadas
-                vitaminas=vitaminas_separadas if vitaminas_separadas else None,
-                minerais=minerais_separados if minerais_separados else None
-            ),
-            recomendacoes=Recomendacoes(
-                pontos_positivos=dados_ia.get("recomendacoes", {}).get("pontos_positivos", ["Análise concluída."]),
-                sugestoes_balanceamento=dados_ia.get("recomendacoes", {}).get("sugestoes_balanceamento", ["Não foi possível gerar sugestões."]),
-                alternativas_saudaveis=dados_ia.get("recomendacoes", {}).get("alternativas_saudaveis", [])
-            )
+def _evento_sse(nome: str, dados: Any) -> str:
+    return f"event: {nome}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+def _resposta_sse(eventos) -> StreamingResponse:
+    return StreamingResponse(
+        eventos,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/analisar-detalhadamente/{meal_id}/stream",
+            summary="Análise detalhada em streaming (Server-Sent Events)",
+            response_class=StreamingResponse)
+async def analisar_refeicao_detalhadamente_stream(
+    meal_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: Usuario = Depends(get_current_user)
+):
+    """
+    Eventos (text/event-stream), cada um com um JSON em 'data':
+    - macros: detalhes do prato e totais calculados, enviados antes da chamada à IA
+    - item: {secao, valor} para cada recomendação/vitamina/mineral assim que é gerado
+    - secao: {secao, itens} quando uma seção termina
+    - concluido: análise completa (formato de AnaliseCompletaResponse), já salva
+    - erro: {detail} se não foi possível salvar a análise
+    Análise já concluída: só o evento 'concluido', com o resultado salvo (sem chamar a IA).
+    Job da refeição ativo na fila: 409 (acompanhar por GET /analise/{meal_id}).
+    """
+    db_refeicao: Optional[RefeicaoSalva] = await run_in_threadpool(
+        crud.get_refeicao_salva, db=db, meal_id=meal_id, user_id=current_user.id
+    )
+    if not db_refeicao:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Refeição não encontrada.")
+
+    if db_refeicao.status == RefeicaoStatus.ANALYSIS_COMPLETE and db_refeicao.analysis_result_json:
+        resultado_salvo = json.loads(db_refeicao.analysis_result_json)
+
+        async def ja_concluida():
+            yield _evento_sse("concluido", resultado_salvo)
+
+        return _resposta_sse(ja_concluida())
+
+    if await fila_analises.ativo(meal_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"A análise desta refeição já está em andamento. Acompanhe por /analise/{meal_id}."
         )
 
-        # 9. Salvar o resultado da análise no banco
+    await cobrar_chamadas_modelo(request)
+    try:
+        preparada = await run_in_threadpool(preparar_analise, db, meal_id, current_user.id)
+    except ErroAnaliseDefinitivo as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    async def eventos():
         try:
-            analysis_dict = resultado_analise.dict() if hasattr(resultado_analise, 'dict') else resultado_analise.model_dump()
-            db_refeicao.analysis_result_json = json.dumps(analysis_dict, ensure_ascii=False)
-            db.commit()
+            async for nome, dados in analisar_refeicao_em_stream(db, meal_id, *preparada):
+                yield _evento_sse(nome, dados)
         except Exception as e:
-            print(f"Erro ao salvar análise no banco: {e}")
+            print(f"Erro análise detalhada (stream) refeição {meal_id} user {current_user.id}: {e}")
+            await run_in_threadpool(db.rollback)
+            yield _evento_sse("erro", {"detail": f"Erro ao realizar a análise detalhada: {e}"})
 
-        # Atualizar o status
-        crud.update_refeicao_status(db=db, db_refeicao=db_refeicao, status=RefeicaoStatus.ANALYSIS_COMPLETE)
-        return resultado_analise
-
-    except Exception as e:
-        print(f"Erro análise detalhada refeição {meal_id} user {current_user.id}: {e}")
-        try:
-            crud.update_refeicao_status(db=db, db_refeicao=db_refeicao, status=RefeicaoStatus.ANALYSIS_FAILED)
-        except Exception as db_e:
-            print(f"Erro ao atualizar status FALHA refeição {meal_id}: {db_e}")
-        if isinstance(e, HTTPException):
-            raise e
-        else:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Erro ao realizar a análise detalhada: {e}")
+    return _resposta_sse(eventos())
 
 # ---------------------------------------------------------------
 # ENDPOINT 3: GET HISTÓRICO (Para a página /historico)
@@ -375,33 +452,44 @@ async def analisar_refeicao_detalhadamente_por_id(
 @router.get(
     "/historico", 
     response_model=List[RefeicaoHistoricoItem],
-    summary="Lista o histórico de refeições (resumo) do usuário"
+    summary="Lista o histórico de refeições (resumo) do usuário, paginado"
 )
-def get_historico_refeicoes(
-    db: Session = Depends(get_db),
+async def get_historico_refeicoes(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100, description="Refeições por página"),
+    cursor: Optional[str] = Query(None, description="Valor de X-Page-Next da página anterior"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    refeicoes_db = crud.get_historico_refeicoes_por_usuario(db, user_id=current_user.id)
-    resultado_historico = []
-    
-    for refeicao in refeicoes_db:
-        total_calorias = None
-        if refeicao.analysis_result_json:
-            try:
-                analise_data = json.loads(refeicao.analysis_result_json)
-                total_calorias = analise_data.get("analise_nutricional", {}).get("calorias_totais")
-            except:
-                pass 
-
-        resultado_historico.append(
-            RefeicaoHistoricoItem(
-                id=refeicao.id,
-                data_criacao=refeicao.created_at,
-                imagem_url=refeicao.imagem_url,
-                total_calorias=total_calorias
-            )
+    """
+    Páginas por cursor, da refeição mais recente para a mais antiga. Cabeçalhos:
+    - X-Page-Number / X-Page-Size: página atual e tamanho pedido
+    - X-Page-Next: cursor da próxima página (ausente na última)
+    - X-Total-Count: total de refeições do usuário (só na primeira página, sem cursor)
+    """
+    try:
+        linhas, proximo_cursor, pagina = await db.run_sync(
+            crud.get_historico_refeicoes_por_usuario, user_id=current_user.id, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    response.headers["X-Page-Number"] = str(pagina)
+    response.headers["X-Page-Size"] = str(limit)
+    if proximo_cursor:
+        response.headers["X-Page-Next"] = proximo_cursor
+    if not cursor:
+        response.headers["X-Total-Count"] = str(await db.run_sync(crud.contar_refeicoes_por_usuario, user_id=current_user.id))
+
+    return [
+        RefeicaoHistoricoItem(
+            id=linha.id,
+            data_criacao=linha.created_at,
+            imagem_url=linha.imagem_url,
+            total_calorias=linha.total_calorias
         )
-    return resultado_historico
+        for linha in linhas
+    ]
 
 # ---------------------------------------------------------------
 # ENDPOINT 4: GET DETALHE (Para a página /refeicao/[id])
@@ -411,12 +499,12 @@ def get_historico_refeicoes(
     response_model=AnaliseCompletaResponseSchema,
     summary="Busca uma análise detalhada completa pelo ID"
 )
-def get_detalhe_refeicao(
+async def get_detalhe_refeicao(
     meal_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    refeicao = crud.get_detalhe_refeicao_por_id(db, meal_id=meal_id, user_id=current_user.id)
+    refeicao = await db.run_sync(crud.get_detalhe_refeicao_por_id, meal_id=meal_id, user_id=current_user.id)
     if not refeicao:
         raise HTTPException(status_code=404, detail="Refeição não encontrada ou não pertence a este usuário.")
 
@@ -438,11 +526,11 @@ def get_detalhe_refeicao(
     response_model=ResumoDiarioResponse,
     summary="Calcula o consumo total de macros do usuário para hoje"
 )
-def get_resumo_diario(
-    db: Session = Depends(get_db),
+async def get_resumo_diario(
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
-    resumo_dict = crud.get_consumo_macros_hoje(db, user_id=current_user.id)
+    resumo_dict = await db.run_sync(crud.get_consumo_macros_hoje, user_id=current_user.id)
     
     if not resumo_dict:
         return ResumoDiarioResponse(
@@ -462,22 +550,16 @@ def get_resumo_diario(
     response_model=List[RefeicaoResumoHoje],  # ✅ Novo schema
     summary="Lista as refeições (enriquecidas) do usuário para hoje"
 )
-def get_refeicoes_hoje(
-    db: Session = Depends(get_db),
+async def get_refeicoes_hoje(
+    db: AsyncSession = Depends(get_async_db),
     current_user: Usuario = Depends(get_current_user)
 ):
     """
     Retorna lista de refeições de hoje com dados enriquecidos:
-    - Macronutrientes extraídos da análise
+    - Macronutrientes (colunas de totais gravadas na análise)
     - Nome sugerido baseado nos alimentos
     - Tipo inferido pelo horário
     """
-    refeicoes_db = crud.get_refeicoes_hoje_por_usuario(db, user_id=current_user.id)
-    
-    resultado_lista = []
-    for refeicao in refeicoes_db:
-        # ✅ Usa a nova função de enriquecimento
-        dados_enriquecidos = crud.enriquecer_refeicao_com_analise(refeicao)
-        resultado_lista.append(RefeicaoResumoHoje(**dados_enriquecidos))
-    
-    return resultado_lista
+    # ✅ Uma única consulta, independente do número de refeições do dia
+    resumos = await db.run_sync(crud.get_resumo_refeicoes_hoje, user_id=current_user.id)
+    return [RefeicaoResumoHoje(**resumo) for resumo in resumos]
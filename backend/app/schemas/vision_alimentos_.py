@@ -45,6 +45,8 @@ class ScanRapidoResponse(BaseModel):
     modalidade: str
     resultado: ScanRapidoResultado
     timestamp: str # Ou datetime, dependendo de como você formata
+    # Token da imagem já enviada (staging). Usado em /salvar-scan-editado no lugar de reenviar o arquivo.
+    upload_token: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -74,6 +76,9 @@ class AnaliseNutricional(BaseModel):
     vitaminas: Optional[List[str]] = None
     minerais: Optional[List[str]] = None
     vitaminas_minerais: Optional[List[str]] = None
+    # Todos os nutrientes da tabela 'alimentos' (fibras, ácidos graxos, colesterol, minerais...),
+    # chaves de app/services/motor_nutrientes.NUTRIENTES; ausente em análises antigas
+    nutrientes: Optional[Dict[str, float]] = None
 
 class Recomendacoes(BaseModel):
     pontos_positivos: List[str]
@@ -168,6 +173,20 @@ class RefeicaoSalva(RefeicaoSalvaBase):
 
 class RefeicaoSalvaIdResponse(BaseModel):
     meal_id: int 
+    status: RefeicaoStatus = RefeicaoStatus.PENDING_ANALYSIS  # A análise detalhada já foi enfileirada
+
+
+class StatusAnaliseResponse(BaseModel):
+    """
+    Estado da análise detalhada (processada em segundo plano).
+    Usado pelos endpoints: POST /api/v1/refeicoes/analisar-detalhadamente/{meal_id}
+    e GET /api/v1/refeicoes/analise/{meal_id}
+    """
+    meal_id: int
+    status: RefeicaoStatus
+    tentativas: int = 0
+    erro: Optional[str] = None
+    resultado: Optional[AnaliseCompletaResponse] = None  # Preenchido quando status = analysis_complete
 
 
 # ---------------------------------------------------------------
@@ -4,7 +4,6 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 import logging
 
-import bcrypt
 from jose import JWTError, jwt
 from dotenv import load_dotenv
 
@@ -12,8 +11,13 @@ from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.database import get_async_db
 from app.models.usuario import Usuario
+from app.services import hash_senhas, tokens_renovacao
+from app.services.cache_principal import cache_principal, UsuarioAutenticado
 
 load_dotenv()
 
@@ -29,26 +33,16 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
 # ✅ SOLUÇÃO SEGURA para gerar hash de senha
+# Versões síncronas (scripts/testes). As rotas usam executor_senhas (pool de
+# processos, app/services/hash_senhas.py) para não ocupar o threadpool.
 def gerar_hash_senha(senha: str) -> str:
     """
-    Gera hash da senha usando bcrypt diretamente.
+    Gera hash da senha usando bcrypt (custo SENHA_BCRYPT_CUSTO).
     Rejeita senhas muito longas em vez de truncar silenciosamente.
     """
     try:
-        senha_bytes = senha.encode('utf-8')
-
-        # ✅ REJEITAR em vez de truncar
-        if len(senha_bytes) > 72:
-            raise ValueError(
-                "Senha muito longa. O bcrypt suporta no máximo 72 bytes UTF-8. "
-                f"Sua senha tem {len(senha_bytes)} bytes."
-            )
-
-        salt = bcrypt.gensalt(rounds=12)  # ✅ Aumentar rounds para mais segurança
-        hashed_bytes = bcrypt.hashpw(senha_bytes, salt)
-        return hashed_bytes.decode('utf-8')
-
-    except ValueError as ve:
+        return hash_senhas.gerar_hash(senha, settings.SENHA_BCRYPT_CUSTO)
+    except ValueError:
         # Re-lançar erros de validação
         raise
     except Exception as e:
@@ -62,18 +56,7 @@ def verificar_senha(senha_plana: str, senha_hash: str) -> bool:
     Rejeita senhas muito longas.
     """
     try:
-        senha_bytes = senha_plana.encode('utf-8')
-
-        # ✅ REJEITAR em vez de truncar
-        if len(senha_bytes) > 72:
-            # Senha inválida por ser muito longa
-            return False
-
-        if isinstance(senha_hash, str):
-            senha_hash = senha_hash.encode('utf-8')
-
-        return bcrypt.checkpw(senha_bytes, senha_hash)
-
+        return hash_senhas.verificar_hash(senha_plana, senha_hash)
     except Exception as e:
         logger.error(f"Erro ao verificar senha: {e}")
         return False
@@ -104,7 +87,46 @@ def decodificar_token(token: str) -> dict:
 # --- Autenticação OAuth2 ---
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Usuario:
+def _carregar_principal(db: Session, email: str) -> Optional[UsuarioAutenticado]:
+    user = db.query(Usuario).filter(Usuario.email == email).first()
+    if user is None:
+        return None
+    return UsuarioAutenticado(
+        id=user.id,
+        email=user.email,
+        nome=user.nome,
+        apelido=user.apelido,
+        is_active=user.is_active is not False,
+    )
+
+def _principal_dos_claims(payload: dict) -> Optional[UsuarioAutenticado]:
+    """Monta o principal a partir dos claims assinados (tokens emitidos por criar_token_usuario)."""
+    if "uid" not in payload or "ativo" not in payload:
+        return None
+    return UsuarioAutenticado(
+        id=int(payload["uid"]),
+        email=payload["sub"],
+        nome=payload.get("nome", ""),
+        apelido=payload.get("apelido"),
+        is_active=bool(payload["ativo"]),
+    )
+
+def criar_token_usuario(user: Usuario) -> str:
+    """Access token do usuário: 'sub' = e-mail, mais id/nome/ativo para dispensar a consulta ao banco."""
+    return criar_access_token(data={
+        "sub": user.email,
+        "uid": user.id,
+        "nome": user.nome,
+        "apelido": user.apelido,
+        "ativo": user.is_active is not False,
+    })
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Usuario:
+    """
+    Resolve o usuário do token. O resultado fica no cache_principal (TTL curto), então
+    as requisições seguintes com o mesmo usuário não consultam o banco.
+    Retorna um UsuarioAutenticado (mesmos atributos usados pelas rotas: id, email, nome...).
+    """
     try:
         payload = decodificar_token(token)
         email: str = payload.get("sub")
@@ -113,7 +135,35 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido ou expirado")
 
-    user = db.query(Usuario).filter(Usuario.email == email).first()
+    user = cache_principal.get(email)
     if user is None:
-        raise HTTPException(status_code=401, detail="Usuário não encontrado")
+        if settings.AUTH_PRINCIPAL_NOS_CLAIMS:
+            user = _principal_dos_claims(payload)
+        if user is None:
+            user = await db.run_sync(_carregar_principal, email)
+            if user is None:
+                raise HTTPException(status_code=401, detail="Usuário não encontrado")
+        cache_principal.set(user)
+
+    # Com claims, o banco não é consultado: desativações chegam pela lista de revogados
+    if settings.AUTH_PRINCIPAL_NOS_CLAIMS and await cache_principal.revogado(user.id):
+        raise HTTPException(status_code=401, detail="Usuário inativo")
+    if not user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário inativo")
     return user
+
+def _marcar_inativo(db: Session, usuario_id: int) -> Optional[str]:
+    user = db.get(Usuario, usuario_id)
+    if user is None:
+        return None
+    user.is_active = False
+    db.commit()
+    # Refresh tokens da conta deixam de renovar
+    tokens_renovacao.revogar_usuario(db, usuario_id)
+    return user.email
+
+async def desativar_usuario(db: Session, usuario_id: int) -> None:
+    """Desativa a conta e invalida o principal em cache (e os tokens já emitidos, no modo claims)."""
+    email = await run_in_threadpool(_marcar_inativo, db, usuario_id)
+    if email is not None:
+        await cache_principal.revogar(usuario_id, email)
@@ -0,0 +1,300 @@
+# app/services/analise_detalhada.py
+#
+# Análise detalhada de uma refeição salva: nutrientes calculados pelo motor
+# NumPy (app/services/motor_nutrientes.py) a partir da tabela 'alimentos'
+# (TACO + auto-aprendizagem) e recomendações pela IA.
+# Executada pelos workers da fila (app/services/fila_analises.py), fora da
+# requisição HTTP que salvou a refeição, ou em streaming (SSE): macros primeiro,
+# depois cada recomendação assim que o modelo a gera.
+# As etapas com a Session síncrona (preparar_analise, salvar_resultado) rodam no
+# threadpool: os workers e o SSE estão no event loop da API.
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app import crud
+from app.models.refeicoes import RefeicaoSalva, RefeicaoStatus
+from app.services.motor_nutrientes import motor_nutrientes
+from app.schemas.vision_alimentos_ import (
+    AnaliseCompletaResponse,
+    AlimentoDetalhado,
+    DetalhesPrato,
+    AnaliseNutricional,
+    Recomendacoes,
+)
+from app.utils.json_incremental import ParserJsonIncremental, ErroJsonIncremental
+from app.vision import (
+    gerar_recomendacoes_detalhadas_ia_async,
+    gerar_recomendacoes_detalhadas_ia_stream,
+    extrair_json_da_resposta,
+)
+
+logger = logging.getLogger(__name__)
+
+# Listas conhecidas de minerais (em minúsculas para comparação)
+MINERAIS_CONHECIDOS = [
+    'cálcio', 'calcio', 'ferro', 'magnésio', 'magnesio', 'fósforo', 'fosforo',
+    'potássio', 'potassio', 'sódio', 'sodio', 'selênio', 'selenio', 'zinco',
+    'cobre', 'manganês', 'manganes', 'iodo', 'iodeto'
+]
+
+SECOES_RECOMENDACOES = ("pontos_positivos", "sugestoes_balanceamento", "alternativas_saudaveis")
+
+
+class ErroAnaliseDefinitivo(Exception):
+    """Falha que não adianta repetir (refeição inexistente, sem alimentos válidos)."""
+
+    def __init__(self, mensagem: str, status_code: int = 400):
+        super().__init__(mensagem)
+        self.status_code = status_code
+
+
+class ErroRecomendacoesIA(Exception):
+    """A IA não gerou as recomendações (timeout, cota, rede); transitória, a fila tenta de novo."""
+
+
+def calcular_macros(db: Session, db_refeicao: RefeicaoSalva) -> Tuple[Dict[str, float], List[AlimentoDetalhado], List[Dict[str, Any]]]:
+    """
+    Calcula todos os nutrientes da refeição (motor NumPy sobre a tabela 'alimentos',
+    valores por 100 g). Retorna (nutrientes, alimentos para a resposta, lista para a IA);
+    as chaves de 'nutrientes' são as de motor_nutrientes.NUTRIENTES.
+    """
+    itens: List[Tuple[int, float]] = []
+    detalhes_prato: List[AlimentoDetalhado] = []
+    lista_alimentos_para_ia: List[Dict[str, Any]] = []
+
+    for alimento_salvo in db_refeicao.alimentos:
+        if alimento_salvo.quantidade_estimada_g is None or alimento_salvo.quantidade_estimada_g <= 0:
+            logger.info(f"Aviso: Pulando alimento '{alimento_salvo.nome}' por não ter quantidade.")
+            continue
+
+        # Dados nutricionais vinculados em create_refeicao_salva (TACO ou Gemini salvo anteriormente)
+        alimento_detalhes = alimento_salvo.alimento_detalhes
+        if not alimento_detalhes:
+            logger.warning(f"⚠️ Alimento '{alimento_salvo.nome}' (ID: {alimento_salvo.id}) sem vínculo com a tabela 'alimentos'; fora do cálculo de macros.")
+            continue
+
+        itens.append((alimento_salvo.alimento_id, alimento_salvo.quantidade_estimada_g))
+        detalhes_prato.append(
+            AlimentoDetalhado(
+                nome=alimento_salvo.nome,
+                quantidade_gramas=alimento_salvo.quantidade_estimada_g,
+                metodo_preparo="Não especificado",
+                medida_caseira_sugerida=f"{alimento_detalhes.unidades or 1} {alimento_detalhes.un_medida_caseira or 'g'}"
+            )
+        )
+        lista_alimentos_para_ia.append({
+            "nome": alimento_salvo.nome,
+            "quantidade_gramas": alimento_salvo.quantidade_estimada_g
+        })
+
+    nutrientes = motor_nutrientes.calcular(db, itens)
+    return nutrientes, detalhes_prato, lista_alimentos_para_ia
+
+
+def totais_para_ia(nutrientes: Dict[str, float]) -> Dict[str, float]:
+    """Totais no formato usado pelos prompts de recomendação (app/vision.py)."""
+    return {
+        "kcal": nutrientes["energia_kcal"],
+        "protein": nutrientes["proteina_g"],
+        "carbs": nutrientes["carboidrato_g"],
+        "fats": nutrientes["lipidios_g"],
+    }
+
+
+def separar_vitaminas_minerais(itens: List[str]) -> Tuple[List[str], List[str]]:
+    """Divide a lista 'vitaminas_minerais' da IA em vitaminas e minerais."""
+    vitaminas, minerais = [], []
+    for item in itens:
+        texto_lower = item.lower()
+        # Se contém "vitamina" ou começa com "vit" => é vitamina
+        if 'vitamina' in texto_lower or texto_lower.startswith('vit'):
+            vitaminas.append(item)
+        # Se é um mineral conhecido => é mineral
+        elif any(mineral in texto_lower for mineral in MINERAIS_CONHECIDOS):
+            minerais.append(item)
+        # Fallback: se for curto e sem espaço, provavelmente é mineral
+        elif len(texto_lower) <= 12 and ' ' not in texto_lower:
+            minerais.append(item)
+        # Caso contrário, joga em vitaminas
+        else:
+            vitaminas.append(item)
+    return vitaminas, minerais
+
+
+def campos_nutricionais(nutrientes: Dict[str, float]) -> Dict[str, Any]:
+    """Campos calculados de 'analise_nutricional' (sem os textos da IA); também usado pela reanálise em lote."""
+    return {
+        "calorias_totais": round(nutrientes["energia_kcal"]),
+        "macronutrientes": {
+            "proteinas_g": round(nutrientes["proteina_g"], 1),
+            "carboidratos_g": round(nutrientes["carboidrato_g"], 1),
+            "gorduras_g": round(nutrientes["lipidios_g"], 1),
+        },
+        "nutrientes": {chave: round(valor, 2) for chave, valor in nutrientes.items()},
+    }
+
+
+def montar_resultado(
+    nutrientes: Dict[str, float], detalhes_prato: List[AlimentoDetalhado], dados_ia: Dict[str, Any]
+) -> AnaliseCompletaResponse:
+    """Resposta final da análise: macros calculados + recomendações da IA (ou textos padrão)."""
+    vitaminas, minerais = separar_vitaminas_minerais(dados_ia.get("vitaminas_minerais", []))
+    recomendacoes = dados_ia.get("recomendacoes", {})
+    return AnaliseCompletaResponse(
+        detalhes_prato=DetalhesPrato(alimentos=detalhes_prato),
+        analise_nutricional=AnaliseNutricional(
+            **campos_nutricionais(nutrientes),
+            vitaminas=vitaminas or None,
+            minerais=minerais or None
+        ),
+        recomendacoes=Recomendacoes(
+            pontos_positivos=recomendacoes.get("pontos_positivos", ["Análise concluída."]),
+            sugestoes_balanceamento=recomendacoes.get("sugestoes_balanceamento", ["Não foi possível gerar sugestões."]),
+            alternativas_saudaveis=recomendacoes.get("alternativas_saudaveis", [])
+        )
+    )
+
+
+def salvar_resultado(db: Session, db_refeicao: RefeicaoSalva, resultado: AnaliseCompletaResponse) -> None:
+    """Grava JSON, totais (e consumo_diario) e o status ANALYSIS_COMPLETE num único commit."""
+    analysis_dict = resultado.model_dump() if hasattr(resultado, 'model_dump') else resultado.dict()
+    db_refeicao.analysis_result_json = json.dumps(analysis_dict, ensure_ascii=False)
+    crud.registrar_totais_refeicao(db, db_refeicao, analysis_dict)
+    db_refeicao.status = RefeicaoStatus.ANALYSIS_COMPLETE
+    db_refeicao.updated_at = datetime.now()
+    db.commit()
+
+
+def preparar_analise(db: Session, meal_id: int, user_id: int) -> Tuple[RefeicaoSalva, Dict[str, float], List[AlimentoDetalhado], List[Dict[str, Any]]]:
+    """
+    Carrega a refeição e calcula os macros (parte local da análise). Levanta
+    ErroAnaliseDefinitivo quando a refeição não pode ser analisada.
+    """
+    db_refeicao: Optional[RefeicaoSalva] = crud.get_refeicao_salva(db=db, meal_id=meal_id, user_id=user_id)
+    if not db_refeicao:
+        raise ErroAnaliseDefinitivo("Refeição não encontrada.", status_code=404)
+    if not db_refeicao.alimentos:
+        raise ErroAnaliseDefinitivo("Refeição sem alimentos.")
+
+    nutrientes, detalhes_prato, lista_alimentos_para_ia = calcular_macros(db, db_refeicao)
+    if not lista_alimentos_para_ia:
+        raise ErroAnaliseDefinitivo("Nenhum alimento com quantidade válida encontrado para análise.")
+    logger.info(f"🧮 Refeição {meal_id}: nutrientes calculados ({nutrientes['energia_kcal']:.0f} kcal); pedindo recomendações à IA.")
+
+    # Encerra a transação de leitura: a conexão volta ao pool enquanto a IA responde
+    db.commit()
+    return db_refeicao, nutrientes, detalhes_prato, lista_alimentos_para_ia
+
+
+async def analisar_refeicao(db: Session, meal_id: int, user_id: int, ultima_tentativa: bool = True) -> AnaliseCompletaResponse:
+    """
+    Executa a análise detalhada e salva o resultado. Levanta ErroAnaliseDefinitivo
+    quando a refeição não pode ser analisada; outras exceções são transitórias.
+    Se a IA falhar, levanta ErroRecomendacoesIA para a fila tentar de novo; só na
+    última tentativa a refeição é salva com os textos padrão.
+    """
+    db_refeicao, nutrientes, detalhes_prato, lista_alimentos_para_ia = await run_in_threadpool(
+        preparar_analise, db, meal_id, user_id
+    )
+
+    dados_ia = await gerar_recomendacoes_detalhadas_ia_async(
+        lista_alimentos=lista_alimentos_para_ia, totais=totais_para_ia(nutrientes)
+    )
+    if "erro" in dados_ia:
+        if not ultima_tentativa:
+            raise ErroRecomendacoesIA(dados_ia["erro"])
+        # Sem recomendações a análise continua útil (macros); a resposta usa os textos padrão
+        logger.warning(f"⚠️ Falha ao gerar recomendações da IA (refeição {meal_id}); salvando com os textos padrão: {dados_ia['erro']}")
+        dados_ia = {}
+
+    resultado = montar_resultado(nutrientes, detalhes_prato, dados_ia)
+    await run_in_threadpool(salvar_resultado, db, db_refeicao, resultado)
+    return resultado
+
+
+def _eventos_recomendacao(caminho: tuple, valor: Any, parciais: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Traduz um valor concluído do JSON da IA em eventos 'item'/'secao' e o acumula em 'parciais'."""
+    if caminho[:1] == ("vitaminas_minerais",):
+        if len(caminho) == 2 and isinstance(valor, str):
+            parciais["vitaminas_minerais"].append(valor)
+            vitaminas, _ = separar_vitaminas_minerais([valor])
+            return [("item", {"secao": "vitaminas" if vitaminas else "minerais", "valor": valor})]
+        if len(caminho) == 1 and isinstance(valor, list):
+            vitaminas, minerais = separar_vitaminas_minerais([v for v in valor if isinstance(v, str)])
+            return [("secao", {"secao": "vitaminas", "itens": vitaminas}), ("secao", {"secao": "minerais", "itens": minerais})]
+    elif caminho[:1] == ("recomendacoes",) and len(caminho) >= 2 and caminho[1] in SECOES_RECOMENDACOES:
+        secao = caminho[1]
+        if len(caminho) == 3 and isinstance(valor, str):
+            parciais["recomendacoes"].setdefault(secao, []).append(valor)
+            return [("item", {"secao": secao, "valor": valor})]
+        if len(caminho) == 2 and isinstance(valor, list):
+            return [("secao", {"secao": secao, "itens": valor})]
+    return []
+
+
+async def analisar_refeicao_em_stream(
+    db: Session,
+    meal_id: int,
+    db_refeicao: RefeicaoSalva,
+    nutrientes: Dict[str, float],
+    detalhes_prato: List[AlimentoDetalhado],
+    lista_alimentos_para_ia: List[Dict[str, Any]],
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Continuação de preparar_analise em eventos (nome, dados):
+    - 'macros': detalhes do prato e nutrientes calculados (imediato, sem esperar a IA)
+    - 'item' / 'secao': cada recomendação, vitamina ou mineral, e cada seção completa
+    - 'concluido': a análise completa, já salva (mesmo formato de AnaliseCompletaResponse)
+    Se o streaming falhar no meio, o resultado usa o que já chegou e os textos padrão.
+    db_refeicao está expirada (commit em preparar_analise): só é usada no threadpool.
+    """
+    parcial = montar_resultado(nutrientes, detalhes_prato, {})
+    yield "macros", parcial.model_dump(include={"detalhes_prato", "analise_nutricional"})
+
+    parser = ParserJsonIncremental()
+    texto: List[str] = []
+    parciais: Dict[str, Any] = {"vitaminas_minerais": [], "recomendacoes": {}}
+    dados_ia: Dict[str, Any] = {}
+    try:
+        async for trecho in gerar_recomendacoes_detalhadas_ia_stream(lista_alimentos_para_ia, totais_para_ia(nutrientes)):
+            texto.append(trecho)
+            if parser is None:
+                continue
+            try:
+                concluidos = parser.alimentar(trecho)
+            except ErroJsonIncremental as e:
+                # Texto fora do formato esperado: o JSON é extraído do texto inteiro no final
+                logger.warning(f"⚠️ Streaming da refeição {meal_id} sem JSON incremental válido: {e}")
+                parser = None
+                continue
+            for caminho, valor in concluidos:
+                for evento in _eventos_recomendacao(caminho, valor, parciais):
+                    yield evento
+        if parser is not None and parser.completo and isinstance(parser.raiz, dict):
+            dados_ia = parser.raiz
+        else:
+            dados_ia = extrair_json_da_resposta("".join(texto))
+    except Exception as e:
+        logger.warning(f"⚠️ Falha no streaming das recomendações (refeição {meal_id}): {e.__class__.__name__}: {e}")
+
+    if not dados_ia or "erro" in dados_ia:
+        dados_ia = parciais if parciais["vitaminas_minerais"] or parciais["recomendacoes"] else {}
+
+    resultado = montar_resultado(nutrientes, detalhes_prato, dados_ia)
+    await run_in_threadpool(salvar_resultado, db, db_refeicao, resultado)
+    yield "concluido", resultado.model_dump()
+
+
+def marcar_falha(db: Session, meal_id: int, user_id: int) -> None:
+    """Marca a refeição como ANALYSIS_FAILED (após esgotar as tentativas)."""
+    db_refeicao = db.query(RefeicaoSalva).filter(
+        RefeicaoSalva.id == meal_id, RefeicaoSalva.owner_id == user_id
+    ).first()
+    if db_refeicao:
+        crud.update_refeicao_status(db=db, db_refeicao=db_refeicao, status=RefeicaoStatus.ANALYSIS_FAILED)
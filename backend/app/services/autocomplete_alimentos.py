@@ -0,0 +1,201 @@
+# app/services/autocomplete_alimentos.py
+#
+# Trie de prefixos em memória para o autocomplete de alimentos.
+# Construída a partir da tabela 'alimentos' no startup, atualizada a cada
+# alimento criado e reconstruída periodicamente (inserções de outras instâncias).
+# As consultas não tocam o banco.
+
+import asyncio
+import bisect
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models.alimentos import Alimento
+from app.schemas.vision_alimentos_ import AlimentoPublic
+from app.utils.texto import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+# Chave de ordenação em cada nó: (0 se a palavra é a primeira do nome, comprimento do nome, id)
+ChaveRanking = Tuple[int, int, int]
+
+
+class _NoTrie:
+    __slots__ = ("filhos", "itens", "_ids")
+
+    def __init__(self):
+        self.filhos: Dict[str, "_NoTrie"] = {}
+        # Itens cujo nome tem alguma palavra com este prefixo, já na ordem do ranking
+        self.itens: List[ChaveRanking] = []
+        self._ids: Optional[set] = None
+
+    def adicionar(self, chave: ChaveRanking) -> None:
+        bisect.insort(self.itens, chave)
+        self._ids = None
+
+    def ids(self) -> set:
+        """Conjunto dos ids do nó (calculado sob demanda, para buscas com várias palavras)."""
+        if self._ids is None:
+            self._ids = {id_alimento for _, _, id_alimento in self.itens}
+        return self._ids
+
+
+def _para_publico(alimento: Alimento) -> AlimentoPublic:
+    return AlimentoPublic(
+        id=alimento.id,
+        alimento=alimento.alimento or "",
+        alimento_normalizado=alimento.alimento_normalizado or "",
+        categoria=alimento.categoria or "",
+        energia_kcal_100g=alimento.energia_kcal_100g,
+        proteina_g_100g=alimento.proteina_g_100g,
+        carboidrato_g_100g=alimento.carboidrato_g_100g,
+        lipidios_g_100g=alimento.lipidios_g_100g,
+        fibra_g_100g=alimento.fibra_g_100g,
+    )
+
+
+class AutocompleteAlimentos:
+    """
+    Sugestões por prefixo de palavra, sem acentos ("pao" encontra "Pão de queijo"
+    e "queijo" também). Nomes que começam com o termo vêm primeiro, depois os mais curtos.
+    """
+
+    def __init__(self):
+        self._raiz = _NoTrie()
+        self._alimentos: Dict[int, AlimentoPublic] = {}
+        self._nomes: Dict[int, str] = {}
+        self._categorias: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        # Alimentos recebidos por adicionar() enquanto uma reconstrução lê a tabela (None fora dela)
+        self._adicionados_na_leitura: Optional[Dict[int, AlimentoPublic]] = None
+        self.pronto = False
+
+    # --- Construção -------------------------------------------------------
+
+    def _inserir(self, raiz: _NoTrie, alimento: AlimentoPublic, palavras: Tuple[str, ...]) -> None:
+        comprimento = len(alimento.alimento)
+        vistos = set()
+        for indice, palavra in enumerate(palavras):
+            chave = (0 if indice == 0 else 1, comprimento, alimento.id)
+            no = raiz
+            for caractere in palavra:
+                no = no.filhos.setdefault(caractere, _NoTrie())
+                # Cada item entra uma vez por nó, com a melhor chave (a da primeira palavra)
+                if id(no) in vistos:
+                    continue
+                vistos.add(id(no))
+                no.adicionar(chave)
+
+    def reconstruir(self, db: Session) -> None:
+        """Lê a tabela inteira e troca a trie atual por uma nova (atomicamente)."""
+        inicio = time.perf_counter()
+        with self._lock:
+            self._adicionados_na_leitura = {}
+        raiz = _NoTrie()
+        alimentos, nomes, categorias = {}, {}, {}
+        for linha in db.query(Alimento).order_by(Alimento.id).all():
+            publico = _para_publico(linha)
+            palavras = tuple(normalizar_texto(publico.alimento).split())
+            alimentos[publico.id] = publico
+            nomes[publico.id] = " ".join(palavras)
+            categorias[publico.id] = normalizar_texto(publico.categoria)
+            self._inserir(raiz, publico, palavras)
+
+        with self._lock:
+            # Só os alimentos criados durante a leitura (que ela pode não ter visto) passam para a
+            # trie nova; os demais ausentes foram apagados ou renomeados e saem
+            for id_alimento, publico in (self._adicionados_na_leitura or {}).items():
+                if id_alimento not in alimentos:
+                    palavras = tuple(normalizar_texto(publico.alimento).split())
+                    alimentos[id_alimento] = publico
+                    nomes[id_alimento] = " ".join(palavras)
+                    categorias[id_alimento] = normalizar_texto(publico.categoria)
+                    self._inserir(raiz, publico, palavras)
+            self._adicionados_na_leitura = None
+            self._raiz, self._alimentos, self._nomes, self._categorias = raiz, alimentos, nomes, categorias
+            self.pronto = True
+        logger.info(f"🔤 Autocomplete de alimentos construído: {len(alimentos)} itens ({time.perf_counter() - inicio:.3f}s)")
+
+    def adicionar(self, alimento: Alimento) -> None:
+        """Inclui um alimento recém-criado sem reconstruir a trie."""
+        publico = _para_publico(alimento)
+        palavras = tuple(normalizar_texto(publico.alimento).split())
+        with self._lock:
+            if self._adicionados_na_leitura is not None:
+                self._adicionados_na_leitura[publico.id] = publico
+            if publico.id in self._alimentos:
+                return
+            self._inserir(self._raiz, publico, palavras)
+            self._alimentos[publico.id] = publico
+            self._nomes[publico.id] = " ".join(palavras)
+            self._categorias[publico.id] = normalizar_texto(publico.categoria)
+
+    # --- Consulta ---------------------------------------------------------
+
+    def _no(self, prefixo: str) -> Optional[_NoTrie]:
+        no = self._raiz
+        for caractere in prefixo:
+            no = no.filhos.get(caractere)
+            if no is None:
+                return None
+        return no
+
+    def sugerir(self, q: str, categoria: Optional[str] = None, limit: int = 10) -> List[AlimentoPublic]:
+        palavras_termo = normalizar_texto(q).split()
+        if not palavras_termo:
+            return []
+        categoria = normalizar_texto(categoria).strip() if categoria else None
+
+        with self._lock:
+            nos = [self._no(palavra) for palavra in palavras_termo]
+            if any(no is None for no in nos):
+                return []
+
+            def aceita(id_alimento: int) -> bool:
+                return not categoria or categoria in self._categorias[id_alimento]
+
+            if len(palavras_termo) == 1:
+                # A ordem do nó já é a ordem final: para no k-ésimo resultado
+                ids = []
+                for _, _, id_alimento in nos[0].itens:
+                    if aceita(id_alimento):
+                        ids.append(id_alimento)
+                        if len(ids) == limit:
+                            break
+                return [self._alimentos[i] for i in ids]
+
+            # Várias palavras: intersecção dos itens de cada nó, depois o ranking só dos candidatos
+            termo = " ".join(palavras_termo)
+            candidatos = set.intersection(*(no.ids() for no in sorted(nos, key=lambda no: len(no.itens))))
+            ranqueados = sorted(
+                (0 if self._nomes[i].startswith(termo) else 1, len(self._alimentos[i].alimento), i)
+                for i in candidatos if aceita(i)
+            )
+            return [self._alimentos[i] for _, _, i in ranqueados[:limit]]
+
+
+# Instância única do processo
+autocomplete_alimentos = AutocompleteAlimentos()
+
+
+async def loop_atualizacao_autocomplete(session_factory) -> None:
+    """
+    Tarefa de fundo: constrói a trie no startup e a reconstrói a cada
+    INDICE_ALIMENTOS_TTL_SEGUNDOS, para captar alimentos criados por outras instâncias.
+    """
+    while True:
+        try:
+            db = session_factory()
+            try:
+                await run_in_threadpool(autocomplete_alimentos.reconstruir, db)
+            finally:
+                db.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao construir o autocomplete de alimentos: {e}")
+        await asyncio.sleep(max(settings.INDICE_ALIMENTOS_TTL_SEGUNDOS, 60))
@@ -0,0 +1,335 @@
+# app/services/busca_alimentos.py
+#
+# Busca ranqueada da tabela 'alimentos' (autocomplete e /alimentos/buscar).
+#
+# PostgreSQL: usa as colunas geradas e os índices GIN de migrations/001 e 004
+# (pg_trgm sobre o nome sem acentos + tsvector sem acentos de alimento/alimentos/categoria).
+# Outros bancos (SQLite em testes/dev) ou PostgreSQL sem a migração: índice em memória
+# que reproduz exatamente o mesmo ranqueamento em Python.
+#
+# Ranqueamento (menor faixa primeiro):
+#   0. nome igual ao termo
+#   1. nome começa com o termo
+#   2. todas as palavras do termo são prefixo de alguma palavra de alimento/alimentos/categoria
+#   3. nome contém o termo
+#   4. nome parecido com o termo (similaridade de trigramas >= LIMIAR_SIMILARIDADE)
+# Desempate: similaridade de trigramas (desc), comprimento do nome, id.
+
+import re
+import struct
+import threading
+import time
+import logging
+import unicodedata
+from dataclasses import dataclass
+from collections import Counter
+from typing import Dict, FrozenSet, List, Optional
+
+from sqlalchemy import case, func, literal_column, or_
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.alimentos import Alimento
+
+logger = logging.getLogger(__name__)
+
+# Mesmo valor padrão de pg_trgm.similarity_threshold (usado pelo operador %)
+LIMIAR_SIMILARIDADE = 0.3
+
+# Sem a migração 001, a busca SQL é testada de novo depois desse intervalo
+# (a migração pode ser aplicada sem reiniciar a API)
+NOVO_TESTE_SQL_SEGUNDOS = 300
+
+# Colunas geradas da migração 004: lower(f_unaccent(alimento)) e o tsvector sem acentos
+# de alimento/alimentos/categoria, já calculados (f_unaccent por linha custa caro)
+EXPR_NOME = "alimentos.busca_nome"
+EXPR_DOCUMENTO = "alimentos.busca_documento"
+
+_NAO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+def sem_acentos_minusculo(texto: Optional[str]) -> str:
+    """Equivalente Python de lower(f_unaccent(texto))."""
+    if not texto:
+        return ""
+    return unicodedata.normalize("NFKD", texto).encode("ASCII", "ignore").decode("ascii").lower()
+
+
+def palavras(texto: str) -> List[str]:
+    """Quebra em palavras alfanuméricas, como o parser 'simple' do tsvector e o pg_trgm."""
+    return [p for p in _NAO_ALFANUMERICO.split(texto) if p]
+
+
+def trigramas(texto: str) -> FrozenSet[str]:
+    """Trigramas no formato do pg_trgm: cada palavra com dois espaços antes e um depois."""
+    resultado = set()
+    for palavra in palavras(texto):
+        marcada = f"  {palavra} "
+        resultado.update(marcada[i:i + 3] for i in range(len(marcada) - 2))
+    return frozenset(resultado)
+
+
+def _float4(valor: float) -> float:
+    """Arredonda para a precisão de real (float4), a mesma do retorno de similarity()."""
+    return struct.unpack("f", struct.pack("f", valor))[0]
+
+
+def similaridade(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Mesma fórmula de similarity() do pg_trgm."""
+    if not a or not b:
+        return 0.0
+    comuns = len(a & b)
+    return _float4(comuns / (len(a) + len(b) - comuns))
+
+
+def normalizar_termo(q: str) -> str:
+    """Termo digitado -> forma comparável com EXPR_NOME (sem acentos, minúsculo, espaços simples)."""
+    return " ".join(sem_acentos_minusculo(q).split())
+
+
+def _escapar_like(texto: str) -> str:
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@dataclass(frozen=True)
+class _ItemBusca:
+    id: int
+    nome: str
+    comprimento: int
+    categoria: str
+    palavras_documento: FrozenSet[str]
+    total_trigramas: int
+
+
+class _SnapshotBusca:
+    """
+    Índices invertidos sobre os itens, para não calcular a similaridade de todos:
+    trigrama -> posições (similaridade pela contagem de trigramas em comum) e
+    palavra do documento -> posições (faixa 2).
+    """
+
+    def __init__(self, itens: List[_ItemBusca], trigramas_por_item: List[FrozenSet[str]]):
+        self.itens = itens
+        self.criado_em = time.monotonic()
+
+        postings_trigramas: Dict[str, List[int]] = {}
+        postings_palavras: Dict[str, List[int]] = {}
+        for posicao, item in enumerate(itens):
+            for trigrama in trigramas_por_item[posicao]:
+                postings_trigramas.setdefault(trigrama, []).append(posicao)
+            for palavra in item.palavras_documento:
+                postings_palavras.setdefault(palavra, []).append(posicao)
+        self.postings_trigramas = postings_trigramas
+        self.postings_palavras = postings_palavras
+
+    def _posicoes_com_prefixos(self, palavras_termo: List[str]) -> set:
+        """Posições em que cada palavra do termo é prefixo de alguma palavra do documento."""
+        resultado = None
+        for palavra_termo in palavras_termo:
+            posicoes = set()
+            for palavra, posicoes_palavra in self.postings_palavras.items():
+                if palavra.startswith(palavra_termo):
+                    posicoes.update(posicoes_palavra)
+            resultado = posicoes if resultado is None else resultado & posicoes
+            if not resultado:
+                break
+        return resultado or set()
+
+    def buscar(self, termo: str, categoria: Optional[str], limit: int) -> List[int]:
+        palavras_termo = palavras(termo)
+        trigramas_termo = trigramas(termo)
+        categoria = categoria.strip().lower() if categoria else None
+
+        em_comum = Counter()
+        for trigrama in trigramas_termo:
+            em_comum.update(self.postings_trigramas.get(trigrama, ()))
+        com_prefixos = self._posicoes_com_prefixos(palavras_termo) if palavras_termo else set()
+        contem = {posicao for posicao, item in enumerate(self.itens) if termo in item.nome}
+
+        ranqueados = []
+        for posicao in contem | com_prefixos | set(em_comum):
+            item = self.itens[posicao]
+            if categoria and categoria not in item.categoria:
+                continue
+            comuns = em_comum.get(posicao, 0)
+            sim = _float4(comuns / (item.total_trigramas + len(trigramas_termo) - comuns)) if comuns else 0.0
+            if item.nome == termo:
+                faixa = 0
+            elif item.nome.startswith(termo):
+                faixa = 1
+            elif posicao in com_prefixos:
+                faixa = 2
+            elif posicao in contem:
+                faixa = 3
+            elif sim >= LIMIAR_SIMILARIDADE:
+                faixa = 4
+            else:
+                continue
+            ranqueados.append((faixa, -sim, item.comprimento, item.id))
+
+        ranqueados.sort()
+        return [chave[3] for chave in ranqueados[:limit]]
+
+
+class BuscaAlimentos:
+    """
+    Ponto único de busca ranqueada. Decide entre a query SQL indexada e o
+    índice em memória (reconstruído após `invalidar()` ou quando o TTL expira).
+    """
+
+    def __init__(self, ttl_segundos: int):
+        self.ttl_segundos = ttl_segundos
+        self._snapshot: Optional[_SnapshotBusca] = None
+        self._lock = threading.Lock()
+        # None = ainda não testado; False = migração ausente, usar o índice em memória
+        self._sql_disponivel: Optional[bool] = None
+        self._sql_falhou_em = 0.0
+
+    # --- PostgreSQL -------------------------------------------------------
+
+    def _buscar_sql(self, db: Session, termo: str, categoria: Optional[str], limit: int) -> List[Alimento]:
+        nome = literal_column(EXPR_NOME)
+        documento = literal_column(EXPR_DOCUMENTO)
+        termo_like = _escapar_like(termo)
+        palavras_termo = palavras(termo)
+
+        corresponde_documento = None
+        if palavras_termo:
+            consulta_ts = func.to_tsquery(
+                literal_column("'simple'::regconfig"), " & ".join(f"{p}:*" for p in palavras_termo)
+            )
+            corresponde_documento = documento.op("@@")(consulta_ts)
+
+        faixas = [(nome == termo, 0), (nome.like(f"{termo_like}%"), 1)]
+        if corresponde_documento is not None:
+            faixas.append((corresponde_documento, 2))
+        faixas.append((nome.like(f"%{termo_like}%"), 3))
+        faixa = case(*faixas, else_=4)
+
+        filtro_categoria = []
+        if categoria:
+            filtro_categoria.append(func.lower(Alimento.categoria).ilike(f"%{categoria.strip().lower()}%"))
+
+        # 1ª etapa: quantas linhas cada faixa 0-3 tem (só LIKE e @@, baratos e indexados).
+        # Se as faixas até 'corte' já preenchem o limite, a 2ª etapa lê só essas linhas e
+        # não precisa do operador % nem de similarity() nas demais (com 2-3 letras digitadas,
+        # quase toda a tabela casaria)
+        por_faixa = dict(
+            db.query(faixa, func.count())
+            .select_from(Alimento)
+            .filter(or_(*(condicao for condicao, _ in faixas)), *filtro_categoria)
+            .group_by(faixa)
+            .all()
+        )
+        acumulado, corte = 0, 4
+        for numero in range(4):
+            acumulado += por_faixa.get(numero, 0)
+            if acumulado >= limit:
+                corte = numero
+                break
+
+        # Cada filtro é atendido por um dos índices GIN (LIKE e % pelo trigrama, @@ pelo tsvector)
+        filtros = [condicao for condicao, numero in faixas if numero <= corte]
+        if corte == 4:
+            filtros.append(nome.op("%")(termo))
+
+        return db.query(Alimento).filter(or_(*filtros), *filtro_categoria).order_by(
+            faixa,
+            func.similarity(nome, termo).desc(),
+            func.length(func.coalesce(Alimento.alimento, "")),
+            Alimento.id,
+        ).limit(limit).all()
+
+    # --- Índice em memória ------------------------------------------------
+
+    def _expirado(self, snapshot: Optional[_SnapshotBusca]) -> bool:
+        if snapshot is None:
+            return True
+        return self.ttl_segundos > 0 and time.monotonic() - snapshot.criado_em > self.ttl_segundos
+
+    def _construir(self, db: Session) -> _SnapshotBusca:
+        inicio = time.perf_counter()
+        linhas = db.query(Alimento.id, Alimento.alimento, Alimento.alimentos, Alimento.categoria).all()
+        itens, trigramas_por_item = [], []
+        for linha in linhas:
+            nome = sem_acentos_minusculo(linha.alimento)
+            documento = " ".join(
+                sem_acentos_minusculo(parte) for parte in (linha.alimento, linha.alimentos, linha.categoria)
+            )
+            trigramas_nome = trigramas(nome)
+            trigramas_por_item.append(trigramas_nome)
+            itens.append(_ItemBusca(
+                id=linha.id,
+                nome=nome,
+                comprimento=len(linha.alimento or ""),
+                categoria=(linha.categoria or "").lower(),
+                palavras_documento=frozenset(palavras(documento)),
+                total_trigramas=len(trigramas_nome),
+            ))
+        logger.info(f"🔎 Índice de busca de alimentos construído: {len(itens)} itens ({time.perf_counter() - inicio:.3f}s)")
+        return _SnapshotBusca(itens, trigramas_por_item)
+
+    def obter_snapshot(self, db: Session) -> _SnapshotBusca:
+        snapshot = self._snapshot
+        if not self._expirado(snapshot):
+            return snapshot
+        # Sem esperar o lock: com AsyncSession.run_sync a reconstrução roda num greenlet
+        # na thread do event loop, e esperar por ela ali travaria o loop. Quem não
+        # reconstrói usa o snapshot anterior (ou monta o seu, se ainda não houver nenhum)
+        if not self._lock.acquire(blocking=False):
+            return snapshot if snapshot is not None else self._construir(db)
+        try:
+            snapshot = self._snapshot
+            if self._expirado(snapshot):
+                snapshot = self._construir(db)
+                self._snapshot = snapshot
+            return snapshot
+        finally:
+            self._lock.release()
+
+    def invalidar(self) -> None:
+        """Descarta o índice em memória; o próximo acesso reconstrói."""
+        self._snapshot = None
+
+    def _buscar_memoria(self, db: Session, termo: str, categoria: Optional[str], limit: int) -> List[Alimento]:
+        ids = self.obter_snapshot(db).buscar(termo, categoria, limit)
+        if not ids:
+            return []
+        por_id: Dict[int, Alimento] = {a.id: a for a in db.query(Alimento).filter(Alimento.id.in_(ids)).all()}
+        return [por_id[i] for i in ids if i in por_id]
+
+    def _usar_sql(self, db: Session) -> bool:
+        if db.get_bind().dialect.name != "postgresql":
+            return False
+        return self._sql_disponivel is not False or time.monotonic() - self._sql_falhou_em > NOVO_TESTE_SQL_SEGUNDOS
+
+    # --- API --------------------------------------------------------------
+
+    def buscar(self, db: Session, q: str, categoria: Optional[str] = None, limit: int = 10) -> List[Alimento]:
+        """Alimentos que correspondem a 'q', do mais ao menos relevante."""
+        termo = normalizar_termo(q)
+        if not termo:
+            return []
+
+        if self._usar_sql(db):
+            try:
+                resultados = self._buscar_sql(db, termo, categoria, limit)
+                self._sql_disponivel = True
+                return resultados
+            except ProgrammingError as e:
+                # f_unaccent, extensão ou tabela ausentes. Outros erros (rede, statement_timeout)
+                # sobem: um erro transitório não pode mandar as buscas seguintes para a varredura em memória
+                db.rollback()
+                self._sql_disponivel = False
+                self._sql_falhou_em = time.monotonic()
+                logger.warning(
+                    f"⚠️ Busca indexada indisponível (migração 001 aplicada?): {e}. "
+                    f"Usando índice em memória; novo teste em {NOVO_TESTE_SQL_SEGUNDOS}s."
+                )
+
+        return self._buscar_memoria(db, termo, categoria, limit)
+
+
+# Instância única do processo
+busca_alimentos = BuscaAlimentos(ttl_segundos=settings.INDICE_ALIMENTOS_TTL_SEGUNDOS)
@@ -0,0 +1,107 @@
+# app/services/cache_principal.py
+#
+# Cache do usuário autenticado (principal) usado por get_current_user.
+# O dashboard dispara várias requisições autenticadas ao mesmo tempo; sem o
+# cache, cada uma refazia a mesma consulta do usuário pelo e-mail do token.
+#
+# - Cache local com TTL curto, chaveado pelo 'sub' do token (e-mail).
+# - Desativações removem o usuário do cache e entram numa lista de revogados
+#   (local e, com REDIS_HABILITADO, compartilhada entre instâncias), válida
+#   pelo tempo de vida de um access token. A resposta "não revogado" do Redis
+#   também fica em cache pelo mesmo TTL curto, então o caminho quente continua
+#   sendo só uma consulta a dicionário.
+
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from app.config import settings
+from app.redis_utils import get_redis_async
+from app.services.cache_scan import CacheLRU
+
+logger = logging.getLogger(__name__)
+
+PREFIXO_REVOGADO = "auth:desativado:"
+
+
+@dataclass(frozen=True)
+class UsuarioAutenticado:
+    """Cópia leve (desacoplada da Session) dos campos do usuário usados pelas rotas."""
+    id: int
+    email: str
+    nome: str
+    apelido: Optional[str]
+    is_active: bool
+
+
+class CachePrincipal:
+    def __init__(self, max_itens: int, ttl_segundos: int, ttl_revogacao_segundos: int):
+        self.ttl_revogacao_segundos = ttl_revogacao_segundos
+        self.usuarios = CacheLRU(max_itens=max_itens, ttl_segundos=ttl_segundos)
+        self.revogados = CacheLRU(max_itens=max_itens, ttl_segundos=ttl_revogacao_segundos)
+        self.nao_revogados = CacheLRU(max_itens=max_itens, ttl_segundos=ttl_segundos)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, email: str) -> Optional[UsuarioAutenticado]:
+        usuario = self.usuarios.get(email)
+        if usuario is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return usuario
+
+    def set(self, usuario: UsuarioAutenticado) -> None:
+        self.usuarios.set(usuario.email, usuario)
+
+    def invalidar(self, email: str) -> None:
+        """Remove o usuário do cache local (ex.: dados alterados)."""
+        self.usuarios.set(email, None)
+
+    async def revogar(self, usuario_id: int, email: str) -> None:
+        """Chamado quando o usuário é desativado: tokens já emitidos deixam de valer."""
+        self.invalidar(email)
+        self.revogados.set(str(usuario_id), True)
+        self.nao_revogados.set(str(usuario_id), None)
+        redis = get_redis_async()
+        if redis is not None:
+            try:
+                await redis.set(f"{PREFIXO_REVOGADO}{usuario_id}", 1, ex=self.ttl_revogacao_segundos)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao propagar desativação do usuário {usuario_id} no Redis: {e}")
+
+    async def revogado(self, usuario_id: int) -> bool:
+        """Consulta a lista de revogados (local e, se houver, Redis). Falhas do Redis não bloqueiam o acesso."""
+        chave = str(usuario_id)
+        if self.revogados.get(chave):
+            return True
+        if self.nao_revogados.get(chave):
+            return False
+        redis = get_redis_async()
+        if redis is not None:
+            try:
+                if await redis.exists(f"{PREFIXO_REVOGADO}{usuario_id}"):
+                    self.revogados.set(chave, True)
+                    return True
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao consultar revogações no Redis: {e}")
+                return False
+        self.nao_revogados.set(chave, True)
+        return False
+
+    def estatisticas(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_acerto": round(self.hits / total, 3) if total else 0.0,
+            "itens": len(self.usuarios),
+        }
+
+
+# Instância única do processo
+cache_principal = CachePrincipal(
+    max_itens=settings.AUTH_CACHE_MAX_ITENS,
+    ttl_segundos=settings.AUTH_CACHE_TTL_SEGUNDOS,
+    ttl_revogacao_segundos=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
@@ -0,0 +1,127 @@
+# app/services/cache_scan.py
+#
+# Cache de resultados do scan rápido, endereçado pelo conteúdo da imagem.
+# Reenvios da mesma foto (retry, toque duplo, falha ao salvar) não geram
+# uma nova chamada ao Gemini.
+
+import hashlib
+import json
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.redis_utils import get_redis_async
+from app.vision import GEMINI_MODEL_NAME, PROMPT_SCAN
+
+logger = logging.getLogger(__name__)
+
+# Qualquer alteração no prompt muda a versão e, portanto, invalida o cache
+PROMPT_SCAN_VERSAO = hashlib.sha256(PROMPT_SCAN.encode("utf-8")).hexdigest()[:12]
+
+
+class CacheLRU:
+    """Cache LRU local com expiração por TTL."""
+
+    def __init__(self, max_itens: int, ttl_segundos: int):
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._itens: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave: str) -> Optional[Any]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            expira_em, valor = item
+            if expira_em < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave: str, valor: Any) -> None:
+        with self._lock:
+            self._itens[chave] = (time.monotonic() + self.ttl_segundos, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+
+class CacheScanRapido:
+    """
+    Cache em dois níveis: LRU local (por instância) e Redis (compartilhado,
+    opcional). Falhas do Redis nunca derrubam o scan; contam como miss.
+    """
+
+    def __init__(self, max_itens: int, ttl_segundos: int):
+        self.ttl_segundos = ttl_segundos
+        self.local = CacheLRU(max_itens=max_itens, ttl_segundos=ttl_segundos)
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.erros_redis = 0
+
+    @staticmethod
+    def gerar_chave(conteudo_imagem: bytes) -> str:
+        """Chave = modelo + versão do prompt + SHA-256 dos bytes da imagem."""
+        digest = hashlib.sha256(conteudo_imagem).hexdigest()
+        return f"scan:{GEMINI_MODEL_NAME}:{PROMPT_SCAN_VERSAO}:{digest}"
+
+    async def get(self, chave: str) -> Optional[Dict[str, Any]]:
+        resultado = self.local.get(chave)
+        if resultado is not None:
+            self.hits_local += 1
+            return resultado
+
+        redis = get_redis_async()
+        if redis is not None:
+            try:
+                bruto = await redis.get(chave)
+                if bruto is not None:
+                    resultado = json.loads(bruto)
+                    self.local.set(chave, resultado)
+                    self.hits_redis += 1
+                    return resultado
+            except Exception as e:
+                self.erros_redis += 1
+                logger.warning(f"⚠️ Falha ao ler cache do scan no Redis: {e}")
+
+        self.misses += 1
+        return None
+
+    async def set(self, chave: str, resultado: Dict[str, Any]) -> None:
+        self.local.set(chave, resultado)
+
+        redis = get_redis_async()
+        if redis is not None:
+            try:
+                await redis.set(chave, json.dumps(resultado, ensure_ascii=False), ex=self.ttl_segundos)
+            except Exception as e:
+                self.erros_redis += 1
+                logger.warning(f"⚠️ Falha ao gravar cache do scan no Redis: {e}")
+
+    def estatisticas(self) -> Dict[str, Any]:
+        total = self.hits_local + self.hits_redis + self.misses
+        return {
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "erros_redis": self.erros_redis,
+            "taxa_acerto": round((self.hits_local + self.hits_redis) / total, 3) if total else 0.0,
+            "itens_locais": len(self.local),
+            "prompt_versao": PROMPT_SCAN_VERSAO,
+        }
+
+
+# Instância única do processo
+cache_scan = CacheScanRapido(
+    max_itens=settings.SCAN_CACHE_MAX_ITENS,
+    ttl_segundos=settings.SCAN_CACHE_TTL_SEGUNDOS,
+)
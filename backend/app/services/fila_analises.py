@@ -0,0 +1,317 @@
+# app/services/fila_analises.py
+#
+# Fila de jobs da análise detalhada. O /salvar-scan-editado só enfileira a
+# refeição e responde; os workers (no próprio processo da API ou em
+# 'python -m app.worker_analises') executam a análise.
+#
+# - Backends: Redis (ANALISE_FILA_BACKEND=redis, compartilhado entre instâncias
+#   e com o worker separado) ou memória (um processo só; desenvolvimento e testes).
+# - Cada refeição tem no máximo um job ativo (enfileirar de novo não duplica).
+# - Falhas transitórias (inclusive a IA sem recomendações) voltam para a fila com
+#   backoff exponencial; depois de ANALISE_MAX_TENTATIVAS o job vai para a
+#   dead-letter e a refeição fica ANALYSIS_FAILED. Na última tentativa, uma falha
+#   só da IA ainda salva a análise com os textos padrão.
+# - No Redis, o job em execução fica numa lista 'processando' com um lease; se o
+#   worker morrer, o job é devolvido à fila quando o lease expira.
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, asdict, field
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.redis_utils import get_redis_async
+from app.services.analise_detalhada import analisar_refeicao, marcar_falha, ErroAnaliseDefinitivo
+
+logger = logging.getLogger(__name__)
+
+MAX_MORTOS = 1000
+
+
+@dataclass
+class JobAnalise:
+    meal_id: int
+    user_id: int
+    tentativa: int = 1
+    ultimo_erro: Optional[str] = None
+    enfileirado_em: float = field(default_factory=time.time)
+
+    def para_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def de_json(cls, dados) -> "JobAnalise":
+        return cls(**json.loads(dados))
+
+
+class FilaAnalisesMemoria:
+    """Fila em memória: mesma interface da FilaAnalisesRedis, válida só dentro do processo."""
+
+    def __init__(self):
+        self._prontos: deque = deque()
+        self._agendados: list = []  # heap (instante, seq, job)
+        self._seq = itertools.count()
+        self._ativos: set = set()
+        self._estados: Dict[int, dict] = {}
+        self.mortos: deque = deque(maxlen=MAX_MORTOS)
+        self.processados = 0
+
+    async def enfileirar(self, meal_id: int, user_id: int) -> bool:
+        """Enfileira a análise da refeição. Retorna False se ela já tem um job ativo."""
+        if meal_id in self._ativos:
+            return False
+        self._ativos.add(meal_id)
+        self._estados[meal_id] = {"tentativas": 0, "erro": None}
+        self._prontos.append(JobAnalise(meal_id=meal_id, user_id=user_id))
+        return True
+
+    async def obter(self) -> Optional[JobAnalise]:
+        agora = time.time()
+        while self._agendados and self._agendados[0][0] <= agora:
+            self._prontos.append(heapq.heappop(self._agendados)[2])
+        if not self._prontos:
+            return None
+        job = self._prontos.popleft()
+        self._estados[job.meal_id] = {"tentativas": job.tentativa, "erro": job.ultimo_erro}
+        return job
+
+    async def concluir(self, job: JobAnalise) -> None:
+        self._ativos.discard(job.meal_id)
+        self._estados.pop(job.meal_id, None)
+        self.processados += 1
+
+    async def reagendar(self, job: JobAnalise, erro: str, atraso: float) -> None:
+        job.tentativa += 1
+        job.ultimo_erro = erro
+        self._estados[job.meal_id] = {"tentativas": job.tentativa - 1, "erro": erro}
+        heapq.heappush(self._agendados, (time.time() + atraso, next(self._seq), job))
+
+    async def mover_para_mortos(self, job: JobAnalise, erro: str) -> None:
+        job.ultimo_erro = erro
+        self._ativos.discard(job.meal_id)
+        self._estados[job.meal_id] = {"tentativas": job.tentativa, "erro": erro}
+        self.mortos.append(job)
+
+    async def estado(self, meal_id: int) -> Optional[dict]:
+        """Tentativas e último erro do job da refeição (None se não há job conhecido)."""
+        return self._estados.get(meal_id)
+
+    async def ativo(self, meal_id: int) -> bool:
+        """True se a refeição tem um job na fila, reagendado ou em execução."""
+        return meal_id in self._ativos
+
+    async def recuperar_orfaos(self) -> int:
+        return 0  # Jobs em memória morrem com o processo
+
+    async def estatisticas(self) -> dict:
+        return {
+            "backend": "memoria",
+            "prontos": len(self._prontos),
+            "agendados": len(self._agendados),
+            "ativos": len(self._ativos),
+            "mortos": len(self.mortos),
+            "processados": self.processados,
+        }
+
+
+class FilaAnalisesRedis:
+    """Fila no Redis (listas + sorted set de reagendados), compartilhada entre instâncias e workers."""
+
+    PREFIXO = "analises:"
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.chave_fila = f"{self.PREFIXO}fila"
+        self.chave_agendados = f"{self.PREFIXO}agendados"
+        self.chave_processando = f"{self.PREFIXO}processando"
+        self.chave_mortos = f"{self.PREFIXO}mortos"
+        self.chave_processados = f"{self.PREFIXO}processados"
+        # Payload exato de cada job em execução (necessário para o LREM da lista 'processando')
+        self._brutos: Dict[int, bytes] = {}
+
+    def _chave_ativo(self, meal_id: int) -> str:
+        return f"{self.PREFIXO}ativo:{meal_id}"
+
+    def _chave_lease(self, meal_id: int) -> str:
+        return f"{self.PREFIXO}lease:{meal_id}"
+
+    def _chave_estado(self, meal_id: int) -> str:
+        return f"{self.PREFIXO}estado:{meal_id}"
+
+    def _ttl_ativo(self) -> int:
+        # Cobre todas as tentativas com folga; se algo se perder, a refeição pode ser enfileirada de novo
+        espera = sum(settings.ANALISE_BACKOFF_SEGUNDOS * 2 ** i for i in range(settings.ANALISE_MAX_TENTATIVAS))
+        return int(settings.ANALISE_LEASE_SEGUNDOS * (settings.ANALISE_MAX_TENTATIVAS + 1) + espera)
+
+    async def _gravar_estado(self, meal_id: int, tentativas: int, erro: Optional[str]) -> None:
+        await self.redis.set(self._chave_estado(meal_id), json.dumps({"tentativas": tentativas, "erro": erro}), ex=86400)
+
+    async def enfileirar(self, meal_id: int, user_id: int) -> bool:
+        if not await self.redis.set(self._chave_ativo(meal_id), 1, nx=True, ex=self._ttl_ativo()):
+            return False
+        await self._gravar_estado(meal_id, 0, None)
+        await self.redis.rpush(self.chave_fila, JobAnalise(meal_id=meal_id, user_id=user_id).para_json())
+        return True
+
+    async def _promover_agendados(self) -> None:
+        vencidos = await self.redis.zrangebyscore(self.chave_agendados, 0, time.time(), start=0, num=50)
+        for bruto in vencidos:
+            # ZREM decide qual worker promove o job (só um recebe 1)
+            if await self.redis.zrem(self.chave_agendados, bruto):
+                await self.redis.rpush(self.chave_fila, bruto)
+
+    async def obter(self) -> Optional[JobAnalise]:
+        await self._promover_agendados()
+        bruto = await self.redis.lmove(self.chave_fila, self.chave_processando, "LEFT", "RIGHT")
+        if bruto is None:
+            return None
+        job = JobAnalise.de_json(bruto)
+        self._brutos[job.meal_id] = bruto
+        await self.redis.set(self._chave_lease(job.meal_id), 1, ex=settings.ANALISE_LEASE_SEGUNDOS)
+        await self._gravar_estado(job.meal_id, job.tentativa, job.ultimo_erro)
+        return job
+
+    async def _retirar_de_processando(self, job: JobAnalise) -> None:
+        bruto = self._brutos.pop(job.meal_id, None)
+        if bruto is not None:
+            await self.redis.lrem(self.chave_processando, 1, bruto)
+        await self.redis.delete(self._chave_lease(job.meal_id))
+
+    async def concluir(self, job: JobAnalise) -> None:
+        await self._retirar_de_processando(job)
+        await self.redis.delete(self._chave_ativo(job.meal_id), self._chave_estado(job.meal_id))
+        await self.redis.incr(self.chave_processados)
+
+    async def reagendar(self, job: JobAnalise, erro: str, atraso: float) -> None:
+        await self._retirar_de_processando(job)
+        job.tentativa += 1
+        job.ultimo_erro = erro
+        await self._gravar_estado(job.meal_id, job.tentativa - 1, erro)
+        await self.redis.zadd(self.chave_agendados, {job.para_json(): time.time() + atraso})
+
+    async def mover_para_mortos(self, job: JobAnalise, erro: str) -> None:
+        await self._retirar_de_processando(job)
+        job.ultimo_erro = erro
+        await self._gravar_estado(job.meal_id, job.tentativa, erro)
+        await self.redis.lpush(self.chave_mortos, job.para_json())
+        await self.redis.ltrim(self.chave_mortos, 0, MAX_MORTOS - 1)
+        await self.redis.delete(self._chave_ativo(job.meal_id))
+
+    async def estado(self, meal_id: int) -> Optional[dict]:
+        dados = await self.redis.get(self._chave_estado(meal_id))
+        return json.loads(dados) if dados else None
+
+    async def ativo(self, meal_id: int) -> bool:
+        return bool(await self.redis.exists(self._chave_ativo(meal_id)))
+
+    async def recuperar_orfaos(self) -> int:
+        """Devolve à fila os jobs em 'processando' cujo lease expirou (worker caiu no meio)."""
+        devolvidos = 0
+        for bruto in await self.redis.lrange(self.chave_processando, 0, -1):
+            job = JobAnalise.de_json(bruto)
+            if await self.redis.exists(self._chave_lease(job.meal_id)):
+                continue
+            if await self.redis.lrem(self.chave_processando, 1, bruto):
+                await self.redis.rpush(self.chave_fila, bruto)
+                devolvidos += 1
+        if devolvidos:
+            logger.warning(f"♻️ {devolvidos} análise(s) órfã(s) devolvida(s) à fila.")
+        return devolvidos
+
+    async def estatisticas(self) -> dict:
+        return {
+            "backend": "redis",
+            "prontos": await self.redis.llen(self.chave_fila),
+            "agendados": await self.redis.zcard(self.chave_agendados),
+            "processando": await self.redis.llen(self.chave_processando),
+            "mortos": await self.redis.llen(self.chave_mortos),
+            "processados": int(await self.redis.get(self.chave_processados) or 0),
+        }
+
+
+def _criar_fila():
+    if settings.ANALISE_FILA_BACKEND == "redis":
+        redis = get_redis_async()
+        if redis is not None:
+            return FilaAnalisesRedis(redis)
+        logger.warning("⚠️ ANALISE_FILA_BACKEND=redis, mas o Redis não está disponível; usando a fila em memória.")
+    return FilaAnalisesMemoria()
+
+
+# Instância única do processo
+fila_analises = _criar_fila()
+
+
+class TrabalhadorAnalises:
+    """Consome a fila com até ANALISE_WORKERS análises simultâneas."""
+
+    def __init__(self, fila, session_factory, concorrencia: int):
+        self.fila = fila
+        self.session_factory = session_factory
+        self.concorrencia = max(1, concorrencia)
+        self._tarefas = []
+
+    async def _processar(self, job: JobAnalise) -> None:
+        # Session síncrona: toda chamada que vai ao banco passa pelo threadpool (estamos no event loop da API)
+        db = self.session_factory()
+        try:
+            inicio = time.perf_counter()
+            await analisar_refeicao(
+                db, job.meal_id, job.user_id, ultima_tentativa=job.tentativa >= settings.ANALISE_MAX_TENTATIVAS
+            )
+            await self.fila.concluir(job)
+            logger.info(f"✅ Análise da refeição {job.meal_id} concluída ({time.perf_counter() - inicio:.1f}s, tentativa {job.tentativa}).")
+        except Exception as e:
+            await run_in_threadpool(db.rollback)
+            erro = f"{e.__class__.__name__}: {e}"
+            if isinstance(e, ErroAnaliseDefinitivo) or job.tentativa >= settings.ANALISE_MAX_TENTATIVAS:
+                logger.error(f"❌ Análise da refeição {job.meal_id} falhou ({erro}); job na dead-letter.")
+                try:
+                    await run_in_threadpool(marcar_falha, db, job.meal_id, job.user_id)
+                except Exception as db_e:
+                    logger.error(f"Erro ao marcar FALHA na refeição {job.meal_id}: {db_e}")
+                await self.fila.mover_para_mortos(job, erro)
+            else:
+                atraso = settings.ANALISE_BACKOFF_SEGUNDOS * 2 ** (job.tentativa - 1)
+                logger.warning(f"🔁 Análise da refeição {job.meal_id} falhou ({erro}); nova tentativa em {atraso:.0f}s.")
+                await self.fila.reagendar(job, erro, atraso)
+        finally:
+            await run_in_threadpool(db.close)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                job = await self.fila.obter()
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao ler a fila de análises: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(settings.ANALISE_POLL_SEGUNDOS)
+                continue
+            await self._processar(job)
+
+    async def _loop_orfaos(self) -> None:
+        while True:
+            await asyncio.sleep(settings.ANALISE_LEASE_SEGUNDOS)
+            try:
+                await self.fila.recuperar_orfaos()
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao recuperar análises órfãs: {e}")
+
+    def iniciar(self) -> None:
+        self._tarefas = [asyncio.create_task(self._loop()) for _ in range(self.concorrencia)]
+        self._tarefas.append(asyncio.create_task(self._loop_orfaos()))
+        logger.info(f"👷 Workers da análise detalhada iniciados ({self.concorrencia}, fila: {self.fila.__class__.__name__}).")
+
+    async def parar(self) -> None:
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
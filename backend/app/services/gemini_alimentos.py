@@ -0,0 +1,134 @@
+# app/services/gemini_alimentos.py
+#
+# Consulta ao Gemini para criar alimentos que não existem na tabela 'alimentos'.
+#
+# - Single-flight: pedidos simultâneos para o mesmo nome normalizado compartilham
+#   uma única chamada em andamento (os demais esperam o resultado do "líder").
+# - Cache negativo: nomes cuja resposta do Gemini não pôde ser usada (payload
+#   inválido, ver marcar_invalido) não são perguntados de novo até o TTL expirar.
+#   Falhas transitórias (timeout, cota, rede) não entram: a próxima refeição com
+#   o mesmo nome consulta de novo.
+#
+# O escopo é o processo; entre instâncias, a constraint unique em
+# alimento_normalizado continua sendo a garantia final (ver crud).
+
+import threading
+import logging
+from typing import Any, Callable, Dict, Tuple
+
+from app.config import settings
+from app.services.cache_scan import CacheLRU
+from app.vision import fetch_gemini_nutritional_data
+
+logger = logging.getLogger(__name__)
+
+
+class _ChamadaEmAndamento:
+    def __init__(self):
+        self.concluida = threading.Event()
+        self.resultado: Any = None
+        self.excecao: BaseException = None
+
+
+class SingleFlight:
+    """Garante no máximo uma execução em andamento por chave (entre threads)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._em_andamento: Dict[str, _ChamadaEmAndamento] = {}
+
+    def executar(self, chave: str, funcao: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Executa `funcao` ou espera a execução já em andamento para a mesma chave.
+        Retorna (resultado, compartilhado) — compartilhado=True quando a chamada foi coalescida.
+        """
+        with self._lock:
+            chamada = self._em_andamento.get(chave)
+            lider = chamada is None
+            if lider:
+                chamada = _ChamadaEmAndamento()
+                self._em_andamento[chave] = chamada
+
+        if not lider:
+            chamada.concluida.wait()
+            if chamada.excecao is not None:
+                raise chamada.excecao
+            return chamada.resultado, True
+
+        try:
+            chamada.resultado = funcao()
+        except BaseException as e:
+            chamada.excecao = e
+            raise
+        finally:
+            with self._lock:
+                del self._em_andamento[chave]
+            chamada.concluida.set()
+        return chamada.resultado, False
+
+
+class ConsultaGeminiAlimentos:
+    """fetch_gemini_nutritional_data com single-flight e cache negativo por nome normalizado."""
+
+    def __init__(self, max_itens_negativos: int, ttl_negativo_segundos: int):
+        self.single_flight = SingleFlight()
+        self.negativos = CacheLRU(max_itens=max_itens_negativos, ttl_segundos=ttl_negativo_segundos)
+        self._lock = threading.Lock()
+        self.chamadas_modelo = 0
+        self.chamadas_coalescidas = 0
+        self.hits_negativos = 0
+        self.falhas = 0
+
+    def _contar(self, campo: str) -> None:
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def _chamar_modelo(self, nome_normalizado: str, nome: str) -> Dict[str, Any]:
+        self._contar("chamadas_modelo")
+        try:
+            dados_ia = fetch_gemini_nutritional_data(nome)
+        except Exception as e:
+            dados_ia = {"erro": f"Falha ao obter dados para {nome}: {e}"}
+        if "erro" in dados_ia:
+            # Sem cache negativo: o erro é transitório e o nome ficaria fora dos totais por uma hora
+            self._contar("falhas")
+        return dados_ia
+
+    def consultar(self, nome_normalizado: str, nome: str) -> Dict[str, Any]:
+        """Retorna os dados nutricionais do Gemini ou um dict com a chave 'erro'."""
+        negativo = self.negativos.get(nome_normalizado)
+        if negativo is not None:
+            self._contar("hits_negativos")
+            logger.info(f"⏭️ '{nome}' teve resposta inválida do Gemini recentemente; pulando nova consulta.")
+            return negativo
+
+        dados_ia, compartilhado = self.single_flight.executar(
+            nome_normalizado, lambda: self._chamar_modelo(nome_normalizado, nome)
+        )
+        if compartilhado:
+            self._contar("chamadas_coalescidas")
+            logger.info(f"🔗 Consulta ao Gemini para '{nome}' compartilhada com outra requisição.")
+        return dados_ia
+
+    def marcar_invalido(self, nome_normalizado: str, motivo: str) -> None:
+        """Registra no cache negativo uma resposta do Gemini que não pôde ser usada."""
+        self._contar("falhas")
+        self.negativos.set(nome_normalizado, {"erro": motivo})
+
+    def estatisticas(self) -> Dict[str, Any]:
+        pedidos = self.chamadas_modelo + self.chamadas_coalescidas + self.hits_negativos
+        return {
+            "chamadas_modelo": self.chamadas_modelo,
+            "chamadas_coalescidas": self.chamadas_coalescidas,
+            "hits_negativos": self.hits_negativos,
+            "falhas": self.falhas,
+            "chamadas_evitadas": round((self.chamadas_coalescidas + self.hits_negativos) / pedidos, 3) if pedidos else 0.0,
+            "itens_negativos": len(self.negativos),
+        }
+
+
+# Instância única do processo
+consulta_gemini_alimentos = ConsultaGeminiAlimentos(
+    max_itens_negativos=settings.GEMINI_ALIMENTOS_NEGATIVO_MAX_ITENS,
+    ttl_negativo_segundos=settings.GEMINI_ALIMENTOS_NEGATIVO_TTL_SEGUNDOS,
+)
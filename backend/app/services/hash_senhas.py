@@ -0,0 +1,173 @@
+# app/services/hash_senhas.py
+#
+# Hash de senhas (bcrypt) fora do threadpool das rotas.
+#
+# Cada hashpw/checkpw no custo 12 consome ~250 ms de CPU. Rodando nas rotas
+# síncronas, uma rajada de logins ocupava as threads do threadpool do Starlette
+# (compartilhado com /historico, /resumo-diario...) e as demais rotas ficavam na
+# fila. Aqui o bcrypt roda num pool de processos do tamanho dos núcleos
+# (SENHA_PROCESSOS), com limite de operações pendentes (SENHA_FILA_MAX): acima
+# dele a requisição é recusada na hora (SobrecargaSenhas -> 503 + Retry-After)
+# em vez de acumular latência para todo mundo.
+#
+# Hashes gerados com um custo diferente de SENHA_BCRYPT_CUSTO são refeitos no
+# login bem-sucedido (no mesmo processo do pool, aproveitando a senha em claro).
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional, Tuple
+
+import bcrypt
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_MAX_BYTES = 72
+
+
+class SobrecargaSenhas(Exception):
+    """Operações de senha pendentes acima de SENHA_FILA_MAX."""
+
+
+# --- Funções executadas nos processos do pool (precisam ser picklable) ----
+
+def gerar_hash(senha: str, custo: int) -> str:
+    """Levanta ValueError para senhas acima de 72 bytes (o bcrypt truncaria em silêncio)."""
+    senha_bytes = senha.encode('utf-8')
+    if len(senha_bytes) > BCRYPT_MAX_BYTES:
+        raise ValueError(
+            "Senha muito longa. O bcrypt suporta no máximo 72 bytes UTF-8. "
+            f"Sua senha tem {len(senha_bytes)} bytes."
+        )
+    return bcrypt.hashpw(senha_bytes, bcrypt.gensalt(rounds=custo)).decode('utf-8')
+
+
+def verificar_hash(senha: str, senha_hash: str) -> bool:
+    senha_bytes = senha.encode('utf-8')
+    if len(senha_bytes) > BCRYPT_MAX_BYTES:
+        return False
+    if isinstance(senha_hash, str):
+        senha_hash = senha_hash.encode('utf-8')
+    try:
+        return bcrypt.checkpw(senha_bytes, senha_hash)
+    except ValueError:
+        # Hash corrompido/em outro formato
+        return False
+
+
+def custo_do_hash(senha_hash: str) -> Optional[int]:
+    """Custo de um hash "$2b$12$...", ou None se o formato não for reconhecido."""
+    partes = senha_hash.split("$")
+    if len(partes) < 4 or not partes[2].isdigit():
+        return None
+    return int(partes[2])
+
+
+def verificar_e_atualizar(senha: str, senha_hash: str, custo: int) -> Tuple[bool, Optional[str]]:
+    """(senha confere, novo hash) — o novo hash só vem quando o custo armazenado difere de 'custo'."""
+    if not verificar_hash(senha, senha_hash):
+        return False, None
+    if custo_do_hash(senha_hash) == custo:
+        return True, None
+    return True, gerar_hash(senha, custo)
+
+
+def _aquecer() -> int:
+    return os.getpid()
+
+
+# --- Pool de processos ----------------------------------------------------
+
+class ExecutorSenhas:
+    """bcrypt num ProcessPoolExecutor limitado, com recusa imediata acima da fila máxima."""
+
+    def __init__(self, processos: int, fila_max: int, custo: int):
+        self.processos = processos
+        self.fila_max = fila_max
+        self.custo = custo
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Só é alterado no event loop (sem lock)
+        self.pendentes = 0
+        self.hashes = 0
+        self.verificacoes = 0
+        self.rehashes = 0
+        self.recusadas = 0
+        self._em_sobrecarga = False
+
+    def _obter_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # 'spawn': o processo da API já tem threads (threadpool, clientes) e fork com threads é inseguro
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processos, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    async def iniciar(self) -> None:
+        """Sobe os processos no startup, para o primeiro login não pagar a criação deles."""
+        loop = asyncio.get_running_loop()
+        pool = self._obter_pool()
+        pids = await asyncio.gather(*(loop.run_in_executor(pool, _aquecer) for _ in range(self.processos)))
+        logger.info(f"🔑 Pool de hash de senhas pronto: {len(set(pids))} processos, custo bcrypt {self.custo}.")
+
+    def encerrar(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _executar(self, funcao, *args) -> Any:
+        # Capacidade = processos ocupados + fila; acima disso a espera só aumentaria
+        if self.pendentes >= self.processos + self.fila_max:
+            self.recusadas += 1
+            if not self._em_sobrecarga:
+                # Um aviso por episódio de sobrecarga, não um por requisição recusada
+                self._em_sobrecarga = True
+                logger.warning(f"🚦 Pool de senhas cheio ({self.pendentes} operações pendentes): recusando logins/registros.")
+            raise SobrecargaSenhas()
+        if self._em_sobrecarga and self.pendentes < self.processos:
+            self._em_sobrecarga = False
+            logger.info(f"✅ Pool de senhas normalizado ({self.recusadas} recusadas até agora).")
+        self.pendentes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._obter_pool(), funcao, *args)
+        except BrokenProcessPool:
+            # Um processo morreu (ex.: OOM): o próximo pedido cria um pool novo
+            logger.error("❌ Pool de hash de senhas quebrado; será recriado.")
+            self._pool = None
+            raise
+        finally:
+            self.pendentes -= 1
+
+    async def gerar_hash(self, senha: str) -> str:
+        self.hashes += 1
+        return await self._executar(gerar_hash, senha, self.custo)
+
+    async def verificar(self, senha: str, senha_hash: str) -> Tuple[bool, Optional[str]]:
+        """(senha confere, novo hash a gravar quando o custo mudou)."""
+        self.verificacoes += 1
+        ok, novo_hash = await self._executar(verificar_e_atualizar, senha, senha_hash, self.custo)
+        if novo_hash is not None:
+            self.rehashes += 1
+        return ok, novo_hash
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "processos": self.processos,
+            "pendentes": self.pendentes,
+            "hashes": self.hashes,
+            "verificacoes": self.verificacoes,
+            "rehashes": self.rehashes,
+            "recusadas": self.recusadas,
+        }
+
+
+# Instância única do processo
+executor_senhas = ExecutorSenhas(
+    processos=settings.SENHA_PROCESSOS,
+    fila_max=settings.SENHA_FILA_MAX,
+    custo=settings.SENHA_BCRYPT_CUSTO,
+)
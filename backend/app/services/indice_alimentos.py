@@ -0,0 +1,172 @@
+# app/services/indice_alimentos.py
+#
+# Índice em memória da tabela 'alimentos', compartilhado por todo o processo.
+# Evita carregar e normalizar todas as linhas da tabela a cada conversão de medida.
+
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.alimentos import Alimento
+from app.utils.texto import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+# Limite de palavras-chave memorizadas por snapshot (evita crescer sem controle)
+MAX_PALAVRAS_EM_CACHE = 4096
+
+
+@dataclass(frozen=True)
+class AlimentoIndexado:
+    """Cópia leve (desacoplada da Session) dos campos usados nas conversões."""
+    id: int
+    alimentos: str
+    nome_normalizado: str
+    peso_aproximado_g: Optional[float]
+    un_medida_caseira: Optional[str]
+
+
+class _SnapshotIndice:
+    """
+    Estrutura imutável construída a partir de uma leitura da tabela.
+
+    Os itens ficam ordenados pelo critério de desempate já usado nas conversões
+    (comprimento do nome, depois ordem de inserção), então a posição de um item
+    na lista É a sua chave de ordenação.
+    """
+
+    def __init__(self, itens: List[AlimentoIndexado]):
+        self.itens = itens
+        self.criado_em = time.monotonic()
+
+        # Índice invertido: token normalizado -> posições dos itens que o contêm
+        postings: Dict[str, set] = {}
+        for posicao, item in enumerate(itens):
+            for token in set(item.nome_normalizado.split()):
+                postings.setdefault(token, set()).add(posicao)
+        self.postings: Dict[str, FrozenSet[int]] = {t: frozenset(p) for t, p in postings.items()}
+        self._cache_palavras: Dict[str, FrozenSet[int]] = {}
+
+    def _posicoes_da_palavra(self, palavra: str) -> FrozenSet[int]:
+        """
+        Posições cujo nome normalizado contém 'palavra' como substring.
+        Como a palavra não tem espaços, ela só pode ocorrer dentro de um único token,
+        então basta varrer o vocabulário (bem menor que a tabela) uma vez por palavra.
+        """
+        posicoes = self._cache_palavras.get(palavra)
+        if posicoes is not None:
+            return posicoes
+
+        encontrados = set()
+        for token, posicoes_token in self.postings.items():
+            if palavra in token:
+                encontrados.update(posicoes_token)
+        posicoes = frozenset(encontrados)
+
+        if len(self._cache_palavras) >= MAX_PALAVRAS_EM_CACHE:
+            self._cache_palavras.clear()
+        self._cache_palavras[palavra] = posicoes
+        return posicoes
+
+    def candidatos(self, palavras_chave: List[str]) -> FrozenSet[int]:
+        """Posições dos itens que contêm TODAS as palavras-chave."""
+        conjuntos = sorted((self._posicoes_da_palavra(p) for p in set(palavras_chave)), key=len)
+        resultado = conjuntos[0]
+        for conjunto in conjuntos[1:]:
+            if not resultado:
+                break
+            resultado = resultado & conjunto
+        return resultado
+
+
+class IndiceAlimentos:
+    """
+    Índice da tabela 'alimentos' com nomes pré-normalizados e busca por palavras-chave.
+
+    É reconstruído de forma preguiçosa: na primeira busca, após `invalidar()`
+    (chamado quando um novo alimento é inserido) ou quando o TTL expira
+    (para captar inserções feitas por outras instâncias).
+    """
+
+    def __init__(self, ttl_segundos: int):
+        self.ttl_segundos = ttl_segundos
+        self._snapshot: Optional[_SnapshotIndice] = None
+        self._lock = threading.Lock()
+
+    def _expirado(self, snapshot: Optional[_SnapshotIndice]) -> bool:
+        if snapshot is None:
+            return True
+        return self.ttl_segundos > 0 and time.monotonic() - snapshot.criado_em > self.ttl_segundos
+
+    def _construir(self, db: Session) -> _SnapshotIndice:
+        inicio = time.perf_counter()
+        linhas = db.query(
+            Alimento.id,
+            Alimento.alimentos,
+            Alimento.peso_aproximado_g,
+            Alimento.un_medida_caseira,
+        ).order_by(Alimento.id).all()
+
+        itens = [
+            AlimentoIndexado(
+                id=linha.id,
+                alimentos=linha.alimentos or "",
+                nome_normalizado=normalizar_texto(linha.alimentos),
+                peso_aproximado_g=linha.peso_aproximado_g,
+                un_medida_caseira=linha.un_medida_caseira,
+            )
+            for linha in linhas
+        ]
+        # Ordenação estável: empates de comprimento mantêm a ordem por id
+        itens.sort(key=lambda item: len(item.alimentos))
+
+        snapshot = _SnapshotIndice(itens)
+        logger.info(
+            f"📚 Índice de alimentos construído: {len(itens)} itens, "
+            f"{len(snapshot.postings)} tokens ({time.perf_counter() - inicio:.3f}s)"
+        )
+        return snapshot
+
+    def obter_snapshot(self, db: Session) -> _SnapshotIndice:
+        snapshot = self._snapshot
+        if self._expirado(snapshot):
+            with self._lock:
+                snapshot = self._snapshot
+                if self._expirado(snapshot):
+                    snapshot = self._construir(db)
+                    self._snapshot = snapshot
+        return snapshot
+
+    def invalidar(self) -> None:
+        """Descarta o snapshot atual; o próximo acesso reconstrói o índice."""
+        self._snapshot = None
+
+    def buscar_melhor(self, db: Session, alimento_nome: str) -> Optional[AlimentoIndexado]:
+        """
+        Retorna o alimento que contém todas as palavras da busca, priorizando
+        nomes que começam com a primeira palavra e, depois, os nomes mais curtos.
+        """
+        palavras_chave = normalizar_texto(alimento_nome).split()
+        if not palavras_chave:
+            return None
+
+        snapshot = self.obter_snapshot(db)
+        posicoes = snapshot.candidatos(palavras_chave)
+        if not posicoes:
+            return None
+
+        primeira_palavra = palavras_chave[0]
+        ordenadas = sorted(posicoes)
+        for posicao in ordenadas:
+            if snapshot.itens[posicao].nome_normalizado.startswith(primeira_palavra):
+                return snapshot.itens[posicao]
+        return snapshot.itens[ordenadas[0]]
+
+
+# Instância única do processo
+indice_alimentos = IndiceAlimentos(ttl_segundos=settings.INDICE_ALIMENTOS_TTL_SEGUNDOS)
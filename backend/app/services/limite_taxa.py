@@ -0,0 +1,323 @@
+# app/services/limite_taxa.py
+#
+# Limite de requisições compartilhado entre as instâncias e ponderado pelo
+# custo da rota.
+#
+# O slowapi guardava os contadores em memória, por IP: cada instância do Cloud
+# Run aplicava o próprio limite (o real era N vezes o configurado) e, atrás do
+# front end do Google, clientes diferentes chegavam com o mesmo IP. Um
+# /scan-rapido (upload + chamada ao Gemini) também custava o mesmo que /health.
+#
+# - Chave: o usuário do access token (assinatura verificada aqui, sem banco);
+#   sem token válido, o IP do cliente no X-Forwarded-For, pulando os
+#   LIMITE_PROXIES_CONFIAVEIS que o acrescentaram.
+# - Custo em unidades: o declarado na rota com @custo_requisicao (1 por padrão),
+#   mais LIMITE_CUSTO_CHAMADA_MODELO por chamada ao Gemini e 1 a cada
+#   LIMITE_BYTES_POR_UNIDADE do corpo (Content-Length).
+# - Rotas que só às vezes chamam o modelo (cache, banco, job já na fila) não
+#   declaram chamadas_modelo: cobram com cobrar_chamadas_modelo() logo antes da
+#   chamada, e a recusa vira 429 ali.
+# - GCRA: cada balde guarda um único número, o "tempo teórico de chegada"; uma
+#   requisição de custo c o avança c * intervalo e é recusada se ele passar de
+#   agora + rajada. Rotas que chamam o modelo consomem também um balde global
+#   (LIMITE_MODELO_CHAMADAS_POR_MINUTO), para a cota do projeto no Gemini.
+# - Com Redis, um script Lua verifica e consome todos os baldes da requisição
+#   de uma vez, no relógio do Redis. Se ele falhar, os baldes ficam em memória
+#   (limite por instância) e o Redis é tentado de novo após
+#   LIMITE_REDIS_PAUSA_SEGUNDOS.
+# - MiddlewareLimiteTaxa responde 429 + Retry-After antes de o corpo (a foto)
+#   ser lido.
+
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from jose import JWTError, jwt
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from app import metricas
+from app.config import settings
+from app.redis_utils import get_redis_async
+
+logger = logging.getLogger(__name__)
+
+PREFIXO_REDIS = "limite:"
+
+# KEYS: baldes. ARGV: intervalo_ms, custo e limite_ms de cada balde, nessa ordem.
+# Retorna {0, 0} se consumiu todos, ou {espera_ms, índice do balde} sem consumir nenhum.
+SCRIPT_GCRA = """
+local t = redis.call('TIME')
+local agora = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local novos = {}
+local espera, recusado = 0, 0
+for i, chave in ipairs(KEYS) do
+    local intervalo = tonumber(ARGV[i * 3 - 2])
+    local custo = tonumber(ARGV[i * 3 - 1])
+    local limite = tonumber(ARGV[i * 3])
+    local tat = math.max(tonumber(redis.call('GET', chave) or agora), agora)
+    local novo = math.ceil(tat + custo * intervalo)
+    if novo - agora - limite > espera then
+        espera, recusado = novo - agora - limite, i
+    end
+    novos[i] = novo
+end
+if recusado > 0 then
+    return {espera, recusado}
+end
+for i, chave in ipairs(KEYS) do
+    redis.call('SET', chave, string.format('%d', novos[i]), 'PX', novos[i] - agora)
+end
+return {0, 0}
+"""
+
+
+@dataclass(frozen=True)
+class CustoRequisicao:
+    unidades: int = 1
+    chamadas_modelo: int = 0
+
+    @property
+    def isento(self) -> bool:
+        return self.unidades == 0 and self.chamadas_modelo == 0
+
+
+CUSTO_PADRAO = CustoRequisicao()
+
+
+def custo_requisicao(unidades: int = 1, chamadas_modelo: int = 0):
+    """Declara o custo da rota (aplicar junto do @router.get/post). unidades=0 isenta a rota."""
+    custo = CustoRequisicao(unidades=unidades, chamadas_modelo=chamadas_modelo)
+
+    def decorador(endpoint):
+        endpoint.custo_requisicao = custo
+        return endpoint
+    return decorador
+
+
+@dataclass(frozen=True)
+class Balde:
+    tipo: str  # usuario, ip ou modelo
+    chave: str
+    intervalo: float  # segundos por unidade
+    custo: int
+    limite: float  # quanto o tempo teórico de chegada pode adiantar-se ao relógio (segundos)
+
+
+def _balde(tipo: str, chave: str, por_minuto: int, rajada: int, custo: int) -> Balde:
+    intervalo = 60.0 / por_minuto
+    # Uma requisição mais cara que a rajada inteira ainda passa com o balde vazio
+    return Balde(tipo, chave, intervalo, custo, max(rajada, custo) * intervalo)
+
+
+# --- Identificação e custo da requisição ----------------------------------
+
+def _ip_cliente(scope, headers: Headers) -> str:
+    proxies = settings.LIMITE_PROXIES_CONFIAVEIS
+    if proxies > 0:
+        # Cada proxy confiável acrescenta o endereço de quem o chamou; antes disso, o cliente escreve o que quiser
+        encaminhados = [ip.strip() for ip in headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+        if len(encaminhados) >= proxies:
+            return encaminhados[-proxies]
+    cliente = scope.get("client")
+    return cliente[0] if cliente else "desconhecido"
+
+
+def identificar(scope, headers: Headers) -> Tuple[str, str]:
+    """('usuario', id) para access tokens válidos; senão ('ip', endereço do cliente)."""
+    autorizacao = headers.get("authorization", "")
+    if autorizacao[:7].lower() == "bearer ":
+        try:
+            payload = jwt.decode(autorizacao[7:], settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            usuario = payload.get("uid") or payload.get("sub")
+            if usuario:
+                return "usuario", str(usuario)
+        except JWTError:
+            pass
+    return "ip", _ip_cliente(scope, headers)
+
+
+def custo_da_rota(scope) -> CustoRequisicao:
+    """Custo declarado no endpoint que vai atender a requisição (o roteamento ainda não aconteceu)."""
+    router = getattr(scope.get("app"), "router", None)
+    for rota in getattr(router, "routes", ()):
+        correspondencia, filho = rota.matches(scope)
+        if correspondencia == Match.FULL:
+            return getattr(filho.get("endpoint"), "custo_requisicao", CUSTO_PADRAO)
+    return CUSTO_PADRAO
+
+
+def unidades(custo: CustoRequisicao, headers: Headers) -> int:
+    try:
+        tamanho = max(int(headers.get("content-length", 0)), 0)
+    except ValueError:
+        tamanho = 0
+    return (
+        custo.unidades
+        + custo.chamadas_modelo * settings.LIMITE_CUSTO_CHAMADA_MODELO
+        + math.ceil(tamanho / settings.LIMITE_BYTES_POR_UNIDADE)
+    )
+
+
+# --- Limitador -------------------------------------------------------------
+
+class LimitadorTaxa:
+    """Baldes GCRA no Redis (compartilhados) ou em memória (fallback por instância)."""
+
+    def __init__(self, max_chaves_memoria: int, pausa_redis_segundos: float):
+        self.max_chaves_memoria = max_chaves_memoria
+        self.pausa_redis_segundos = pausa_redis_segundos
+        # Só é alterado no event loop (sem lock)
+        self._memoria: "OrderedDict[str, float]" = OrderedDict()
+        self._redis_pausado_ate = 0.0
+        self._script = None
+        self._script_cliente = None
+        self.permitidas = 0
+        self.recusadas: Dict[str, int] = {}
+        self.falhas_redis = 0
+
+    def baldes(self, tipo: str, identificador: str, custo: int, chamadas_modelo: int) -> List[Balde]:
+        if tipo == "usuario":
+            baldes = [_balde(tipo, f"u:{identificador}", settings.LIMITE_USUARIO_UNIDADES_POR_MINUTO,
+                             settings.LIMITE_USUARIO_RAJADA, custo)]
+        else:
+            baldes = [_balde(tipo, f"ip:{identificador}", settings.LIMITE_IP_UNIDADES_POR_MINUTO,
+                             settings.LIMITE_IP_RAJADA, custo)]
+        if chamadas_modelo and settings.LIMITE_MODELO_CHAMADAS_POR_MINUTO > 0:
+            baldes.append(_balde("modelo", "modelo", settings.LIMITE_MODELO_CHAMADAS_POR_MINUTO,
+                                 settings.LIMITE_MODELO_RAJADA, chamadas_modelo))
+        return baldes
+
+    async def consumir(self, baldes: List[Balde]) -> Tuple[float, Optional[Balde]]:
+        """(0, None) se a requisição passa; senão (segundos até caber, balde que recusou), sem consumir nada."""
+        resultado = await self._consumir_redis(baldes)
+        if resultado is None:
+            resultado = self._consumir_memoria(baldes)
+        espera, recusado = resultado
+        if recusado is None:
+            self.permitidas += 1
+        else:
+            self.recusadas[recusado.tipo] = self.recusadas.get(recusado.tipo, 0) + 1
+            metricas.LIMITE_TAXA_RECUSADAS.labels(recusado.tipo).inc()
+        return resultado
+
+    def _consumir_memoria(self, baldes: List[Balde]) -> Tuple[float, Optional[Balde]]:
+        agora = time.monotonic()
+        novos, espera, recusado = [], 0.0, None
+        for balde in baldes:
+            novo = max(self._memoria.get(balde.chave, agora), agora) + balde.custo * balde.intervalo
+            if novo - agora - balde.limite > espera:
+                espera, recusado = novo - agora - balde.limite, balde
+            novos.append(novo)
+        if recusado is not None:
+            return espera, recusado
+        for balde, novo in zip(baldes, novos):
+            self._memoria[balde.chave] = novo
+            self._memoria.move_to_end(balde.chave)
+        while len(self._memoria) > self.max_chaves_memoria:
+            self._memoria.popitem(last=False)
+        return 0.0, None
+
+    async def _consumir_redis(self, baldes: List[Balde]) -> Optional[Tuple[float, Optional[Balde]]]:
+        """None quando o Redis está desligado ou falhou (o chamador usa a memória)."""
+        redis = get_redis_async()
+        if redis is None or time.monotonic() < self._redis_pausado_ate:
+            return None
+        if self._script_cliente is not redis:
+            self._script = redis.register_script(SCRIPT_GCRA)
+            self._script_cliente = redis
+        argumentos = []
+        for balde in baldes:
+            argumentos += [balde.intervalo * 1000, balde.custo, balde.limite * 1000]
+        try:
+            espera_ms, indice = await self._script(
+                keys=[f"{PREFIXO_REDIS}{balde.chave}" for balde in baldes], args=argumentos
+            )
+        except Exception as e:
+            self.falhas_redis += 1
+            self._redis_pausado_ate = time.monotonic() + self.pausa_redis_segundos
+            # Um aviso por pausa, não um por requisição
+            logger.warning(
+                f"⚠️ Limite de taxa sem Redis ({e}); contadores em memória por "
+                f"{self.pausa_redis_segundos:.0f}s."
+            )
+            return None
+        if not indice:
+            return 0.0, None
+        return int(espera_ms) / 1000, baldes[int(indice) - 1]
+
+    def estatisticas(self) -> Dict[str, Any]:
+        em_memoria = get_redis_async() is None or time.monotonic() < self._redis_pausado_ate
+        return {
+            "armazenamento": "memoria" if em_memoria else "redis",
+            "permitidas": self.permitidas,
+            "recusadas": sum(self.recusadas.values()),
+            **{f"recusadas_{tipo}": total for tipo, total in self.recusadas.items()},
+            "falhas_redis": self.falhas_redis,
+            "chaves_memoria": len(self._memoria),
+        }
+
+
+# Instância única do processo
+limitador_taxa = LimitadorTaxa(
+    max_chaves_memoria=settings.LIMITE_MEMORIA_MAX_CHAVES,
+    pausa_redis_segundos=settings.LIMITE_REDIS_PAUSA_SEGUNDOS,
+)
+
+
+def _mensagem_recusa(recusado: Balde) -> str:
+    if recusado.tipo == "modelo":
+        return "Limite de análises por IA atingido. Tente novamente em instantes."
+    return "Muitas requisições. Tente novamente em instantes."
+
+
+def _retry_after(espera: float) -> str:
+    return str(max(1, math.ceil(espera)))
+
+
+async def cobrar_chamadas_modelo(request: Request, chamadas_modelo: int = 1) -> None:
+    """Consome as chamadas ao modelo que a rota vai fazer agora; HTTPException 429 se recusadas."""
+    tipo, identificador = identificar(request.scope, request.headers)
+    espera, recusado = await limitador_taxa.consumir(limitador_taxa.baldes(
+        tipo, identificador, chamadas_modelo * settings.LIMITE_CUSTO_CHAMADA_MODELO, chamadas_modelo
+    ))
+    if recusado is not None:
+        raise HTTPException(status_code=429, detail=_mensagem_recusa(recusado),
+                            headers={"Retry-After": _retry_after(espera)})
+
+
+class MiddlewareLimiteTaxa:
+    """Middleware ASGI: consome os baldes da requisição e responde 429 antes de ler o corpo."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        custo = custo_da_rota(scope)
+        if custo.isento:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        tipo, identificador = identificar(scope, headers)
+        espera, recusado = await limitador_taxa.consumir(
+            limitador_taxa.baldes(tipo, identificador, unidades(custo, headers), custo.chamadas_modelo)
+        )
+        if recusado is None:
+            await self.app(scope, receive, send)
+            return
+
+        resposta = JSONResponse(
+            status_code=429,
+            content={"error": True, "message": _mensagem_recusa(recusado), "status_code": 429, "path": scope["path"]},
+            headers={"Retry-After": _retry_after(espera)},
+        )
+        await resposta(scope, receive, send)
@@ -0,0 +1,165 @@
+# app/services/motor_nutrientes.py
+#
+# Motor de cálculo de nutrientes sobre a tabela 'alimentos', compartilhado por
+# todo o processo. A tabela fica em memória como uma matriz NumPy contígua
+# (alimentos × nutrientes, valores por grama) com um mapa id -> linha; os
+# nutrientes de uma refeição, de um dia ou de um lote de refeições saem de um
+# único produto vetor de gramas × matriz, já com todos os micro e macronutrientes.
+#
+# Reconstruído de forma preguiçosa, como o índice de alimentos: após
+# `invalidar()` (novo alimento inserido), quando o TTL expira ou quando aparece
+# um id que ainda não está na matriz.
+
+import threading
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.alimentos import Alimento
+
+logger = logging.getLogger(__name__)
+
+# (chave no resultado, coluna por 100 g em Alimento) — a ordem define as colunas da matriz
+NUTRIENTES: Tuple[Tuple[str, str], ...] = (
+    ("energia_kcal", "energia_kcal_100g"),
+    ("proteina_g", "proteina_g_100g"),
+    ("carboidrato_g", "carboidrato_g_100g"),
+    ("lipidios_g", "lipidios_g_100g"),
+    ("fibra_g", "fibra_g_100g"),
+    ("ac_graxos_saturados_g", "ac_graxos_saturados_g"),
+    ("ac_graxos_monoinsaturados_g", "ac_graxos_monoinsaturados_g"),
+    ("ac_graxos_poliinsaturados_g", "ac_graxos_poliinsaturados_g"),
+    ("colesterol_mg", "colesterol_mg_100g"),
+    ("sodio_mg", "sodio_mg_100g"),
+    ("potassio_mg", "potassio_mg_100g"),
+    ("calcio_mg", "calcio_mg_100g"),
+    ("ferro_mg", "ferro_mg_100g"),
+    ("magnesio_mg", "magnesio_mg_100g"),
+)
+CHAVES_NUTRIENTES: Tuple[str, ...] = tuple(chave for chave, _ in NUTRIENTES)
+
+# Item de refeição: (alimento_id, gramas). Ids None ou desconhecidos contribuem com zero.
+ItemRefeicao = Tuple[Optional[int], Optional[float]]
+
+
+class _MatrizNutrientes:
+    """Snapshot imutável: matriz (n_alimentos + 1) × n_nutrientes por grama; a última linha é de zeros."""
+
+    def __init__(self, ids: List[int], valores: np.ndarray):
+        self.linha_por_id: Dict[int, int] = {id_alimento: linha for linha, id_alimento in enumerate(ids)}
+        self.linha_vazia = len(ids)
+        self.matriz = np.ascontiguousarray(np.vstack([valores, np.zeros((1, len(NUTRIENTES)))]))
+        self.criado_em = time.monotonic()
+        # Ids já procurados e inexistentes neste snapshot (não disparam nova reconstrução)
+        self.ausentes: set = set()
+
+    def linhas(self, ids: Sequence[Optional[int]]) -> np.ndarray:
+        vazia = self.linha_vazia
+        return np.fromiter((self.linha_por_id.get(i, vazia) for i in ids), dtype=np.intp, count=len(ids))
+
+    def falta_algum(self, ids: Iterable[Optional[int]]) -> bool:
+        return any(i is not None and i not in self.linha_por_id and i not in self.ausentes for i in ids)
+
+
+class MotorNutrientes:
+    def __init__(self, ttl_segundos: int):
+        self.ttl_segundos = ttl_segundos
+        self._snapshot: Optional[_MatrizNutrientes] = None
+        self._lock = threading.Lock()
+
+    def _expirado(self, snapshot: Optional[_MatrizNutrientes]) -> bool:
+        if snapshot is None:
+            return True
+        return self.ttl_segundos > 0 and time.monotonic() - snapshot.criado_em > self.ttl_segundos
+
+    def _construir(self, db: Session) -> _MatrizNutrientes:
+        inicio = time.perf_counter()
+        colunas = [getattr(Alimento, coluna) for _, coluna in NUTRIENTES]
+        linhas = db.query(Alimento.id, *colunas).order_by(Alimento.id).all()
+
+        ids = [linha[0] for linha in linhas]
+        # None -> NaN -> 0 (nutriente não informado conta como zero, como no cálculo antigo)
+        valores = np.array([linha[1:] for linha in linhas], dtype=np.float64).reshape(len(linhas), len(NUTRIENTES))
+        valores = np.nan_to_num(valores, nan=0.0) / 100.0
+
+        snapshot = _MatrizNutrientes(ids, valores)
+        logger.info(
+            f"🧮 Matriz de nutrientes construída: {len(ids)} alimentos × {len(NUTRIENTES)} nutrientes "
+            f"({time.perf_counter() - inicio:.3f}s)"
+        )
+        return snapshot
+
+    def obter_snapshot(self, db: Session, ids: Iterable[Optional[int]] = ()) -> _MatrizNutrientes:
+        """Snapshot atual; reconstrói se expirado ou se algum dos 'ids' ainda não está na matriz."""
+        ids = list(ids)
+        snapshot = self._snapshot
+        if self._expirado(snapshot) or snapshot.falta_algum(ids):
+            with self._lock:
+                snapshot = self._snapshot
+                if self._expirado(snapshot) or snapshot.falta_algum(ids):
+                    snapshot = self._construir(db)
+                    snapshot.ausentes.update(i for i in ids if i is not None and i not in snapshot.linha_por_id)
+                    self._snapshot = snapshot
+        return snapshot
+
+    def invalidar(self) -> None:
+        """Descarta o snapshot atual; o próximo acesso reconstrói a matriz."""
+        self._snapshot = None
+
+    # --- Cálculos -----------------------------------------------------------
+
+    @staticmethod
+    def _vetor_gramas(itens: Sequence[ItemRefeicao]) -> np.ndarray:
+        return np.fromiter((max(gramas or 0.0, 0.0) for _, gramas in itens), dtype=np.float64, count=len(itens))
+
+    def calcular(self, db: Session, itens: Sequence[ItemRefeicao]) -> Dict[str, float]:
+        """Totais de todos os nutrientes de uma refeição (ou de um dia inteiro: basta juntar os itens)."""
+        itens = list(itens)
+        if not itens:
+            return dict.fromkeys(CHAVES_NUTRIENTES, 0.0)
+        snapshot = self.obter_snapshot(db, (id_alimento for id_alimento, _ in itens))
+        totais = self._vetor_gramas(itens) @ snapshot.matriz[snapshot.linhas([i for i, _ in itens])]
+        return como_dict(totais)
+
+    def calcular_por_item(self, db: Session, itens: Sequence[ItemRefeicao]) -> np.ndarray:
+        """Matriz itens × nutrientes com a contribuição de cada item (linhas na ordem de 'itens')."""
+        itens = list(itens)
+        if not itens:
+            return np.zeros((0, len(NUTRIENTES)))
+        snapshot = self.obter_snapshot(db, (id_alimento for id_alimento, _ in itens))
+        return snapshot.matriz[snapshot.linhas([i for i, _ in itens])] * self._vetor_gramas(itens)[:, None]
+
+    def calcular_lote(self, db: Session, refeicoes: Sequence[Sequence[ItemRefeicao]]) -> np.ndarray:
+        """
+        Totais de várias refeições de uma vez: matriz de gramas (refeições × alimentos
+        usados no lote) × submatriz de nutrientes desses alimentos. Retorna refeições × nutrientes.
+        """
+        todos_ids = [id_alimento for itens in refeicoes for id_alimento, _ in itens]
+        resultado = np.zeros((len(refeicoes), len(NUTRIENTES)))
+        if not todos_ids:
+            return resultado
+        snapshot = self.obter_snapshot(db, todos_ids)
+
+        linhas = snapshot.linhas(todos_ids)
+        usadas, coluna_do_item = np.unique(linhas, return_inverse=True)
+        refeicao_do_item = np.repeat(np.arange(len(refeicoes)), [len(itens) for itens in refeicoes])
+        gramas = np.zeros((len(refeicoes), len(usadas)))
+        np.add.at(gramas, (refeicao_do_item, coluna_do_item),
+                  self._vetor_gramas([item for itens in refeicoes for item in itens]))
+        np.matmul(gramas, snapshot.matriz[usadas], out=resultado)
+        return resultado
+
+
+def como_dict(vetor: np.ndarray, casas: Optional[int] = None) -> Dict[str, float]:
+    """Converte um vetor de nutrientes (na ordem de NUTRIENTES) em {chave: valor}."""
+    if casas is None:
+        return {chave: float(valor) for chave, valor in zip(CHAVES_NUTRIENTES, vetor)}
+    return {chave: round(float(valor), casas) for chave, valor in zip(CHAVES_NUTRIENTES, vetor)}
+
+
+# Instância única do processo
+motor_nutrientes = MotorNutrientes(ttl_segundos=settings.INDICE_ALIMENTOS_TTL_SEGUNDOS)
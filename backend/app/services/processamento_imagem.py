@@ -0,0 +1,82 @@
+# app/services/processamento_imagem.py
+#
+# Pré-processamento das fotos enviadas pelo app antes do Gemini e do GCS:
+# corrige a orientação EXIF, reduz para um lado máximo configurável,
+# remove metadados (EXIF/GPS) e recomprime em JPEG ou WebP.
+
+from dataclasses import dataclass
+from io import BytesIO
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from app.config import settings
+
+# Formatos de saída suportados -> (content_type, extensão)
+FORMATOS_SAIDA = {
+    "JPEG": ("image/jpeg", "jpg"),
+    "WEBP": ("image/webp", "webp"),
+}
+
+
+@dataclass(frozen=True)
+class ImagemProcessada:
+    conteudo: bytes
+    content_type: str
+    extensao: str
+    largura: int
+    altura: int
+    bytes_originais: int
+
+
+def preprocessar_imagem(
+    conteudo: bytes,
+    max_lado: int = None,
+    formato: str = None,
+    qualidade: int = None,
+) -> ImagemProcessada:
+    """
+    Gera a versão compacta da imagem. É uma operação de CPU: nas rotas
+    assíncronas, chame via `run_in_threadpool`.
+
+    Levanta ValueError se os bytes não forem uma imagem válida.
+    """
+    max_lado = max_lado or settings.IMAGEM_MAX_LADO
+    formato = (formato or settings.IMAGEM_FORMATO).upper()
+    qualidade = qualidade or settings.IMAGEM_QUALIDADE
+    if formato not in FORMATOS_SAIDA:
+        raise ValueError(f"Formato de saída não suportado: {formato}")
+
+    try:
+        img = Image.open(BytesIO(conteudo))
+        # JPEG: decodifica já em escala reduzida (1/2, 1/4, 1/8), bem mais rápido.
+        # O draft exige o tamanho final proporcional (não um quadrado max_lado x max_lado).
+        escala = max_lado / max(img.size)
+        if escala < 1:
+            img.draft("RGB", (int(img.width * escala), int(img.height * escala)))
+        img = ImageOps.exif_transpose(img)
+        # A decodificação é preguiçosa: arquivos truncados só falham aqui
+        img.thumbnail((max_lado, max_lado), Image.LANCZOS)
+        if formato == "JPEG" or img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if formato == "WEBP" and "A" in img.getbands() else "RGB")
+    except Image.DecompressionBombError as e:
+        # Dimensões acima de Image.MAX_IMAGE_PIXELS (não é OSError)
+        raise ValueError(f"Imagem grande demais: {e}")
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Arquivo de imagem inválido: {e}")
+
+    saida = BytesIO()
+    # Sem o parâmetro 'exif', nenhum metadado da foto original é gravado
+    if formato == "JPEG":
+        img.save(saida, format="JPEG", quality=qualidade, optimize=True, progressive=True)
+    else:
+        img.save(saida, format="WEBP", quality=qualidade, method=4)
+
+    content_type, extensao = FORMATOS_SAIDA[formato]
+    return ImagemProcessada(
+        conteudo=saida.getvalue(),
+        content_type=content_type,
+        extensao=extensao,
+        largura=img.width,
+        altura=img.height,
+        bytes_originais=len(conteudo),
+    )
@@ -8,6 +8,7 @@ from thefuzz import process
 
 from ..models.alimentos import Alimento
 from ..vision import analisar_imagem_do_prato
+from .motor_nutrientes import motor_nutrientes, como_dict
 
 def _buscar_melhor_correspondencia(db: Session, nome_alimento_ia: str) -> Alimento | None:
     """
@@ -48,7 +49,7 @@ def analisar_e_buscar_alimentos_por_imagem(db: Session, conteudo_imagem: bytes)
     Orquestra o processo completo:
     1. Analisa a imagem com Gemini para obter nomes e quantidades.
     2. Busca os alimentos no banco de dados.
-    3. Calcula os nutrientes com base na quantidade estimada.
+    3. Calcula os nutrientes com base na quantidade estimada (motor_nutrientes).
     4. Separa os alimentos encontrados dos não encontrados.
     """
     # --- CORREÇÃO AQUI ---
@@ -82,17 +83,13 @@ def analisar_e_buscar_alimentos_por_imagem(db: Session, conteudo_imagem: bytes)
         alimento_db = _buscar_melhor_correspondencia(db, nome_alimento)
 
         if alimento_db:
-            fator = quantidade_estimada_g / 100.0
-            info_nutricional_ajustada = {
+            alimentos_reconhecidos.append({
                 "alimento": alimento_db.alimento,
+                "alimento_id": alimento_db.id,
                 "quantidade_estimada_g": quantidade_estimada_g,
                 "justificativa_ia": alimento_ia.get("justification", ""),
-                "energia_kcal": round((alimento_db.energia_kcal_100g or 0) * fator, 2),
-                "proteina_g": round((alimento_db.proteina_g_100g or 0) * fator, 2),
-                "carboidrato_g": round((alimento_db.carboidrato_g_100g or 0) * fator, 2),
                 "fonte_dados": "Banco de Dados Local (TACO)"
-            }
-            alimentos_reconhecidos.append(info_nutricional_ajustada)
+            })
         else:
             alimento_para_consulta = {
                 "nome_sugerido_ia": nome_alimento,
@@ -100,4 +97,17 @@ def analisar_e_buscar_alimentos_por_imagem(db: Session, conteudo_imagem: bytes)
             }
             alimentos_nao_reconhecidos.append(alimento_para_consulta)
 
-    return {"reconhecidos": alimentos_reconhecidos, "nao_reconhecidos": alimentos_nao_reconhecidos}
\ No newline at end of file
+    # Nutrientes de todos os reconhecidos num único produto (gramas × matriz de nutrientes)
+    por_item = motor_nutrientes.calcular_por_item(
+        db, [(item["alimento_id"], item["quantidade_estimada_g"]) for item in alimentos_reconhecidos]
+    )
+    for item, vetor in zip(alimentos_reconhecidos, por_item):
+        nutrientes = como_dict(vetor, casas=2)
+        item.update(
+            energia_kcal=nutrientes["energia_kcal"],
+            proteina_g=nutrientes["proteina_g"],
+            carboidrato_g=nutrientes["carboidrato_g"],
+            nutrientes=nutrientes,
+        )
+
+    return {"reconhecidos": alimentos_reconhecidos, "nao_reconhecidos": alimentos_nao_reconhecidos}
@@ -0,0 +1,202 @@
+# app/services/staging_imagens.py
+#
+# Área de "staging" para a imagem já pré-processada no scan rápido.
+# O scan devolve um upload_token; ao salvar a refeição, o cliente envia só o
+# token e a imagem é promovida para o caminho definitivo, sem um segundo upload.
+#
+# Dois backends:
+#   - "local": diretório temporário da instância (desenvolvimento / instância única)
+#   - "gcs":   prefixo de staging no bucket (compartilhado entre instâncias do Cloud Run)
+# Objetos nunca promovidos são apagados pelo varredor após STAGING_TTL_SEGUNDOS.
+
+import os
+import re
+import asyncio
+import glob
+import time
+import secrets
+import logging
+import tempfile
+from datetime import datetime, timezone
+from typing import Optional
+
+from google.api_core.exceptions import NotFound
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.gcs_utils import get_storage_client, upload_to_gcs, promover_blob_gcs, listar_blobs_gcs
+from app.services.processamento_imagem import ImagemProcessada, FORMATOS_SAIDA
+
+logger = logging.getLogger(__name__)
+
+# Tokens gerados por secrets.token_urlsafe: só caracteres seguros para caminhos
+_TOKEN_VALIDO = re.compile(r"^[A-Za-z0-9_-]{20,64}$")
+_EXTENSAO_POR_CONTENT_TYPE = {content_type: extensao for content_type, extensao in FORMATOS_SAIDA.values()}
+_CONTENT_TYPE_POR_EXTENSAO = {extensao: content_type for content_type, extensao in FORMATOS_SAIDA.values()}
+
+
+def _token_valido(token: str) -> bool:
+    return bool(token) and bool(_TOKEN_VALIDO.match(token))
+
+
+class StagingLocal:
+    """Staging em disco local: arquivos '{user_id}_{token}.{extensao}'."""
+
+    def __init__(self, diretorio: str, ttl_segundos: int):
+        self.diretorio = diretorio
+        self.ttl_segundos = ttl_segundos
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    def guardar(self, user_id: int, imagem: ImagemProcessada) -> str:
+        token = secrets.token_urlsafe(24)
+        caminho = os.path.join(self.diretorio, f"{user_id}_{token}.{imagem.extensao}")
+        with open(caminho, "wb") as arquivo:
+            arquivo.write(imagem.conteudo)
+        return token
+
+    def promover(self, user_id: int, token: str, destino_sem_extensao: str) -> Optional[str]:
+        if not _token_valido(token):
+            return None
+        encontrados = glob.glob(os.path.join(self.diretorio, f"{user_id}_{token}.*"))
+        if not encontrados:
+            return None
+        caminho = encontrados[0]
+        try:
+            if time.time() - os.path.getmtime(caminho) > self.ttl_segundos:
+                os.remove(caminho)
+                return None
+        except FileNotFoundError:
+            # Promovido por outra requisição entre o glob e aqui
+            return None
+
+        # Renomear é atômico: num duplo envio, só uma requisição promove o arquivo
+        caminho_reservado = f"{caminho}.promovendo"
+        try:
+            os.rename(caminho, caminho_reservado)
+        except FileNotFoundError:
+            return None
+
+        extensao = caminho.rsplit(".", 1)[-1]
+        content_type = _CONTENT_TYPE_POR_EXTENSAO.get(extensao, "image/jpeg")
+        try:
+            with open(caminho_reservado, "rb") as arquivo:
+                conteudo = arquivo.read()
+            url = upload_to_gcs(
+                bucket_name=settings.GCS_BUCKET_NAME,
+                file_bytes=conteudo,
+                destination_blob_name=f"{destino_sem_extensao}.{extensao}",
+                content_type=content_type,
+            )
+        except Exception:
+            os.rename(caminho_reservado, caminho)  # Permite nova tentativa com o mesmo token
+            raise
+        os.remove(caminho_reservado)
+        return url
+
+    def descartar(self, user_id: int, token: str) -> None:
+        for caminho in glob.glob(os.path.join(self.diretorio, f"{user_id}_{token}.*")):
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+    def varrer_expirados(self) -> int:
+        limite = time.time() - self.ttl_segundos
+        removidos = 0
+        for caminho in glob.glob(os.path.join(self.diretorio, "*")):
+            try:
+                if os.path.getmtime(caminho) < limite:
+                    os.remove(caminho)
+                    removidos += 1
+            except FileNotFoundError:
+                pass  # Promovido ou removido por outra varredura
+        return removidos
+
+
+class StagingGCS:
+    """
+    Staging no próprio bucket, em '{prefixo}/{user_id}/{token}'.
+    A promoção é uma cópia interna do GCS (os bytes não passam pela instância).
+    Recomenda-se também uma regra de lifecycle no bucket para o prefixo.
+    """
+
+    def __init__(self, bucket_name: str, prefixo: str, ttl_segundos: int):
+        self.bucket_name = bucket_name
+        self.prefixo = prefixo.strip("/")
+        self.ttl_segundos = ttl_segundos
+
+    def _nome_blob(self, user_id: int, token: str) -> str:
+        return f"{self.prefixo}/{user_id}/{token}"
+
+    def guardar(self, user_id: int, imagem: ImagemProcessada) -> str:
+        token = secrets.token_urlsafe(24)
+        upload_to_gcs(
+            bucket_name=self.bucket_name,
+            file_bytes=imagem.conteudo,
+            destination_blob_name=self._nome_blob(user_id, token),
+            content_type=imagem.content_type,
+        )
+        return token
+
+    def promover(self, user_id: int, token: str, destino_sem_extensao: str) -> Optional[str]:
+        if not _token_valido(token):
+            return None
+        bucket = get_storage_client().bucket(self.bucket_name)
+        blob = bucket.get_blob(self._nome_blob(user_id, token))
+        if blob is None:
+            return None
+        idade = (datetime.now(timezone.utc) - blob.time_created).total_seconds()
+        if idade > self.ttl_segundos:
+            try:
+                blob.delete()
+            except NotFound:
+                pass
+            return None
+
+        extensao = _EXTENSAO_POR_CONTENT_TYPE.get(blob.content_type, "jpg")
+        # Condicionada à geração lida: num envio duplo só uma promoção vence; a outra recebe None (410)
+        return promover_blob_gcs(
+            self.bucket_name, blob.name, f"{destino_sem_extensao}.{extensao}", geracao=blob.generation
+        )
+
+    def descartar(self, user_id: int, token: str) -> None:
+        try:
+            get_storage_client().bucket(self.bucket_name).blob(self._nome_blob(user_id, token)).delete()
+        except NotFound:
+            pass
+
+    def varrer_expirados(self) -> int:
+        agora = datetime.now(timezone.utc)
+        removidos = 0
+        for blob in listar_blobs_gcs(self.bucket_name, f"{self.prefixo}/"):
+            if (agora - blob.time_created).total_seconds() > self.ttl_segundos:
+                try:
+                    blob.delete()
+                    removidos += 1
+                except Exception as e:
+                    # Já promovido/removido por outra instância
+                    logger.debug(f"Blob de staging não removido ({blob.name}): {e}")
+        return removidos
+
+
+def _criar_staging():
+    if settings.STAGING_BACKEND == "gcs":
+        return StagingGCS(settings.GCS_BUCKET_NAME, settings.STAGING_PREFIXO_GCS, settings.STAGING_TTL_SEGUNDOS)
+    diretorio = settings.STAGING_DIRETORIO_LOCAL or os.path.join(tempfile.gettempdir(), "nutriscan-staging")
+    return StagingLocal(diretorio, settings.STAGING_TTL_SEGUNDOS)
+
+
+# Instância única do processo
+staging_imagens = _criar_staging()
+
+
+async def loop_varredura_staging() -> None:
+    """Tarefa de fundo: apaga periodicamente imagens de staging nunca promovidas."""
+    while True:
+        await asyncio.sleep(settings.STAGING_VARREDURA_SEGUNDOS)
+        try:
+            removidos = await run_in_threadpool(staging_imagens.varrer_expirados)
+            if removidos:
+                logger.info(f"🧹 Staging: {removidos} imagem(ns) expirada(s) removida(s).")
+        except Exception as e:
+            logger.warning(f"⚠️ Falha na varredura do staging: {e}")
@@ -0,0 +1,151 @@
+# app/services/tokens_renovacao.py
+#
+# Refresh tokens com rotação e detecção de reuso.
+#
+# O access token dura ACCESS_TOKEN_EXPIRE_MINUTES; sem refresh token o app
+# refazia /auth/login (um bcrypt de ~250 ms de CPU) a cada expiração. Agora o
+# login também devolve um refresh token opaco, válido por REFRESH_TOKEN_EXPIRE_DAYS,
+# e /auth/refresh troca-o por um par novo com uma leitura pelo índice único do
+# hash (sem bcrypt).
+#
+# - Só o SHA-256 do token é gravado (tokens_renovacao.token_hash): um vazamento
+#   da tabela não dá acesso a nenhuma conta.
+# - Rotação: cada token serve uma única vez; o novo herda a 'familia' (a sessão
+#   iniciada no login).
+# - Reuso: apresentar um token já usado indica que ele vazou (ou que o cliente
+#   perdeu a resposta da renovação); a família inteira é revogada e o usuário
+#   precisa fazer login de novo.
+
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.usuario import TokenRenovacao, Usuario
+
+logger = logging.getLogger(__name__)
+
+
+class TokenRenovacaoInvalido(Exception):
+    def __init__(self, motivo: str):
+        super().__init__(motivo)
+        self.motivo = motivo
+
+
+def _hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _agora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _utc(momento: datetime) -> datetime:
+    # SQLite (desenvolvimento) devolve o TIMESTAMP sem fuso; gravamos sempre em UTC
+    return momento if momento.tzinfo else momento.replace(tzinfo=timezone.utc)
+
+
+def emitir(db: Session, usuario_id: int, familia: Optional[str] = None, commit: bool = True) -> str:
+    """Cria um refresh token (nova família no login; a mesma família na rotação)."""
+    token = secrets.token_urlsafe(32)
+    db.add(TokenRenovacao(
+        usuario_id=usuario_id,
+        token_hash=_hash(token),
+        familia=familia or secrets.token_hex(16),
+        expira_em=_agora() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+    ))
+    if commit:
+        db.commit()
+    return token
+
+
+def _revogar(db: Session, *condicoes) -> int:
+    resultado = db.execute(
+        update(TokenRenovacao)
+        .where(*condicoes, TokenRenovacao.revogado_em.is_(None))
+        .values(revogado_em=_agora())
+    )
+    db.commit()
+    return resultado.rowcount
+
+
+def revogar_familia(db: Session, familia: str) -> int:
+    return _revogar(db, TokenRenovacao.familia == familia)
+
+
+def revogar_usuario(db: Session, usuario_id: int) -> int:
+    """Todas as sessões do usuário (desativação da conta)."""
+    return _revogar(db, TokenRenovacao.usuario_id == usuario_id)
+
+
+def revogar(db: Session, token: str) -> None:
+    """Logout: revoga a família do token (tokens desconhecidos são ignorados)."""
+    familia = db.execute(
+        select(TokenRenovacao.familia).where(TokenRenovacao.token_hash == _hash(token))
+    ).scalar_one_or_none()
+    if familia is not None:
+        revogar_familia(db, familia)
+
+
+def limpar_expirados(db: Session, usuario_id: int) -> int:
+    """Remove os tokens vencidos do usuário (chamado no login; usa o índice por usuario_id)."""
+    resultado = db.execute(
+        delete(TokenRenovacao).where(TokenRenovacao.usuario_id == usuario_id, TokenRenovacao.expira_em < _agora())
+    )
+    db.commit()
+    return resultado.rowcount
+
+
+def renovar(db: Session, token: str) -> Tuple[Usuario, str]:
+    """
+    Consome o refresh token e emite o próximo da mesma família.
+    Retorna (usuário, novo refresh token); levanta TokenRenovacaoInvalido.
+    O usuário volta desanexado da Session, com os atributos já carregados.
+    """
+    linha = db.execute(
+        select(TokenRenovacao, Usuario)
+        .join(Usuario, Usuario.id == TokenRenovacao.usuario_id)
+        .where(TokenRenovacao.token_hash == _hash(token))
+    ).first()
+    if linha is None:
+        raise TokenRenovacaoInvalido("desconhecido")
+    registro, usuario = linha
+    agora = _agora()
+
+    if registro.revogado_em is not None:
+        raise TokenRenovacaoInvalido("revogado")
+    if _utc(registro.expira_em) <= agora:
+        raise TokenRenovacaoInvalido("expirado")
+    if registro.usado_em is not None:
+        revogadas = revogar_familia(db, registro.familia)
+        logger.warning(
+            f"🚨 Refresh token reutilizado (usuário {registro.usuario_id}); "
+            f"família {registro.familia[:8]} revogada ({revogadas} tokens)."
+        )
+        raise TokenRenovacaoInvalido("reutilizado")
+    if usuario.is_active is False:
+        revogar_familia(db, registro.familia)
+        raise TokenRenovacaoInvalido("usuario_inativo")
+
+    # Condicional: de duas renovações simultâneas com o mesmo token, só uma marca o uso
+    resultado = db.execute(
+        update(TokenRenovacao)
+        .where(TokenRenovacao.id == registro.id, TokenRenovacao.usado_em.is_(None))
+        .values(usado_em=agora)
+    )
+    if resultado.rowcount != 1:
+        db.rollback()
+        revogar_familia(db, registro.familia)
+        logger.warning(f"🚨 Refresh token usado em paralelo (usuário {registro.usuario_id}); família revogada.")
+        raise TokenRenovacaoInvalido("reutilizado")
+
+    novo = emitir(db, usuario.id, registro.familia, commit=False)
+    # O commit expiraria os atributos e o access token faria uma nova leitura do usuário
+    db.expunge(usuario)
+    db.commit()
+    return usuario, novo
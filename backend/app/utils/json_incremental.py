@@ -0,0 +1,141 @@
+# app/utils/json_incremental.py
+#
+# Parser de JSON por partes, para respostas da IA geradas em streaming: cada
+# valor é entregue assim que termina de chegar (ex.: cada string de uma lista),
+# sem esperar o documento inteiro. Texto antes do primeiro '{' ou '[' (como
+# ```json) e depois do fim do documento é ignorado.
+
+from typing import Any, List, Tuple, Union
+
+Caminho = Tuple[Union[str, int], ...]
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_LITERAIS = {"true": True, "false": False, "null": None}
+
+
+class ErroJsonIncremental(ValueError):
+    pass
+
+
+class _Nivel:
+    __slots__ = ("container", "chave", "esperando_chave")
+
+    def __init__(self, container):
+        self.container = container
+        self.chave = None
+        self.esperando_chave = isinstance(container, dict)
+
+
+class ParserJsonIncremental:
+    """
+    Uso:
+        parser = ParserJsonIncremental()
+        for trecho in resposta:
+            for caminho, valor in parser.alimentar(trecho):
+                ...  # ex.: (("recomendacoes", "pontos_positivos", 0), "Boa fonte de fibras")
+        documento = parser.raiz  # preenchido quando parser.completo
+    """
+
+    def __init__(self):
+        self._pilha: List[_Nivel] = []
+        self._estado = "antes"  # antes | valor | string | escape | unicode | escalar | fim
+        self._buffer: List[str] = []
+        self._unicode = ""
+        self.raiz: Any = None
+
+    @property
+    def completo(self) -> bool:
+        return self._estado == "fim"
+
+    def _caminho_atual(self) -> Caminho:
+        caminho = []
+        for nivel in self._pilha:
+            caminho.append(nivel.chave if isinstance(nivel.container, dict) else len(nivel.container))
+        return tuple(caminho)
+
+    def _concluir(self, valor: Any, eventos: list, eh_string: bool = False) -> None:
+        if not self._pilha:
+            self.raiz = valor
+            self._estado = "fim"
+            return
+        nivel = self._pilha[-1]
+        if isinstance(nivel.container, dict):
+            if nivel.esperando_chave:
+                if not eh_string:
+                    raise ErroJsonIncremental("Chave de objeto precisa ser string.")
+                nivel.chave = valor
+                nivel.esperando_chave = False
+                return
+            eventos.append((self._caminho_atual(), valor))
+            nivel.container[nivel.chave] = valor
+            nivel.esperando_chave = True
+        else:
+            eventos.append((self._caminho_atual(), valor))
+            nivel.container.append(valor)
+
+    def _concluir_escalar(self, eventos: list) -> None:
+        texto = "".join(self._buffer)
+        self._buffer = []
+        self._estado = "valor"
+        if texto in _LITERAIS:
+            valor = _LITERAIS[texto]
+        else:
+            try:
+                valor = float(texto) if any(c in texto for c in ".eE") else int(texto)
+            except ValueError:
+                raise ErroJsonIncremental(f"Valor inválido: {texto!r}")
+        self._concluir(valor, eventos)
+
+    def alimentar(self, trecho: str) -> List[Tuple[Caminho, Any]]:
+        """Processa mais um trecho do texto e retorna os valores concluídos nele, com o caminho de cada um."""
+        eventos: List[Tuple[Caminho, Any]] = []
+        for caractere in trecho:
+            estado = self._estado
+            if estado == "fim":
+                break
+            if estado == "string":
+                if caractere == '"':
+                    self._estado = "valor"
+                    texto, self._buffer = "".join(self._buffer), []
+                    self._concluir(texto, eventos, eh_string=True)
+                elif caractere == '\\':
+                    self._estado = "escape"
+                else:
+                    self._buffer.append(caractere)
+                continue
+            if estado == "escape":
+                if caractere == 'u':
+                    self._estado, self._unicode = "unicode", ""
+                else:
+                    self._buffer.append(_ESCAPES.get(caractere, caractere))
+                    self._estado = "string"
+                continue
+            if estado == "unicode":
+                self._unicode += caractere
+                if len(self._unicode) == 4:
+                    self._buffer.append(chr(int(self._unicode, 16)))
+                    self._estado = "string"
+                continue
+            if estado == "escalar":
+                if caractere.isalnum() or caractere in "+-.":
+                    self._buffer.append(caractere)
+                    continue
+                self._concluir_escalar(eventos)  # e o delimitador segue para o tratamento abaixo
+            if estado == "antes" and caractere not in "{[":
+                continue
+
+            if caractere in " \t\r\n,:":
+                continue
+            if caractere == '"':
+                self._estado = "string"
+            elif caractere in "{[":
+                self._pilha.append(_Nivel({} if caractere == "{" else []))
+                self._estado = "valor"
+            elif caractere in "}]":
+                if not self._pilha:
+                    raise ErroJsonIncremental(f"'{caractere}' sem abertura correspondente.")
+                self._concluir(self._pilha.pop().container, eventos)
+            else:
+                self._estado = "escalar"
+                self._buffer.append(caractere)
+        return eventos
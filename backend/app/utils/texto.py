@@ -0,0 +1,17 @@
+# app/utils/texto.py
+
+import unicodedata
+import re
+
+
+def normalizar_texto(texto: str) -> str:
+    """
+    Remove acentos, caracteres não alfabéticos e converte para minúsculas.
+
+    Exemplos:
+      "Pão de Queijo" -> "pao de queijo"
+      "Feijão, carioca" -> "feijao carioca"
+    """
+    if not texto: return ""
+    texto_sem_acentos = unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('utf-8')
+    return re.sub(r'[^a-zA-Z\s]', '', texto_sem_acentos).lower()
@@ -5,28 +5,73 @@
 import os
 import json
 import re
+import asyncio
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator
 import google.generativeai as genai
 from PIL import Image
 from io import BytesIO
 
+from app.config import settings
+from app.metricas import medir_gemini, registrar_tokens_gemini
+
 # Configuração do logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Use o nome do seu modelo (ex: 'models/gemini-1.5-flash' ou 'models/gemini-2.5-flash')
+GEMINI_MODEL_NAME = 'models/gemini-2.5-flash'
+
 # Configuração da API Key
 try:
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("A variável de ambiente GEMINI_API_KEY não está definida.")
     genai.configure(api_key=api_key)
-    # Use o nome do seu modelo (ex: 'models/gemini-1.5-flash' ou 'models/gemini-2.5-flash')
-    gemini_model = genai.GenerativeModel('models/gemini-2.5-flash') 
+    gemini_model = genai.GenerativeModel(GEMINI_MODEL_NAME) 
 except Exception as e:
     logger.error(f"Erro ao configurar a API do Gemini: {e}")
     gemini_model = None
 
+# ✅ Limite de chamadas simultâneas ao Gemini no caminho assíncrono.
+# O semáforo só é vinculado a um event loop no primeiro uso (Python 3.10+).
+_semaforo_gemini = asyncio.Semaphore(settings.GEMINI_MAX_CONCORRENCIA)
+
+
+async def _gerar_conteudo_async(modelo, conteudo, *, funcao: str, **kwargs):
+    """
+    Chama `generate_content_async` do SDK respeitando o limite de concorrência
+    e o timeout por chamada. Um timeout gera `asyncio.TimeoutError`.
+    'funcao' identifica a chamada nas métricas (latência, tokens, erros).
+    """
+    async with _semaforo_gemini:
+        with medir_gemini(funcao):
+            response = await asyncio.wait_for(
+                modelo.generate_content_async(conteudo, **kwargs),
+                timeout=settings.GEMINI_TIMEOUT_SEGUNDOS
+            )
+    registrar_tokens_gemini(funcao, response)
+    return response
+
+
+def _gerar_conteudo(modelo, conteudo, *, funcao: str, **kwargs):
+    """Versão síncrona de `_gerar_conteudo_async` (sem semáforo nem timeout), com as mesmas métricas."""
+    with medir_gemini(funcao):
+        response = modelo.generate_content(conteudo, **kwargs)
+    registrar_tokens_gemini(funcao, response)
+    return response
+
+
+def _imagem_para_parte(conteudo_imagem: bytes) -> Dict[str, Any]:
+    """
+    Monta a parte de imagem da requisição a partir dos bytes originais.
+    Só o cabeçalho é lido para descobrir o formato; assim o SDK não precisa
+    decodificar e recomprimir a foto inteira a cada chamada.
+    """
+    with Image.open(BytesIO(conteudo_imagem)) as img:
+        mime_type = Image.MIME.get(img.format, "image/jpeg")
+    return {"mime_type": mime_type, "data": conteudo_imagem}
+
 # Função auxiliar para extrair JSON
 def extrair_json_da_resposta(texto_resposta: str) -> Dict[str, Any]:
     """ Extrai um objeto JSON de uma resposta de texto, limpando ```json e outros. """
@@ -52,14 +97,15 @@ def extrair_json_da_resposta(texto_resposta: str) -> Dict[str, Any]:
 
 
 # Função 1: Scan Rápido (A sua função original, mantida)
+PROMPT_SCAN = """SCAN RÁPIDO. Retorne APENAS JSON: {"alimentos_extraidos": [{"nome", "categoria" (nutricional), "quantidade_estimada_g", "confianca" ('alta'|'media'|'baixa'), "calorias_estimadas"}], "resumo_nutricional": {"total_calorias", "total_proteinas_g", "total_carboidratos_g", "total_gorduras_g"}, "alertas": []}"""
+
+
 def escanear_prato_extrair_alimentos(conteudo_imagem: bytes) -> Dict[str, Any]:
     if not gemini_model: return {"erro": "API do Gemini não configurada."}
     try:
         if not conteudo_imagem: return {"erro": "Imagem vazia"}
-        prompt_scan = """SCAN RÁPIDO. Retorne APENAS JSON: {"alimentos_extraidos": [{"nome", "categoria" (nutricional), "quantidade_estimada_g", "confianca" ('alta'|'media'|'baixa'), "calorias_estimadas"}], "resumo_nutricional": {"total_calorias", "total_proteinas_g", "total_carboidratos_g", "total_gorduras_g"}, "alertas": []}"""
         logger.info("Processando SCAN rápido...")
-        img = Image.open(BytesIO(conteudo_imagem))
-        response = gemini_model.generate_content([prompt_scan, img], generation_config=genai.types.GenerationConfig(temperature=0.1))
+        response = _gerar_conteudo(gemini_model, [PROMPT_SCAN, _imagem_para_parte(conteudo_imagem)], funcao="scan_rapido", generation_config=genai.types.GenerationConfig(temperature=0.1))
         if not response.text: return {"erro": "Resposta vazia da API"}
         logger.info(f"Resposta bruta Gemini (scan rápido): {response.text}")
         resultado = extrair_json_da_resposta(response.text)
@@ -70,18 +116,36 @@ def escanear_prato_extrair_alimentos(conteudo_imagem: bytes) -> Dict[str, Any]:
         return {"erro": f"Falha no scan rápido: {str(e)}"}
 
 
-# =================================================================
-# ✅ FUNÇÃO 2: Obter dados nutricionais de 1 alimento (para auto-aprendizagem)
-# =================================================================
-def fetch_gemini_nutritional_data(alimento_nome: str) -> Dict[str, Any]:
-    """
-    Chama o Gemini para obter dados nutricionais de um NOVO alimento.
-    """
+async def escanear_prato_extrair_alimentos_async(conteudo_imagem: bytes) -> Dict[str, Any]:
+    """Versão assíncrona do scan rápido (não bloqueia o event loop)."""
     if not gemini_model: return {"erro": "API do Gemini não configurada."}
+    try:
+        if not conteudo_imagem: return {"erro": "Imagem vazia"}
+        logger.info("Processando SCAN rápido (async)...")
+        response = await _gerar_conteudo_async(
+            gemini_model,
+            [PROMPT_SCAN, _imagem_para_parte(conteudo_imagem)],
+            funcao="scan_rapido",
+            generation_config=genai.types.GenerationConfig(temperature=0.1)
+        )
+        if not response.text: return {"erro": "Resposta vazia da API"}
+        logger.info(f"Resposta bruta Gemini (scan rápido): {response.text}")
+        resultado = extrair_json_da_resposta(response.text)
+        logger.info(f"Resultado processado (scan rápido): {resultado}")
+        return resultado
+    except asyncio.TimeoutError:
+        logger.error(f"Timeout ({settings.GEMINI_TIMEOUT_SEGUNDOS}s) no scan rápido.")
+        return {"erro": "Tempo limite excedido no scan rápido."}
+    except Exception as e:
+        logger.error(f"Erro no scan rápido: {e}")
+        return {"erro": f"Falha no scan rápido: {str(e)}"}
 
-    logger.info(f"-> Consultando Gemini para novos dados de: '{alimento_nome}'")
 
-    prompt = f"""
+# =================================================================
+# ✅ FUNÇÃO 2: Obter dados nutricionais de 1 alimento (para auto-aprendizagem)
+# =================================================================
+def _montar_prompt_dados_nutricionais(alimento_nome: str) -> str:
+    return f"""
     Você é um assistente de banco de dados nutricional.
     Para o alimento "{alimento_nome}", forneça os dados nutricionais para 100g.
     Estime também uma "unidade", "un_medida_caseira" e "peso_aproximado_g" comuns para este alimento.
@@ -98,10 +162,19 @@ def fetch_gemini_nutritional_data(alimento_nome: str) -> Dict[str, Any]:
       "peso_aproximado_g": "<valor_numerico_ex: 150>"
     }}
     """
+
+
+def fetch_gemini_nutritional_data(alimento_nome: str) -> Dict[str, Any]:
+    """
+    Chama o Gemini para obter dados nutricionais de um NOVO alimento.
+    """
+    if not gemini_model: return {"erro": "API do Gemini não configurada."}
+
+    logger.info(f"-> Consultando Gemini para novos dados de: '{alimento_nome}'")
     
     try:
         config = genai.GenerationConfig(response_mime_type="application/json")
-        response = gemini_model.generate_content(prompt, generation_config=config)
+        response = _gerar_conteudo(gemini_model, _montar_prompt_dados_nutricionais(alimento_nome), funcao="dados_nutricionais", generation_config=config)
         dados_nutricionais = json.loads(response.text)
         logger.info(f"INFO: Gemini respondeu com dados para '{alimento_nome}'.")
         return dados_nutricionais
@@ -110,23 +183,31 @@ def fetch_gemini_nutritional_data(alimento_nome: str) -> Dict[str, Any]:
         logger.error(f"ERRO: Falha ao consultar o Gemini para dados nutricionais: {e}")
         return {"erro": f"Falha ao obter dados para {alimento_nome}."}
 
-# =================================================================
-# ✅ FUNÇÃO 3: Obter APENAS recomendações
-# =================================================================
-def gerar_recomendacoes_detalhadas_ia(
-    lista_alimentos: List[Dict[str, Any]], 
-    totais: Dict[str, float]
-) -> Dict[str, Any]:
-    """
-    Recebe a lista de alimentos e os TOTAIS CALCULADOS (pelo Python).
-    Usa o Gemini para gerar APENAS as recomendações e vitaminas.
-    """
+
+async def fetch_gemini_nutritional_data_async(alimento_nome: str) -> Dict[str, Any]:
+    """Versão assíncrona de `fetch_gemini_nutritional_data`."""
     if not gemini_model: return {"erro": "API do Gemini não configurada."}
 
-    if not lista_alimentos:
-        logger.error("Tentativa de analisar lista de alimentos vazia.")
-        return {"erro": "A lista de alimentos para análise está vazia."}
+    logger.info(f"-> Consultando Gemini (async) para novos dados de: '{alimento_nome}'")
+
+    try:
+        config = genai.GenerationConfig(response_mime_type="application/json")
+        response = await _gerar_conteudo_async(gemini_model, _montar_prompt_dados_nutricionais(alimento_nome), funcao="dados_nutricionais", generation_config=config)
+        dados_nutricionais = json.loads(response.text)
+        logger.info(f"INFO: Gemini respondeu com dados para '{alimento_nome}'.")
+        return dados_nutricionais
 
+    except asyncio.TimeoutError:
+        logger.error(f"ERRO: Timeout ({settings.GEMINI_TIMEOUT_SEGUNDOS}s) ao consultar dados de '{alimento_nome}'.")
+        return {"erro": f"Tempo limite excedido ao obter dados para {alimento_nome}."}
+    except Exception as e:
+        logger.error(f"ERRO: Falha ao consultar o Gemini para dados nutricionais: {e}")
+        return {"erro": f"Falha ao obter dados para {alimento_nome}."}
+
+# =================================================================
+# ✅ FUNÇÃO 3: Obter APENAS recomendações
+# =================================================================
+def _montar_prompt_recomendacoes(lista_alimentos: List[Dict[str, Any]], totais: Dict[str, float]) -> str:
     alimentos_str = "\n".join([f"- {item['nome']}: {item['quantidade_gramas']}g" for item in lista_alimentos])
     totais_str = f"""
     - Calorias Totais: {totais.get('kcal', 0):.0f} kcal
@@ -135,7 +216,7 @@ def gerar_recomendacoes_detalhadas_ia(
     - Gorduras Totais: {totais.get('fats', 0):.1f} g
     """
 
-    prompt_lista = f"""Você é um nutricionista especialista. Analise esta refeição com base nos alimentos e nos seus totais nutricionais.
+    return f"""Você é um nutricionista especialista. Analise esta refeição com base nos alimentos e nos seus totais nutricionais.
     
 Lista de Alimentos:
 {alimentos_str}
@@ -153,9 +234,26 @@ Forneça APENAS um objeto JSON com as seguintes chaves:
   }}
 }}
 """
+
+
+def gerar_recomendacoes_detalhadas_ia(
+    lista_alimentos: List[Dict[str, Any]], 
+    totais: Dict[str, float]
+) -> Dict[str, Any]:
+    """
+    Recebe a lista de alimentos e os TOTAIS CALCULADOS (pelo Python).
+    Usa o Gemini para gerar APENAS as recomendações e vitaminas.
+    """
+    if not gemini_model: return {"erro": "API do Gemini não configurada."}
+
+    if not lista_alimentos:
+        logger.error("Tentativa de analisar lista de alimentos vazia.")
+        return {"erro": "A lista de alimentos para análise está vazia."}
+
+    prompt_lista = _montar_prompt_recomendacoes(lista_alimentos, totais)
     try:
         logger.info(f"-> Enviando lista de alimentos para obter RECOMENDAÇÕES...")
-        response = gemini_model.generate_content(prompt_lista)
+        response = _gerar_conteudo(gemini_model, prompt_lista, funcao="recomendacoes")
         
         logger.info(f"Resposta bruta Gemini (recomendações): {response.text}")
         resultado = extrair_json_da_resposta(response.text)
@@ -166,44 +264,145 @@ Forneça APENAS um objeto JSON com as seguintes chaves:
     except Exception as e:
         logger.error(f"ERRO: Falha na comunicação com a API do Gemini (recomendações): {e}")
         return {"erro": "Desculpe, não foi possível gerar as recomendações no momento."}
-    
+
+
+async def gerar_recomendacoes_detalhadas_ia_async(
+    lista_alimentos: List[Dict[str, Any]],
+    totais: Dict[str, float]
+) -> Dict[str, Any]:
+    """Versão assíncrona de `gerar_recomendacoes_detalhadas_ia`."""
+    if not gemini_model: return {"erro": "API do Gemini não configurada."}
+
+    if not lista_alimentos:
+        logger.error("Tentativa de analisar lista de alimentos vazia.")
+        return {"erro": "A lista de alimentos para análise está vazia."}
+
+    prompt_lista = _montar_prompt_recomendacoes(lista_alimentos, totais)
+    try:
+        logger.info(f"-> Enviando lista de alimentos para obter RECOMENDAÇÕES (async)...")
+        response = await _gerar_conteudo_async(gemini_model, prompt_lista, funcao="recomendacoes")
+
+        logger.info(f"Resposta bruta Gemini (recomendações): {response.text}")
+        resultado = extrair_json_da_resposta(response.text)
+        logger.info(f"Resultado processado (recomendações): {resultado}")
+
+        return resultado
+
+    except asyncio.TimeoutError:
+        logger.error(f"ERRO: Timeout ({settings.GEMINI_TIMEOUT_SEGUNDOS}s) ao gerar recomendações.")
+        return {"erro": "Desculpe, não foi possível gerar as recomendações no momento."}
+    except Exception as e:
+        logger.error(f"ERRO: Falha na comunicação com a API do Gemini (recomendações): {e}")
+        return {"erro": "Desculpe, não foi possível gerar as recomendações no momento."}
+
+
+async def gerar_recomendacoes_detalhadas_ia_stream(
+    lista_alimentos: List[Dict[str, Any]],
+    totais: Dict[str, float]
+) -> AsyncIterator[str]:
+    """
+    Versão em streaming de `gerar_recomendacoes_detalhadas_ia_async`: produz os
+    trechos de texto do JSON à medida que o modelo gera (ler com ParserJsonIncremental).
+    O timeout vale para a geração inteira. Falhas levantam exceção.
+    """
+    if not gemini_model:
+        raise RuntimeError("API do Gemini não configurada.")
+
+    prompt_lista = _montar_prompt_recomendacoes(lista_alimentos, totais)
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + settings.GEMINI_TIMEOUT_SEGUNDOS
+    async with _semaforo_gemini:
+        logger.info(f"-> Enviando lista de alimentos para obter RECOMENDAÇÕES (streaming)...")
+        trecho = None
+        # A latência medida é a da geração inteira (até o último trecho)
+        with medir_gemini("recomendacoes_stream"):
+            response = await asyncio.wait_for(
+                gemini_model.generate_content_async(prompt_lista, stream=True),
+                timeout=settings.GEMINI_TIMEOUT_SEGUNDOS
+            )
+            trechos = response.__aiter__()
+            while True:
+                try:
+                    trecho = await asyncio.wait_for(trechos.__anext__(), timeout=max(limite - loop.time(), 0.001))
+                except StopAsyncIteration:
+                    break
+                yield trecho.text
+        # O uso de tokens vem acumulado no último trecho
+        registrar_tokens_gemini("recomendacoes_stream", trecho)
+
 
 # Função para análise detalhada DE IMAGEM (sem alterações)
-def analisar_imagem_do_prato_detalhado(conteudo_imagem: bytes) -> dict:
-    # ... (código da função analisar_imagem_do_prato_detalhado) ...
-    model = genai.GenerativeModel('models/gemini-2.5-flash') # Ou gemini-1.5-flash
-    prompt_detalhado = """Você é um nutricionista especialista. Analise esta foto de comida e forneça um relatório estruturado em JSON com as seguintes seções:
+PROMPT_DETALHADO_IMAGEM = """Você é um nutricionista especialista. Analise esta foto de comida e forneça um relatório estruturado em JSON com as seguintes seções:
 {
   "detalhes_prato": { "alimentos": [ { "nome": "string", "quantidade_gramas": "number", "metodo_preparo": "string", "categoria": "string (ex: Fruta, Grão, Carne Vermelha)" } ] },
   "analise_nutricional": { "calorias_totais": "number", "macronutrientes": { "proteinas_g": "number", "carboidratos_g": "number", "gorduras_g": "number" }, "vitaminas_minerais": ["string"] },
   "recomendacoes": { "pontos_positivos": ["string"], "sugestoes_balanceamento": ["string"], "alternativas_saudaveis": ["string"] }
 } Forneça APENAS o JSON, sem texto adicional."""
+
+
+def analisar_imagem_do_prato_detalhado(conteudo_imagem: bytes) -> dict:
+    model = genai.GenerativeModel(GEMINI_MODEL_NAME)
     try:
         logger.info("-> Enviando imagem para análise detalhada...")
-        img = Image.open(BytesIO(conteudo_imagem))
-        response = model.generate_content([prompt_detalhado, img])
+        response = _gerar_conteudo(model, [PROMPT_DETALHADO_IMAGEM, _imagem_para_parte(conteudo_imagem)], funcao="imagem_detalhada")
+        logger.info(f"Resposta bruta Gemini (detalhada img): {response.text}")
+        resultado = extrair_json_da_resposta(response.text)
+        logger.info(f"Resultado processado (detalhada img): {resultado}")
+        return resultado
+    except Exception as e:
+        logger.error(f"ERRO Gemini (detalhada img): {e}")
+        return {"erro": "Falha na análise detalhada da imagem."}
+
+
+async def analisar_imagem_do_prato_detalhado_async(conteudo_imagem: bytes) -> dict:
+    """Versão assíncrona de `analisar_imagem_do_prato_detalhado`."""
+    model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    try:
+        logger.info("-> Enviando imagem para análise detalhada (async)...")
+        response = await _gerar_conteudo_async(model, [PROMPT_DETALHADO_IMAGEM, _imagem_para_parte(conteudo_imagem)], funcao="imagem_detalhada")
         logger.info(f"Resposta bruta Gemini (detalhada img): {response.text}")
         resultado = extrair_json_da_resposta(response.text)
         logger.info(f"Resultado processado (detalhada img): {resultado}")
         return resultado
+    except asyncio.TimeoutError:
+        logger.error(f"ERRO Gemini (detalhada img): timeout de {settings.GEMINI_TIMEOUT_SEGUNDOS}s")
+        return {"erro": "Tempo limite excedido na análise detalhada da imagem."}
     except Exception as e:
         logger.error(f"ERRO Gemini (detalhada img): {e}")
         return {"erro": "Falha na análise detalhada da imagem."}
 
 
 # Função para análise simples DE IMAGEM (sem alterações)
+PROMPT_SIMPLES_IMAGEM = """Analise a imagem. Identifique cada alimento, estime a quantidade em gramas (g) e justifique. Retorne JSON: { "foods": [ { "name", "quantity_g", "justification" } ] }"""
+
+
 def analisar_imagem_do_prato(conteudo_imagem: bytes) -> dict:
-    # ... (código da função analisar_imagem_do_prato) ...
-    model = genai.GenerativeModel('models/gemini-2.5-flash')
-    prompt = """Analise a imagem. Identifique cada alimento, estime a quantidade em gramas (g) e justifique. Retorne JSON: { "foods": [ { "name", "quantity_g", "justification" } ] }"""
+    model = genai.GenerativeModel(GEMINI_MODEL_NAME)
     try:
         logger.info("-> Enviando imagem para análise simples...")
-        img = Image.open(BytesIO(conteudo_imagem))
-        response = model.generate_content([prompt, img])
+        response = _gerar_conteudo(model, [PROMPT_SIMPLES_IMAGEM, _imagem_para_parte(conteudo_imagem)], funcao="imagem_simples")
+        logger.info(f"Resposta bruta Gemini (simples img): {response.text}")
+        resultado = extrair_json_da_resposta(response.text)
+        logger.info(f"Resultado processado (simples img): {resultado}")
+        return resultado
+    except Exception as e:
+        logger.error(f"ERRO Gemini (simples img): {e}")
+        return {"erro": "Falha ao analisar imagem (simples)."}
+
+
+async def analisar_imagem_do_prato_async(conteudo_imagem: bytes) -> dict:
+    """Versão assíncrona de `analisar_imagem_do_prato`."""
+    model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+    try:
+        logger.info("-> Enviando imagem para análise simples (async)...")
+        response = await _gerar_conteudo_async(model, [PROMPT_SIMPLES_IMAGEM, _imagem_para_parte(conteudo_imagem)], funcao="imagem_simples")
         logger.info(f"Resposta bruta Gemini (simples img): {response.text}")
         resultado = extrair_json_da_resposta(response.text)
         logger.info(f"Resultado processado (simples img): {resultado}")
         return resultado
+    except asyncio.TimeoutError:
+        logger.error(f"ERRO Gemini (simples img): timeout de {settings.GEMINI_TIMEOUT_SEGUNDOS}s")
+        return {"erro": "Tempo limite excedido ao analisar imagem (simples)."}
     except Exception as e:
         logger.error(f"ERRO Gemini (simples img): {e}")
         return {"erro": "Falha ao analisar imagem (simples)."}
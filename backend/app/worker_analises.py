@@ -0,0 +1,42 @@
+# app/worker_analises.py
+#
+# Worker separado da análise detalhada: consome a fila do Redis sem servir HTTP.
+# Útil quando a API roda com ANALISE_WORKER_EM_PROCESSO=false (ex.: Cloud Run,
+# onde a CPU fica restrita fora das requisições).
+#
+# Uso (a partir de backend/):
+#   ANALISE_FILA_BACKEND=redis REDIS_HABILITADO=true python -m app.worker_analises
+
+import asyncio
+import logging
+
+from app.config import settings
+from app.database import SessionLocal
+from app.http_utils import iniciar_cliente_http, fechar_cliente_http
+from app.redis_utils import fechar_redis
+from app.services.fila_analises import fila_analises, FilaAnalisesMemoria, TrabalhadorAnalises
+
+logger = logging.getLogger(__name__)
+
+
+async def executar() -> None:
+    if isinstance(fila_analises, FilaAnalisesMemoria):
+        logger.warning("⚠️ Fila em memória: este worker só vê jobs do próprio processo. Use ANALISE_FILA_BACKEND=redis.")
+
+    await iniciar_cliente_http()
+    trabalhador = TrabalhadorAnalises(fila_analises, SessionLocal, settings.ANALISE_WORKERS)
+    trabalhador.iniciar()
+    try:
+        await asyncio.Event().wait()  # Até o processo ser interrompido
+    finally:
+        await trabalhador.parar()
+        await fechar_redis()
+        await fechar_cliente_http()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(executar())
+    except KeyboardInterrupt:
+        logger.info("👋 Worker de análises encerrado.")
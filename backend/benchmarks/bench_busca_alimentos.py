@@ -0,0 +1,139 @@
+# benchmarks/bench_busca_alimentos.py
+#
+# Latência (p50/p95) da busca de alimentos por tecla digitada no autocomplete:
+# ILIKE '%termo%' ordenado por nome (antigo) x busca ranqueada (busca_alimentos).
+#
+# Uso (a partir de backend/):
+#   python -m benchmarks.bench_busca_alimentos                   # banco do DATABASE_URL (TACO + alimentos da IA)
+#   python -m benchmarks.bench_busca_alimentos --sintetico 5000  # SQLite em memória: ~600 nomes TACO + 5000 "da IA"
+#   python -m benchmarks.bench_busca_alimentos --sintetico 5000 --url postgresql://...  # PostgreSQL descartável
+#
+# No PostgreSQL, rode antes `python -m app.migracoes` para criar os índices GIN
+# (com --sintetico e --url, o benchmark cria as tabelas e aplica as migrações).
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+TERMOS = [
+    "arroz integral", "feijão carioca", "frango grelhado", "pão de queijo", "banana prata",
+    "queijo minas", "macarrão", "batata doce", "carne moída", "ovo cozido", "alface", "café com leite",
+]
+
+BASES_TACO = [
+    "Arroz", "Feijão", "Frango", "Carne bovina", "Peixe", "Ovo", "Leite", "Queijo", "Pão", "Batata",
+    "Mandioca", "Banana", "Maçã", "Laranja", "Alface", "Tomate", "Cenoura", "Abóbora", "Macarrão", "Café",
+    "Iogurte", "Manteiga", "Farinha", "Milho", "Lentilha", "Grão-de-bico", "Brócolis", "Couve", "Uva", "Mamão",
+]
+VARIEDADES = ["integral", "branco", "carioca", "preto", "prata", "nanica", "minas", "mussarela", "doce",
+              "inglesa", "moída", "peito", "coxa", "tipo 1", "francês", "de forma", "desnatado", "cru"]
+PREPAROS = ["cozido", "cru", "grelhado", "frito", "assado", "refogado", "em conserva", "ensopado", "sem sal"]
+CATEGORIAS = ["Cereais e derivados", "Leguminosas", "Carnes e derivados", "Leite e derivados",
+              "Frutas", "Verduras, hortaliças", "Panificados", "Bebidas", "Outros"]
+
+
+def gerar_nomes(quantidade_ia: int, semente: int = 42) -> list:
+    """~600 nomes no estilo TACO ('Arroz, integral, cozido') + nomes livres no estilo da IA."""
+    aleatorio = random.Random(semente)
+    nomes = {}
+    for base in BASES_TACO:
+        for variedade in aleatorio.sample(VARIEDADES, 5):
+            for preparo in aleatorio.sample(PREPAROS, 4):
+                nomes.setdefault(f"{base}, {variedade}, {preparo}", aleatorio.choice(CATEGORIAS))
+    while len(nomes) < 600 + quantidade_ia:
+        partes = [aleatorio.choice(BASES_TACO).lower(), aleatorio.choice(VARIEDADES), aleatorio.choice(PREPAROS)]
+        if aleatorio.random() < 0.5:
+            partes.append(f"com {aleatorio.choice(BASES_TACO).lower()}")
+        nomes.setdefault(" ".join(partes).capitalize(), aleatorio.choice(CATEGORIAS))
+    return sorted(nomes.items())
+
+
+def teclas(termo: str) -> list:
+    """Prefixos enviados pelo autocomplete a partir de 2 caracteres."""
+    return [termo[:i] for i in range(2, len(termo) + 1) if termo[i - 1] != " "]
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark da busca de alimentos (autocomplete)")
+    parser.add_argument("--sintetico", type=int, default=None, metavar="N",
+                        help="Popula o banco com ~600 nomes TACO + N alimentos da IA (padrão: SQLite em memória)")
+    parser.add_argument("--url", help="Com --sintetico: URL de um PostgreSQL descartável em vez do SQLite")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.sintetico is not None:
+        os.environ["DATABASE_URL"] = args.url or "sqlite://"
+
+    from sqlalchemy import create_engine, func, text
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from app.database import Base, engine
+    from app.models.alimentos import Alimento
+    from app.services.busca_alimentos import BuscaAlimentos
+
+    if args.sintetico is not None:
+        if args.url:
+            from app.migracoes import aplicar_migracoes
+
+            engine = create_engine(args.url)
+            Base.metadata.create_all(bind=engine)
+            aplicar_migracoes(engine)
+        else:
+            engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+            Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            db.add_all(
+                Alimento(alimento=nome, alimentos=nome, alimento_normalizado=nome.lower(), categoria=categoria)
+                for nome, categoria in gerar_nomes(args.sintetico)
+            )
+            db.commit()
+        if args.url:
+            with engine.begin() as conexao:
+                conexao.execute(text("ANALYZE alimentos"))  # estatísticas para o planner escolher os índices GIN
+
+    db = sessionmaker(bind=engine)()
+    busca = BuscaAlimentos(ttl_segundos=0)
+    total = db.query(func.count(Alimento.id)).scalar()
+
+    def ilike_antigo(q):
+        return db.query(Alimento).filter(
+            func.lower(Alimento.alimento).ilike(f"%{q.strip().lower()}%")
+        ).order_by(Alimento.alimento.asc()).limit(args.limit).all()
+
+    def ranqueada(q):
+        return busca.buscar(db, q, limit=args.limit)
+
+    consultas = [prefixo for termo in TERMOS for prefixo in teclas(termo)]
+    ranqueada(consultas[0])  # aquece (constrói o índice em memória, se for o caso)
+    modo = "SQL indexado" if busca._sql_disponivel else "índice em memória"
+
+    print(f"Banco: {engine.dialect.name} | {total:,} alimentos | {len(consultas)} consultas x {args.repeticoes}")
+    print(f"{'estratégia':28} {'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8}")
+    for rotulo, funcao in (("ILIKE + ORDER BY nome", ilike_antigo), (f"ranqueada ({modo})", ranqueada)):
+        tempos = []
+        for _ in range(args.repeticoes):
+            for q in consultas:
+                inicio = time.perf_counter()
+                funcao(q)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+        print(f"{rotulo:28} {statistics.median(tempos):>8.2f} {percentil(tempos, 95):>8.2f} {max(tempos):>8.2f}")
+
+    print("\nTop 3 por relevância:")
+    for termo in ("arroz", "feijao carioca", "frango grel", "pao queij"):
+        print(f"  {termo!r:18} -> {[a.alimento for a in ranqueada(termo)[:3]]}")
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
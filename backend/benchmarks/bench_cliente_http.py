@@ -0,0 +1,98 @@
+# benchmarks/bench_cliente_http.py
+#
+# Vazão de consultar_ia_para_alimento contra o stub local do Gemini (sem rede):
+# requests.post bloqueante por chamada (antigo) x cliente httpx compartilhado.
+#
+# Uso (a partir de backend/, com o .env carregado — o pacote app exige DATABASE_URL):
+#   python -m benchmarks.bench_cliente_http
+#   python -m benchmarks.bench_cliente_http --chamadas 400 --concorrencia 50 --latencia-ms 80 --taxa-erro 0.05
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+from benchmarks.stub_gemini import StubGemini
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+async def consultar_antigo(base_url: str, nome: str):
+    """Reprodução do caminho antigo: requests.post dentro da corrotina (bloqueia o event loop)."""
+    url = f"{base_url}/v1beta/models/gemini-pro:generateContent?key={os.environ['GEMINI_API_KEY']}"
+    payload = {"contents": [{"parts": [{"text": f"Alimento: {nome}"}]}]}
+    try:
+        resposta = requests.post(url, json=payload, timeout=10)
+        resposta.raise_for_status()
+        texto = resposta.json()["candidates"][0]["content"]["parts"][0]["text"]
+        return json.loads(texto)
+    except Exception:
+        return None
+
+
+async def executar(funcao, chamadas: int, concorrencia: int):
+    latencias, falhas = [], 0
+    fila = asyncio.Queue()
+    for i in range(chamadas):
+        fila.put_nowait(f"alimento {i}")
+
+    async def trabalhador():
+        nonlocal falhas
+        while not fila.empty():
+            nome = fila.get_nowait()
+            inicio = time.perf_counter()
+            if await funcao(nome) is None:
+                falhas += 1
+            latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    return time.perf_counter() - inicio, latencias, falhas
+
+
+async def principal(args) -> int:
+    from app.config import settings
+    from app.http_utils import iniciar_cliente_http, fechar_cliente_http, HTTP2_DISPONIVEL
+    from app.routers.alimentos import consultar_ia_para_alimento
+
+    os.environ.setdefault("GEMINI_API_KEY", "chave-de-teste")
+    with StubGemini(latencia_ms=args.latencia_ms, taxa_erro=args.taxa_erro) as stub:
+        settings.GEMINI_API_BASE_URL = stub.url
+        await iniciar_cliente_http()
+
+        print(f"{args.chamadas} chamadas, concorrência {args.concorrencia}, latência do stub {args.latencia_ms:.0f} ms, "
+              f"erros 503 {args.taxa_erro:.0%} | HTTP/2: {'sim' if HTTP2_DISPONIVEL else 'não (h2 ausente)'}")
+        print(f"{'estratégia':26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'falhas':>7} {'conexões':>9} {'req. stub':>10}")
+        estrategias = (
+            ("requests.post (antigo)", lambda nome: consultar_antigo(stub.url, nome)),
+            ("httpx compartilhado", consultar_ia_para_alimento),
+        )
+        for rotulo, funcao in estrategias:
+            stub.zerar_contadores()
+            duracao, latencias, falhas = await executar(funcao, args.chamadas, args.concorrencia)
+            print(f"{rotulo:26} {args.chamadas / duracao:>8.1f} {statistics.median(latencias):>8.1f} "
+                  f"{percentil(latencias, 95):>8.1f} {falhas:>7} {len(stub.conexoes):>9} {stub.requisicoes:>10}")
+
+        await fechar_cliente_http()
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do cliente HTTP compartilhado (stub local do Gemini)")
+    parser.add_argument("--chamadas", type=int, default=200)
+    parser.add_argument("--concorrencia", type=int, default=32)
+    parser.add_argument("--latencia-ms", type=float, default=50)
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Fração de respostas 503 do stub")
+    return asyncio.run(principal(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
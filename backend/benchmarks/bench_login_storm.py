@@ -0,0 +1,116 @@
+# benchmarks/bench_login_storm.py
+#
+# Rajada de logins (ex.: depois de uma notificação push) e o efeito nas outras
+# rotas síncronas. Um app mínimo com as mesmas formas das rotas reais:
+#   - /historico: rota síncrona que segura uma thread do threadpool ~5 ms (consulta ao banco);
+#   - /login-antigo: bcrypt.checkpw dentro de rota síncrona (como era);
+#   - /login: rota async com o bcrypt no pool de processos (ExecutorSenhas).
+# Mede a latência de /historico sem carga, durante a rajada antiga e durante a
+# nova, além de logins concluídos e recusados (503) por segundo.
+#
+# Uso (a partir de backend/):
+#   python -m benchmarks.bench_login_storm
+#   python -m benchmarks.bench_login_storm --custo 12 --concorrencia 200 --segundos 10
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de rajada de logins x latência das outras rotas")
+    parser.add_argument("--custo", type=int, default=12, help="Custo do bcrypt")
+    parser.add_argument("--concorrencia", type=int, default=100, help="Clientes fazendo login ao mesmo tempo")
+    parser.add_argument("--segundos", type=float, default=5, help="Duração de cada cenário")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1, help="Processos do pool de senhas")
+    parser.add_argument("--fila", type=int, default=32, help="Operações pendentes além dos processos (SENHA_FILA_MAX)")
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    import bcrypt
+    import httpx
+    from fastapi import FastAPI, HTTPException, Response
+
+    from app.services.hash_senhas import ExecutorSenhas, SobrecargaSenhas
+
+    executor = ExecutorSenhas(processos=args.processos, fila_max=args.fila, custo=args.custo)
+    senha = "Senha@123"
+    senha_hash = bcrypt.hashpw(senha.encode(), bcrypt.gensalt(rounds=args.custo)).decode()
+
+    app = FastAPI()
+
+    @app.get("/historico")
+    def historico():
+        time.sleep(0.005)
+        return {"itens": []}
+
+    @app.post("/login-antigo")
+    def login_antigo():
+        if not bcrypt.checkpw(senha.encode(), senha_hash.encode()):
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+
+    @app.post("/login")
+    async def login():
+        try:
+            ok, _ = await executor.verificar(senha, senha_hash)
+        except SobrecargaSenhas:
+            return Response(status_code=503, headers={"Retry-After": "1"})
+        if not ok:
+            raise HTTPException(status_code=401)
+        return {"ok": True}
+
+    async def cenario(cliente: httpx.AsyncClient, rota_login):
+        fim = time.perf_counter() + args.segundos
+        contagem = {200: 0, 503: 0}
+
+        async def logins():
+            while time.perf_counter() < fim:
+                resposta = await cliente.post(rota_login)
+                contagem[resposta.status_code] = contagem.get(resposta.status_code, 0) + 1
+                if resposta.status_code == 503:
+                    await asyncio.sleep(0.05)  # cliente respeitando o Retry-After (encurtado)
+
+        async def medir_historico():
+            tempos = []
+            while time.perf_counter() < fim:
+                inicio = time.perf_counter()
+                await cliente.get("/historico")
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                await asyncio.sleep(0.01)
+            return tempos
+
+        tarefas = [asyncio.create_task(logins()) for _ in range(args.concorrencia if rota_login else 0)]
+        tempos = await medir_historico()
+        await asyncio.gather(*tarefas)
+        return tempos, contagem
+
+    async def executar():
+        await executor.iniciar()
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=None) as cliente:
+            print(f"bcrypt custo {args.custo} | {args.concorrencia} clientes de login | {args.processos} processos, "
+                  f"fila {args.fila} | {args.segundos:.0f}s por cenário")
+            print(f"{'cenário':14} {'/historico p50':>14} {'p99 ms':>9} {'máx ms':>9} {'logins/s':>9} {'503/s':>7}")
+            for rotulo, rota in (("sem carga", None), ("login antigo", "/login-antigo"), ("login novo", "/login")):
+                tempos, contagem = await cenario(cliente, rota)
+                print(f"{rotulo:14} {statistics.median(tempos):>14.1f} {percentil(tempos, 99):>9.1f} {max(tempos):>9.1f} "
+                      f"{contagem.get(200, 0) / args.segundos:>9.1f} {contagem.get(503, 0) / args.segundos:>7.1f}")
+        executor.encerrar()
+
+    asyncio.run(executar())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
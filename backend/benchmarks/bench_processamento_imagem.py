@@ -0,0 +1,107 @@
+# benchmarks/bench_processamento_imagem.py
+#
+# Compara bytes e latência antes/depois do pré-processamento de imagens.
+#
+# Uso (a partir de backend/, com o .env carregado — o pacote app exige DATABASE_URL):
+#   python -m benchmarks.bench_processamento_imagem                  # fixtures sintéticas
+#   python -m benchmarks.bench_processamento_imagem --fixtures fotos/ # suas fotos
+#   python -m benchmarks.bench_processamento_imagem --gemini          # + latência do scan (usa GEMINI_API_KEY)
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from app.services.processamento_imagem import preprocessar_imagem
+
+EXTENSOES = {".jpg", ".jpeg", ".png", ".webp", ".heic"}
+
+
+def gerar_fixtures(destino: Path) -> list:
+    """Gera fotos no estilo de câmera de celular (12MP, EXIF de rotação, PNG)."""
+    especificacoes = [
+        ("celular_12mp_paisagem.jpg", (4032, 3024), "JPEG", None),
+        ("celular_12mp_retrato_exif6.jpg", (4032, 3024), "JPEG", 6),
+        ("celular_8mp.jpg", (3264, 2448), "JPEG", None),
+        ("pequena_1200.jpg", (1200, 900), "JPEG", None),
+        ("captura_tela.png", (1170, 2532), "PNG", None),
+    ]
+    caminhos = []
+    for nome, tamanho, formato, orientacao in especificacoes:
+        gradiente = Image.linear_gradient("L").resize(tamanho)
+        ruido = Image.effect_noise(tamanho, 48)
+        img = Image.merge("RGB", (gradiente, ruido, gradiente.transpose(Image.FLIP_LEFT_RIGHT)))
+        caminho = destino / nome
+        if formato == "JPEG":
+            exif = Image.Exif()
+            if orientacao:
+                exif[0x0112] = orientacao
+            img.save(caminho, format="JPEG", quality=95, exif=exif.tobytes())
+        else:
+            img.save(caminho, format="PNG")
+        caminhos.append(caminho)
+    return caminhos
+
+
+def medir(funcao, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do pré-processamento de imagens")
+    parser.add_argument("--fixtures", type=Path, help="Diretório com imagens (padrão: fixtures sintéticas)")
+    parser.add_argument("--max-lado", type=int, default=None)
+    parser.add_argument("--formato", default=None, choices=["JPEG", "WEBP"])
+    parser.add_argument("--qualidade", type=int, default=None)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--gemini", action="store_true", help="Mede também a latência do scan rápido no Gemini")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.fixtures:
+            caminhos = sorted(p for p in args.fixtures.iterdir() if p.suffix.lower() in EXTENSOES)
+        else:
+            caminhos = gerar_fixtures(Path(tmp))
+        if not caminhos:
+            print("Nenhuma imagem encontrada.")
+            return 1
+
+        if args.gemini:
+            from app.vision import escanear_prato_extrair_alimentos
+
+        print(f"{'imagem':34} {'antes':>10} {'depois':>10} {'redução':>8} {'dimensões':>11} {'prep ms':>8}"
+              + (f" {'gemini antes':>13} {'gemini depois':>14}" if args.gemini else ""))
+        total_antes = total_depois = 0
+        for caminho in caminhos:
+            original = caminho.read_bytes()
+            processar = lambda: preprocessar_imagem(original, args.max_lado, args.formato, args.qualidade)
+            processada = processar()
+            ms = medir(processar, args.repeticoes)
+
+            total_antes += len(original)
+            total_depois += len(processada.conteudo)
+            reducao = 100 * (1 - len(processada.conteudo) / len(original))
+            linha = (f"{caminho.name:34} {len(original):>10,} {len(processada.conteudo):>10,} {reducao:>7.1f}% "
+                     f"{processada.largura:>5}x{processada.altura:<5} {ms:>8.1f}")
+            if args.gemini:
+                ms_antes = medir(lambda: escanear_prato_extrair_alimentos(original), 1)
+                ms_depois = medir(lambda: escanear_prato_extrair_alimentos(processada.conteudo), 1)
+                linha += f" {ms_antes:>13.0f} {ms_depois:>14.0f}"
+            print(linha)
+
+        print(f"\nTotal: {total_antes:,} -> {total_depois:,} bytes "
+              f"({100 * (1 - total_depois / total_antes):.1f}% menos para upload/GCS/Gemini)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# benchmarks/bench_refeicoes_hoje.py
+#
+# Leitura das refeições de hoje para o dashboard (/refeicoes-hoje) com 1, 10 e
+# 50 refeições no dia: caminho antigo (consulta das refeições + lazy load de
+# 'alimentos' por refeição + json.loads da análise) x get_resumo_refeicoes_hoje
+# (uma consulta com funções de janela). Mostra consultas SQL e latência p50/p95.
+#
+# Uso (a partir de backend/):
+#   python -m benchmarks.bench_refeicoes_hoje
+#   python -m benchmarks.bench_refeicoes_hoje --refeicoes 1 10 50 100 --alimentos 6 --repeticoes 200
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+NOMES = ["Arroz branco", "Feijão carioca", "Frango grelhado", "Salada de alface", "Ovo cozido",
+         "Batata doce", "Banana prata", "Pão francês", "Queijo minas", "Café com leite"]
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark das refeições de hoje (dashboard)")
+    parser.add_argument("--refeicoes", type=int, nargs="+", default=[1, 10, 50], help="Refeições no dia")
+    parser.add_argument("--alimentos", type=int, default=5, help="Alimentos por refeição")
+    parser.add_argument("--repeticoes", type=int, default=100)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from app import crud, perfil_sql
+    from app.database import Base
+    from app.models.refeicoes import RefeicaoSalva, AlimentoSalvo, RefeicaoStatus
+    from app.models.usuario import Usuario
+
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    # Funções do PostgreSQL usadas pelos defaults dos modelos
+    event.listen(engine, "connect", lambda conexao, _: conexao.create_function("TIMEZONE", 2, lambda _fuso, ts: ts))
+    perfil_sql.instrumentar_engine(engine)
+    Base.metadata.create_all(bind=engine)
+    Sessao = sessionmaker(bind=engine)
+
+    def caminho_antigo(db, user_id):
+        """Como era: refeições de hoje, depois alimentos (lazy) e o JSON de cada uma."""
+        inicio, fim = crud._intervalo_de_hoje()
+        refeicoes = db.query(RefeicaoSalva).filter(
+            RefeicaoSalva.owner_id == user_id,
+            RefeicaoSalva.created_at >= inicio,
+            RefeicaoSalva.created_at < fim,
+            RefeicaoSalva.status == RefeicaoStatus.ANALYSIS_COMPLETE,
+        ).order_by(RefeicaoSalva.created_at.asc()).all()
+        resultado = []
+        for refeicao in refeicoes:
+            analise = json.loads(refeicao.analysis_result_json)["analise_nutricional"]
+            principais = [alimento.nome for alimento in refeicao.alimentos[:3]]
+            resultado.append((refeicao.id, analise["calorias_totais"], principais))
+        return resultado
+
+    def caminho_novo(db, user_id):
+        return crud.get_resumo_refeicoes_hoje(db, user_id)
+
+    aleatorio = random.Random(42)
+    agora = datetime.now(ZoneInfo('America/Sao_Paulo')).replace(tzinfo=None)
+    hoje = agora.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    print(f"SQLite em memória | {args.alimentos} alimentos por refeição | {args.repeticoes} repetições")
+    print(f"{'refeições':>9} {'caminho':8} {'consultas':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for quantidade in args.refeicoes:
+        with Sessao() as db:
+            usuario = Usuario(nome="Bench", email=f"bench{quantidade}@nutriscan.local", senha_hash="x")
+            db.add(usuario)
+            db.flush()
+            # Refeições dos 7 dias anteriores, que a consulta precisa deixar de fora
+            db.add_all(
+                RefeicaoSalva(owner_id=usuario.id, created_at=hoje - timedelta(days=dia, hours=-12),
+                              status=RefeicaoStatus.ANALYSIS_COMPLETE, analysis_result_json="{}", total_calorias=0.0)
+                for dia in range(1, 8) for _ in range(quantidade)
+            )
+            for i in range(quantidade):
+                criada = hoje.replace(hour=(6 + i) % 24, minute=i % 60)
+                analise = {"analise_nutricional": {"calorias_totais": 500 + i,
+                                                   "macronutrientes": {"proteinas_g": 30, "carboidratos_g": 60, "gorduras_g": 15}}}
+                refeicao = RefeicaoSalva(
+                    owner_id=usuario.id, created_at=criada, updated_at=criada,
+                    status=RefeicaoStatus.ANALYSIS_COMPLETE, analysis_result_json=json.dumps(analise),
+                    total_calorias=500.0 + i, total_proteinas_g=30.0, total_carboidratos_g=60.0, total_gorduras_g=15.0,
+                )
+                db.add(refeicao)
+                db.flush()
+                db.add_all(
+                    AlimentoSalvo(refeicao_id=refeicao.id, nome=aleatorio.choice(NOMES), quantidade_estimada_g=100)
+                    for _ in range(args.alimentos)
+                )
+            db.commit()
+            user_id = usuario.id
+
+        for rotulo, funcao in (("antigo", caminho_antigo), ("novo", caminho_novo)):
+            tempos, consultas = [], 0
+            with Sessao() as db:
+                funcao(db, user_id)  # aquece (cache de compilação do SQL)
+            for _ in range(args.repeticoes):
+                with Sessao() as db:
+                    with perfil_sql.medir_consultas() as perfil:
+                        inicio = time.perf_counter()
+                        itens = funcao(db, user_id)
+                        tempos.append((time.perf_counter() - inicio) * 1000)
+                    consultas = perfil.total
+            assert len(itens) == quantidade, (rotulo, len(itens))
+            print(f"{quantidade:>9} {rotulo:8} {consultas:>9} {statistics.median(tempos):>8.2f} {percentil(tempos, 95):>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
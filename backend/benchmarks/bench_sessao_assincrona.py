@@ -0,0 +1,150 @@
+# benchmarks/bench_sessao_assincrona.py
+#
+# Capacidade por instância das rotas de leitura: rota síncrona com Session
+# (threadpool do Starlette, como era) x rota async com AsyncSession.run_sync
+# (como ficou), ambas chamando as mesmas funções do crud do /historico
+# (página + contagem). A latência de rede até o Neon é simulada em cada
+# consulta: time.sleep no engine síncrono (a thread fica presa esperando) e
+# asyncio.sleep no assíncrono (o event loop segue atendendo).
+#
+# Para cada nível de usuários simultâneos mostra vazão e latência p50/p95 e, no
+# fim, quantos usuários cada versão sustenta com p95 abaixo do SLO.
+#
+# Por padrão usa um SQLite temporário (aiosqlite no lado assíncrono). Com --url
+# roda num PostgreSQL (psycopg2 x asyncpg); use um banco descartável, as
+# tabelas são criadas e recebem um usuário de teste.
+#
+# Uso (a partir de backend/):
+#   python -m benchmarks.bench_sessao_assincrona
+#   python -m benchmarks.bench_sessao_assincrona --usuarios 10 50 100 200 400 --latencia-ms 5 --slo-ms 250
+#   python -m benchmarks.bench_sessao_assincrona --url postgresql://postgres@localhost/bench
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Capacidade: Session no threadpool x AsyncSession")
+    parser.add_argument("--usuarios", type=int, nargs="+", default=[10, 50, 100, 200, 400], help="Usuários simultâneos")
+    parser.add_argument("--latencia-ms", type=float, default=5, help="Latência de rede simulada por consulta")
+    parser.add_argument("--segundos", type=float, default=4, help="Duração de cada nível")
+    parser.add_argument("--slo-ms", type=float, default=250, help="p95 máximo para contar como capacidade")
+    parser.add_argument("--pool", type=int, default=20, help="pool_size de cada engine")
+    parser.add_argument("--overflow", type=int, default=20, help="max_overflow de cada engine")
+    parser.add_argument("--url", help="URL de um PostgreSQL descartável (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.setdefault("DATABASE_URL", url)
+
+    import httpx
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.engine import make_url
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import Session, sessionmaker
+    from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+    from sqlalchemy.util import await_only
+
+    from app import crud
+    from app.database import Base, url_assincrona
+    from app.models.refeicoes import RefeicaoSalva, RefeicaoStatus
+    from app.models.usuario import Usuario
+
+    latencia = args.latencia_ms / 1000
+    sqlite = make_url(url).get_backend_name() == "sqlite"
+    engine = create_engine(url, poolclass=QueuePool, pool_size=args.pool, max_overflow=args.overflow,
+                           connect_args={"check_same_thread": False} if sqlite else {})
+    async_engine = create_async_engine(url_assincrona(make_url(url)), poolclass=AsyncAdaptedQueuePool,
+                                       pool_size=args.pool, max_overflow=args.overflow)
+    event.listen(engine, "before_cursor_execute", lambda *_: time.sleep(latencia))
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *_: await_only(asyncio.sleep(latencia)))
+
+    Base.metadata.create_all(bind=engine)
+    Sessao = sessionmaker(bind=engine)
+    SessaoAssincrona = async_sessionmaker(async_engine, expire_on_commit=False)
+    with Sessao() as db:
+        usuario = Usuario(nome="Bench", email=f"bench-{uuid4().hex[:8]}@nutriscan.local", senha_hash="x")
+        db.add(usuario)
+        db.flush()
+        agora = datetime.now()
+        db.add_all(
+            RefeicaoSalva(owner_id=usuario.id, created_at=agora - timedelta(hours=i), updated_at=agora,
+                          status=RefeicaoStatus.ANALYSIS_COMPLETE, total_calorias=500.0)
+            for i in range(200)
+        )
+        db.commit()
+        user_id = usuario.id
+
+    def get_db():
+        with Sessao() as db:
+            yield db
+
+    async def get_async_db():
+        async with SessaoAssincrona() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/antes/historico")
+    def historico_sincrono(db: Session = Depends(get_db)):
+        linhas, proximo, _ = crud.get_historico_refeicoes_por_usuario(db, user_id=user_id, limit=20)
+        return {"itens": len(linhas), "total": crud.contar_refeicoes_por_usuario(db, user_id=user_id)}
+
+    @app.get("/depois/historico")
+    async def historico_assincrono(db: AsyncSession = Depends(get_async_db)):
+        linhas, proximo, _ = await db.run_sync(crud.get_historico_refeicoes_por_usuario, user_id=user_id, limit=20)
+        return {"itens": len(linhas), "total": await db.run_sync(crud.contar_refeicoes_por_usuario, user_id=user_id)}
+
+    async def nivel(cliente: httpx.AsyncClient, rota: str, usuarios: int):
+        fim = time.perf_counter() + args.segundos
+        tempos, erros = [], 0
+
+        async def usuario_simultaneo():
+            nonlocal erros
+            while time.perf_counter() < fim:
+                inicio = time.perf_counter()
+                resposta = await cliente.get(rota)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                erros += resposta.status_code != 200
+
+        await asyncio.gather(*(usuario_simultaneo() for _ in range(usuarios)))
+        return tempos, erros
+
+    async def executar():
+        transporte = httpx.ASGITransport(app=app)
+        capacidade = {"antes": 0, "depois": 0}
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=None) as cliente:
+            print(f"{async_engine.dialect.driver} + {args.latencia_ms:.0f} ms de rede simulada por consulta | 2 consultas por requisição | "
+                  f"pool {args.pool}+{args.overflow} | {args.segundos:.0f}s por nível | SLO p95 {args.slo_ms:.0f} ms")
+            print(f"{'usuários':>8} {'versão':7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'erros':>6}")
+            for usuarios in args.usuarios:
+                for versao in ("antes", "depois"):
+                    tempos, erros = await nivel(cliente, f"/{versao}/historico", usuarios)
+                    p95 = percentil(tempos, 95)
+                    print(f"{usuarios:>8} {versao:7} {len(tempos) / args.segundos:>8.0f} "
+                          f"{statistics.median(tempos):>8.1f} {p95:>8.1f} {erros:>6}")
+                    if p95 <= args.slo_ms and not erros:
+                        capacidade[versao] = max(capacidade[versao], usuarios)
+        await async_engine.dispose()
+        print(f"Capacidade (usuários com p95 <= {args.slo_ms:.0f} ms): "
+              f"antes {capacidade['antes']}, depois {capacidade['depois']}")
+
+    asyncio.run(executar())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
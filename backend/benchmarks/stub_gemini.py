@@ -0,0 +1,94 @@
+# benchmarks/stub_gemini.py
+#
+# Servidor local que imita o endpoint REST generateContent do Gemini, para medir
+# o cliente HTTP sem rede. Latência e taxa de erros (503) são configuráveis, e o
+# servidor conta as conexões TCP distintas (para verificar o keep-alive).
+#
+# Uso:
+#   with StubGemini(latencia_ms=80) as stub:
+#       settings.GEMINI_API_BASE_URL = stub.url
+#       ...
+
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+
+import uvicorn
+
+RESPOSTA_ALIMENTO = {
+    "alimento": "Alimento de teste",
+    "categoria": "Outros",
+    "energia_kcal_100g": 120.0,
+    "proteina_g_100g": 4.0,
+    "carboidrato_g_100g": 20.0,
+    "lipidios_g_100g": 2.5,
+    "fibra_g_100g": 1.0,
+    "medida_caseira_unidade": "colher de sopa",
+    "medida_caseira_gramas_por_unidade": 25.0,
+}
+
+
+class StubGemini:
+    def __init__(self, latencia_ms: float = 50, taxa_erro: float = 0.0, semente: int = 42):
+        self.latencia_ms = latencia_ms
+        self.taxa_erro = taxa_erro
+        self._aleatorio = random.Random(semente)
+        self.requisicoes = 0
+        self.erros_enviados = 0
+        self.conexoes = set()
+        self.porta = self._porta_livre()
+        self.url = f"http://127.0.0.1:{self.porta}"
+        self._servidor = None
+        self._thread = None
+
+    @staticmethod
+    def _porta_livre() -> int:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    async def _app(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        self.requisicoes += 1
+        self.conexoes.add(tuple(scope["client"]))
+        while (await receive()).get("more_body"):
+            pass
+        await asyncio.sleep(self.latencia_ms / 1000)
+
+        if self._aleatorio.random() < self.taxa_erro:
+            self.erros_enviados += 1
+            status, corpo = 503, {"error": {"code": 503, "message": "stub: indisponível"}}
+        else:
+            texto = json.dumps(RESPOSTA_ALIMENTO, ensure_ascii=False)
+            status, corpo = 200, {"candidates": [{"content": {"parts": [{"text": texto}]}}]}
+
+        dados = json.dumps(corpo).encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(dados)).encode())]})
+        await send({"type": "http.response.body", "body": dados})
+
+    def zerar_contadores(self) -> None:
+        self.requisicoes = 0
+        self.erros_enviados = 0
+        self.conexoes = set()
+
+    def __enter__(self) -> "StubGemini":
+        config = uvicorn.Config(self._app, host="127.0.0.1", port=self.porta, log_level="warning",
+                                lifespan="off", interface="asgi3", timeout_keep_alive=120)
+        self._servidor = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._servidor.run, daemon=True)
+        self._thread.start()
+        limite = time.monotonic() + 10
+        while not self._servidor.started:
+            if time.monotonic() > limite:
+                raise RuntimeError("Stub do Gemini não iniciou")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._servidor.should_exit = True
+        self._thread.join(timeout=5)
@@ -2,24 +2,33 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from dotenv import load_dotenv
 import time
 import os
+import asyncio
 import logging
 from starlette.middleware.cors import CORSMiddleware
 
-# ✅ IMPORTS DO RATE LIMITING (ANTES DA CRIAÇÃO DO APP)
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-
 # Routers existentes
 from app.routers.vision_alimentos import router as vision_router
 from app.routers.auth import router as auth_router
 from app.routers.usuarios import router as usuarios_router
 from app.routers.conversoes import router as conversoes_router
 from app.routers import alimentos as alimentos_router
+from app.redis_utils import fechar_redis
+from app.http_utils import iniciar_cliente_http, fechar_cliente_http
+from app.services.cache_scan import cache_scan
+from app.services.gemini_alimentos import consulta_gemini_alimentos
+from app.services.cache_principal import cache_principal
+from app.services.hash_senhas import executor_senhas
+from app.services.limite_taxa import MiddlewareLimiteTaxa, custo_requisicao, limitador_taxa
+from app.services.autocomplete_alimentos import loop_atualizacao_autocomplete
+from app.database import SessionLocal, async_engine, estatisticas_pool, estatisticas_pool_assincrono
+from app.services.staging_imagens import loop_varredura_staging
+from app.services.fila_analises import fila_analises, TrabalhadorAnalises
+from app.config import settings
+from app import metricas, perfil_sql
 
 # ✅ CARREGAR VARIÁVEIS DE AMBIENTE
 load_dotenv()
@@ -31,12 +40,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# ✅ CRIAR LIMITER ANTES DO APP
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["200/minute"]  # Limite global padrão
-)
-
 # ✅ CRIAR APP COM CONFIGURAÇÕES CONDICIONAIS
 app = FastAPI(
     title="AppNutri API",
@@ -47,10 +50,6 @@ app = FastAPI(
     openapi_url="/openapi.json" if os.getenv('APP_ENV') != 'production' else None
 )
 
-# ✅ CONFIGURAR LIMITER NO APP
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
 # ✅ CONFIGURAÇÃO CORS SEGURA E DINÂMICA
 def get_cors_origins():
     """Retorna origens permitidas baseado no ambiente"""
@@ -73,6 +72,11 @@ def get_cors_origins():
     
     return base_origins
 
+# ✅ LIMITE DE REQUISIÇÕES (por usuário/IP, ponderado pelo custo da rota; Redis compartilhado)
+# Adicionado antes do CORS para ficar dentro dele: as respostas 429 também levam os headers de CORS
+if settings.LIMITE_TAXA_HABILITADO:
+    app.add_middleware(MiddlewareLimiteTaxa)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=get_cors_origins(),
@@ -92,6 +96,8 @@ app.add_middleware(
         "X-Total-Count",
         "X-Page-Number",
         "X-Page-Size",
+        "X-Page-Next",
+        "Retry-After",
     ]  # ✅ Específico em vez de "*"
 )
 
@@ -146,6 +152,20 @@ async def security_and_logging_middleware(request: Request, call_next):
         logger.error(f"❌ Erro no middleware: {str(e)}")
         raise
 
+# ✅ PERFIL SQL POR REQUISIÇÃO (headers X-SQL-* e avisos de N+1 no log)
+app.add_middleware(perfil_sql.MiddlewarePerfilSql)
+
+# ✅ MÉTRICAS (mais externo: mede a resposta inteira, inclusive streaming)
+if settings.METRICAS_HABILITADAS:
+    app.add_middleware(metricas.MiddlewareMetricas)
+    metricas.registrar_estatisticas("cache_scan", cache_scan.estatisticas)
+    metricas.registrar_estatisticas("cache_principal", cache_principal.estatisticas)
+    metricas.registrar_estatisticas("gemini_alimentos", consulta_gemini_alimentos.estatisticas)
+    metricas.registrar_estatisticas("hash_senhas", executor_senhas.estatisticas)
+    metricas.registrar_estatisticas("db_pool", estatisticas_pool)
+    metricas.registrar_estatisticas("db_pool_async", estatisticas_pool_assincrono)
+    metricas.registrar_estatisticas("limite_taxa", limitador_taxa.estatisticas)
+
 # ✅ TRATAMENTO GLOBAL DE ERROS
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
@@ -157,7 +177,9 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             "message": exc.detail,
             "status_code": exc.status_code,
             "path": request.url.path
-        }
+        },
+        # WWW-Authenticate (401), Retry-After (503)...
+        headers=getattr(exc, "headers", None),
     )
 
 @app.exception_handler(Exception)
@@ -190,7 +212,6 @@ app.include_router(alimentos_router.router, prefix="/api/v1", tags=["🍔 Alimen
 
 # ✅ ROTAS PÚBLICAS COM RATE LIMITING
 @app.get("/", tags=["Status"])
-@limiter.limit("10/minute")  # ✅ Rate limit na rota raiz
 async def read_root(request: Request):
     """Rota raiz da API"""
     return {
@@ -202,7 +223,6 @@ async def read_root(request: Request):
     }
 
 @app.get("/health", tags=["Status"])
-@limiter.limit("30/minute")
 async def health_check(request: Request):
     """Health check para monitoramento"""
     return {
@@ -213,7 +233,6 @@ async def health_check(request: Request):
     }
 
 @app.get("/api/v1/info", tags=["Status"])
-@limiter.limit("20/minute")
 async def api_info(request: Request):
     """Informações sobre a API"""
     return {
@@ -236,6 +255,20 @@ async def api_info(request: Request):
         }
     }
 
+# ✅ MÉTRICAS PROMETHEUS
+if settings.METRICAS_HABILITADAS:
+    @app.get("/metrics", tags=["Status"], include_in_schema=False)
+    @custo_requisicao(unidades=0)  # scrape do Prometheus não entra no limite
+    async def metrics(request: Request):
+        """Métricas no formato texto do Prometheus"""
+        if settings.METRICAS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICAS_TOKEN}":
+            raise HTTPException(status_code=401, detail="Não autorizado")
+        try:
+            metricas.atualizar_estatisticas("fila_analises", await fila_analises.estatisticas())
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao ler estatísticas da fila de análises: {e}")
+        return Response(content=metricas.gerar_saida(), media_type=metricas.TIPO_CONTEUDO)
+
 # ✅ ROTA DE TESTE (APENAS DESENVOLVIMENTO)
 if os.getenv('APP_ENV') != 'production':
     @app.get("/debug/headers", tags=["Debug"])
@@ -248,6 +281,41 @@ if os.getenv('APP_ENV') != 'production':
             "url": str(request.url)
         }
 
+    @app.get("/debug/cache-scan", tags=["Debug"])
+    async def debug_cache_scan():
+        """Contadores do cache de resultados do scan rápido"""
+        return cache_scan.estatisticas()
+
+    @app.get("/debug/cache-principal", tags=["Debug"])
+    async def debug_cache_principal():
+        """Contadores do cache de usuários autenticados"""
+        return cache_principal.estatisticas()
+
+    @app.get("/debug/gemini-alimentos", tags=["Debug"])
+    async def debug_gemini_alimentos():
+        """Contadores da criação de alimentos via Gemini (coalescidas, cache negativo)"""
+        return consulta_gemini_alimentos.estatisticas()
+
+    @app.get("/debug/db-pool", tags=["Debug"])
+    async def debug_db_pool():
+        """Pools de conexões do banco (em uso, overflow, espera no checkout, timeouts)"""
+        return {"sincrono": estatisticas_pool(), "assincrono": estatisticas_pool_assincrono()}
+
+    @app.get("/debug/hash-senhas", tags=["Debug"])
+    async def debug_hash_senhas():
+        """Pool de processos do bcrypt (pendentes, rehashes, recusadas por sobrecarga)"""
+        return executor_senhas.estatisticas()
+
+    @app.get("/debug/limite-taxa", tags=["Debug"])
+    async def debug_limite_taxa():
+        """Limite de requisições (armazenamento em uso, permitidas, recusadas por balde)"""
+        return limitador_taxa.estatisticas()
+
+    @app.get("/debug/fila-analises", tags=["Debug"])
+    async def debug_fila_analises():
+        """Tamanho da fila da análise detalhada (prontos, reagendados, dead-letter)"""
+        return await fila_analises.estatisticas()
+
 # ✅ EVENTO DE STARTUP
 @app.on_event("startup")
 async def startup_event():
@@ -255,6 +323,14 @@ async def startup_event():
     logger.info("🚀 AppNutri API iniciando...")
     logger.info(f"📍 Ambiente: {os.getenv('APP_ENV', 'development')}")
     logger.info(f"🔒 CORS Origins: {len(get_cors_origins())} configuradas")
+    await iniciar_cliente_http()
+    await executor_senhas.iniciar()
+    app.state.tarefa_varredura_staging = asyncio.create_task(loop_varredura_staging())
+    app.state.tarefa_autocomplete = asyncio.create_task(loop_atualizacao_autocomplete(SessionLocal))
+    app.state.trabalhador_analises = None
+    if settings.ANALISE_WORKER_EM_PROCESSO:
+        app.state.trabalhador_analises = TrabalhadorAnalises(fila_analises, SessionLocal, settings.ANALISE_WORKERS)
+        app.state.trabalhador_analises.iniciar()
     logger.info("✅ API pronta para receber requisições!")
 
 # ✅ EVENTO DE SHUTDOWN
@@ -262,4 +338,12 @@ async def startup_event():
 async def shutdown_event():
     """Executado quando a aplicação é encerrada"""
     logger.info("👋 AppNutri API encerrando...")
+    app.state.tarefa_varredura_staging.cancel()
+    app.state.tarefa_autocomplete.cancel()
+    if app.state.trabalhador_analises is not None:
+        await app.state.trabalhador_analises.parar()
+    await fechar_redis()
+    await fechar_cliente_http()
+    executor_senhas.encerrar()
+    await async_engine.dispose()
     logger.info("✅ Shutdown concluído com sucesso!")
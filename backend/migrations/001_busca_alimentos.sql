@@ -0,0 +1,25 @@
+-- migrations/001_busca_alimentos.sql
+--
+-- Índices da busca ranqueada de alimentos (app/services/busca_alimentos.py).
+-- As expressões dos índices precisam ser idênticas a EXPR_NOME / EXPR_DOCUMENTO.
+-- Idempotente: pode ser executada mais de uma vez.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() é STABLE; índices exigem uma função IMMUTABLE (dicionário fixo)
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+-- LIKE '%termo%', operador % e similarity() sobre o nome sem acentos
+CREATE INDEX IF NOT EXISTS ix_alimentos_alimento_trgm
+    ON alimentos USING gin (lower(f_unaccent(alimento)) gin_trgm_ops);
+
+-- Prefixo de palavras (to_tsquery 'arroz:* & integ:*') em alimento/alimentos/categoria
+CREATE INDEX IF NOT EXISTS ix_alimentos_busca_tsv
+    ON alimentos USING gin (
+        to_tsvector('simple'::regconfig, f_unaccent(
+            coalesce(alimento, '') || ' ' || coalesce(alimentos, '') || ' ' || coalesce(categoria, '')
+        ))
+    );
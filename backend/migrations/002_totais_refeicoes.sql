@@ -0,0 +1,24 @@
+-- migrations/002_totais_refeicoes.sql
+--
+-- Totais numéricos da análise em refeicoes_salvas e agregado diário por usuário
+-- (consumo_diario). O create_all cria a tabela nova, mas não adiciona colunas
+-- em tabelas existentes. O backfill dos totais (app/backfill_totais.py) roda
+-- logo depois, no mesmo passo (POS_MIGRACAO em app/migracoes.py).
+-- Idempotente: pode ser executada mais de uma vez.
+
+ALTER TABLE refeicoes_salvas ADD COLUMN IF NOT EXISTS total_calorias DOUBLE PRECISION;
+ALTER TABLE refeicoes_salvas ADD COLUMN IF NOT EXISTS total_proteinas_g DOUBLE PRECISION;
+ALTER TABLE refeicoes_salvas ADD COLUMN IF NOT EXISTS total_carboidratos_g DOUBLE PRECISION;
+ALTER TABLE refeicoes_salvas ADD COLUMN IF NOT EXISTS total_gorduras_g DOUBLE PRECISION;
+
+CREATE TABLE IF NOT EXISTS consumo_diario (
+    owner_id INTEGER NOT NULL REFERENCES usuarios (id) ON DELETE CASCADE,
+    dia DATE NOT NULL,
+    total_calorias DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_proteinas_g DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_carboidratos_g DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_gorduras_g DOUBLE PRECISION NOT NULL DEFAULT 0,
+    refeicoes_analisadas INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (owner_id, dia)
+);
@@ -0,0 +1,9 @@
+-- migrations/003_indice_historico.sql
+--
+-- Índice da paginação por cursor do histórico (crud.get_historico_refeicoes_por_usuario):
+-- WHERE owner_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC.
+-- Mesmo nome do Index declarado em RefeicaoSalva (o create_all o cria em bancos novos).
+-- Idempotente: pode ser executada mais de uma vez.
+
+CREATE INDEX IF NOT EXISTS ix_refeicoes_salvas_owner_created_id
+    ON refeicoes_salvas (owner_id, created_at, id);
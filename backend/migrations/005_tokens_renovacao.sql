@@ -0,0 +1,21 @@
+-- migrations/005_tokens_renovacao.sql
+--
+-- Refresh tokens (TokenRenovacao em app/models/usuario.py), usados pelo login e
+-- pelo /auth/refresh. Mesmos nomes de tabela, constraint e índices que o
+-- create_all gera, para bancos novos e migrados ficarem iguais.
+-- Idempotente: pode ser executada mais de uma vez.
+
+CREATE TABLE IF NOT EXISTS tokens_renovacao (
+    id SERIAL PRIMARY KEY,
+    usuario_id INTEGER NOT NULL REFERENCES usuarios (id) ON DELETE CASCADE,
+    token_hash VARCHAR(64) NOT NULL,
+    familia VARCHAR(32) NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    expira_em TIMESTAMPTZ NOT NULL,
+    usado_em TIMESTAMPTZ,
+    revogado_em TIMESTAMPTZ,
+    CONSTRAINT tokens_renovacao_token_hash_key UNIQUE (token_hash)
+);
+
+CREATE INDEX IF NOT EXISTS ix_tokens_renovacao_usuario_id ON tokens_renovacao (usuario_id);
+CREATE INDEX IF NOT EXISTS ix_tokens_renovacao_familia ON tokens_renovacao (familia);
@@ -0,0 +1,59 @@
+# tests/conftest.py
+#
+# Ambiente mínimo para importar o app sem serviços externos: SQLite temporário,
+# Redis desligado (fila e limite de taxa em memória) e chaves falsas. O app só é
+# importado dentro das fixtures, depois de o ambiente estar pronto.
+#
+# Uso (a partir de backend/):
+#   python -m pytest -q
+
+import os
+import tempfile
+import uuid
+
+import pytest
+
+_DIRETORIO = tempfile.mkdtemp(prefix="nutriscan-testes-")
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_DIRETORIO}/testes.db")
+os.environ.setdefault("SECRET_KEY", "chave-de-testes")
+os.environ.setdefault("GEMINI_API_KEY", "chave-falsa")
+os.environ["REDIS_HABILITADO"] = "false"
+os.environ["ANALISE_FILA_BACKEND"] = "memoria"
+os.environ["SQL_PERFIL_HEADER"] = "true"  # verificar_consultas_resposta lê o X-SQL-Consultas
+
+
+@pytest.fixture(scope="session")
+def cliente():
+    """TestClient do app com as tabelas criadas no SQLite (sem o lifespan: sem workers nem migrações)."""
+    from fastapi.testclient import TestClient
+
+    from app.database import Base, engine
+    from main import app
+
+    Base.metadata.create_all(bind=engine)
+    return TestClient(app)
+
+
+@pytest.fixture
+def db(cliente):
+    from app.database import SessionLocal
+
+    sessao = SessionLocal()
+    try:
+        yield sessao
+    finally:
+        sessao.close()
+
+
+@pytest.fixture
+def usuario(db):
+    """Usuário novo a cada teste (e-mail único), com o header Authorization pronto em .headers."""
+    from app.models.usuario import Usuario
+    from app.security import criar_token_usuario
+
+    novo = Usuario(nome="Teste", email=f"{uuid.uuid4().hex}@teste.com", senha_hash="x", is_active=True)
+    db.add(novo)
+    db.commit()
+    novo.headers = {"Authorization": f"Bearer {criar_token_usuario(novo)}"}
+    return novo
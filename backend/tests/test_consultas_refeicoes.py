@@ -0,0 +1,88 @@
+# tests/test_consultas_refeicoes.py
+#
+# Número de consultas SQL do dashboard e do histórico: fixo, qualquer que seja
+# o número de refeições (sem N+1 por refeição ou por alimento).
+
+from datetime import timedelta
+
+from app import crud
+from app.models.alimentos import Alimento
+from app.models.refeicoes import AlimentoSalvo, RefeicaoSalva, RefeicaoStatus
+from app.perfil_sql import limitar_consultas, verificar_consultas_resposta
+
+
+def _criar_refeicoes(db, usuario, quantidade: int, alimentos_por_refeicao: int = 4):
+    """Refeições de hoje (analisadas) com alguns alimentos vinculados à tabela 'alimentos'."""
+    inicio, _ = crud._intervalo_de_hoje()
+    alimento = Alimento(alimento="Arroz, integral, cozido", categoria="Cereais")
+    db.add(alimento)
+    db.flush()
+    for indice in range(quantidade):
+        # created_at explícito: o default do modelo usa TIMEZONE(), que só existe no PostgreSQL
+        criada_em = inicio + timedelta(minutes=indice)
+        refeicao = RefeicaoSalva(
+            owner_id=usuario.id, status=RefeicaoStatus.ANALYSIS_COMPLETE, created_at=criada_em, updated_at=criada_em,
+            total_calorias=100.0 + indice, total_proteinas_g=10.0, total_carboidratos_g=20.0, total_gorduras_g=5.0,
+        )
+        db.add(refeicao)
+        db.flush()
+        db.add_all(
+            AlimentoSalvo(refeicao_id=refeicao.id, nome=f"Alimento {posicao}", quantidade_estimada_g=100,
+                          alimento_id=alimento.id if posicao % 2 == 0 else None)
+            for posicao in range(alimentos_por_refeicao)
+        )
+    db.commit()
+
+
+def test_resumo_de_hoje_em_uma_consulta(db, usuario):
+    _criar_refeicoes(db, usuario, quantidade=6)
+    usuario_id = usuario.id  # fora do bloco: o commit expirou o objeto e lê-lo seria uma consulta
+
+    with limitar_consultas(1):
+        resumos = crud.get_resumo_refeicoes_hoje(db, user_id=usuario_id)
+
+    assert [resumo["kcal_estimadas"] for resumo in resumos] == [100.0, 101.0, 102.0, 103.0, 104.0, 105.0]
+    # Só os 3 primeiros alimentos, mas a contagem de vínculos cobre todos
+    assert resumos[0]["alimentos_principais"] == ["Alimento 0", "Alimento 1", "Alimento 2"]
+    assert (resumos[0]["alimentos_vinculados"], resumos[0]["alimentos_sem_vinculo"]) == (2, 2)
+
+
+def test_endpoint_refeicoes_hoje_nao_cresce_com_as_refeicoes(cliente, db, usuario):
+    _criar_refeicoes(db, usuario, quantidade=2)
+    # 1ª requisição carrega o usuário do token no cache_principal; as seguintes não vão ao banco por ele
+    cliente.get("/api/v1/refeicoes/refeicoes-hoje", headers=usuario.headers)
+
+    resposta = cliente.get("/api/v1/refeicoes/refeicoes-hoje", headers=usuario.headers)
+    assert resposta.status_code == 200 and len(resposta.json()) == 2
+    consultas_com_2 = verificar_consultas_resposta(resposta, maximo=1)
+
+    _criar_refeicoes(db, usuario, quantidade=10)
+    resposta = cliente.get("/api/v1/refeicoes/refeicoes-hoje", headers=usuario.headers)
+    assert len(resposta.json()) == 12
+    assert verificar_consultas_resposta(resposta, maximo=1) == consultas_com_2
+
+
+def test_historico_paginas_com_consultas_fixas(cliente, db, usuario):
+    _criar_refeicoes(db, usuario, quantidade=15)
+    cliente.get("/api/v1/refeicoes/historico", headers=usuario.headers)
+
+    # 1ª página: a página + a contagem do X-Total-Count
+    primeira = cliente.get("/api/v1/refeicoes/historico", params={"limit": 5}, headers=usuario.headers)
+    assert primeira.status_code == 200
+    assert [item["total_calorias"] for item in primeira.json()] == [114.0, 113.0, 112.0, 111.0, 110.0]
+    assert primeira.headers["x-total-count"] == "15"
+    verificar_consultas_resposta(primeira, maximo=2)
+
+    # Demais páginas: só a consulta por cursor
+    segunda = cliente.get(
+        "/api/v1/refeicoes/historico",
+        params={"limit": 5, "cursor": primeira.headers["x-page-next"]},
+        headers=usuario.headers,
+    )
+    assert [item["total_calorias"] for item in segunda.json()] == [109.0, 108.0, 107.0, 106.0, 105.0]
+    verificar_consultas_resposta(segunda, maximo=1)
+
+    usuario_id = usuario.id
+    with limitar_consultas(1):
+        linhas, proximo, pagina = crud.get_historico_refeicoes_por_usuario(db, user_id=usuario_id, limit=50)
+    assert len(linhas) == 15 and proximo is None and pagina == 1
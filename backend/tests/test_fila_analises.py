@@ -0,0 +1,213 @@
+# tests/test_fila_analises.py
+#
+# FilaAnalisesMemoria + TrabalhadorAnalises: um job por refeição, nova tentativa
+# com backoff exponencial e dead-letter depois de ANALISE_MAX_TENTATIVAS.
+
+import asyncio
+import threading
+
+import pytest
+
+from app.config import settings
+from app.services import fila_analises as modulo
+from app.services import analise_detalhada
+from app.services.analise_detalhada import ErroAnaliseDefinitivo, ErroRecomendacoesIA
+from app.services.fila_analises import FilaAnalisesMemoria, TrabalhadorAnalises
+
+
+class SessaoFalsa:
+    """Session síncrona de mentira; guarda as threads que a usaram (o worker roda no event loop)."""
+
+    def __init__(self):
+        self.rollbacks = 0
+        self.fechada = False
+        self.threads = set()
+
+    def rollback(self):
+        self.threads.add(threading.get_ident())
+        self.rollbacks += 1
+
+    def close(self):
+        self.threads.add(threading.get_ident())
+        self.fechada = True
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """Relógio da fila controlado pelo teste (agendamentos usam time.time())."""
+    agora = [1000.0]
+    monkeypatch.setattr(modulo.time, "time", lambda: agora[0])
+    return agora
+
+
+@pytest.fixture
+def falhas(monkeypatch):
+    """Refeições marcadas como ANALYSIS_FAILED pelo worker."""
+    marcadas = []
+
+    def marcar(db, meal_id, user_id):
+        assert threading.current_thread() is not threading.main_thread()  # fora do event loop
+        marcadas.append(meal_id)
+
+    monkeypatch.setattr(modulo, "marcar_falha", marcar)
+    return marcadas
+
+
+def _analise_que_falha(monkeypatch, erro: Exception):
+    chamadas = []
+
+    async def analisar(db, meal_id, user_id, ultima_tentativa):
+        chamadas.append(meal_id)
+        raise erro
+
+    monkeypatch.setattr(modulo, "analisar_refeicao", analisar)
+    return chamadas
+
+
+def test_enfileirar_nao_duplica_job_ativo():
+    async def cenario():
+        fila = FilaAnalisesMemoria()
+        assert await fila.enfileirar(1, 10) is True
+        assert await fila.enfileirar(1, 10) is False
+        assert await fila.ativo(1)
+
+        job = await fila.obter()
+        assert (job.meal_id, job.tentativa) == (1, 1)
+        assert await fila.obter() is None
+
+        # Em execução continua ativo; depois de concluído pode ser enfileirado de novo
+        assert await fila.enfileirar(1, 10) is False
+        await fila.concluir(job)
+        assert not await fila.ativo(1)
+        assert await fila.estado(1) is None
+        assert await fila.enfileirar(1, 10) is True
+
+    asyncio.run(cenario())
+
+
+def test_falha_transitoria_reagenda_com_backoff(monkeypatch, relogio, falhas):
+    monkeypatch.setattr(settings, "ANALISE_MAX_TENTATIVAS", 3)
+    monkeypatch.setattr(settings, "ANALISE_BACKOFF_SEGUNDOS", 5.0)
+    chamadas = _analise_que_falha(monkeypatch, TimeoutError("Gemini demorou"))
+
+    async def cenario():
+        fila = FilaAnalisesMemoria()
+        sessoes = []
+        trabalhador = TrabalhadorAnalises(fila, lambda: sessoes.append(SessaoFalsa()) or sessoes[-1], 1)
+        await fila.enfileirar(7, 70)
+
+        await trabalhador._processar(await fila.obter())
+        assert await fila.estado(7) == {"tentativas": 1, "erro": "TimeoutError: Gemini demorou"}
+        assert await fila.ativo(7)
+        assert sessoes[-1].rollbacks == 1 and sessoes[-1].fechada
+        assert threading.get_ident() not in sessoes[-1].threads  # banco fora do event loop
+
+        # 1ª nova tentativa só depois de 5 s; a 2ª, de 10 s
+        relogio[0] += 4.9
+        assert await fila.obter() is None
+        relogio[0] += 0.2
+        job = await fila.obter()
+        assert job.tentativa == 2
+
+        await trabalhador._processar(job)
+        relogio[0] += 9.9
+        assert await fila.obter() is None
+        relogio[0] += 0.2
+        assert (await fila.obter()).tentativa == 3
+
+    asyncio.run(cenario())
+    assert chamadas == [7, 7]
+    assert falhas == []
+
+
+def test_tentativas_esgotadas_vao_para_a_dead_letter(monkeypatch, relogio, falhas):
+    monkeypatch.setattr(settings, "ANALISE_MAX_TENTATIVAS", 2)
+    monkeypatch.setattr(settings, "ANALISE_BACKOFF_SEGUNDOS", 1.0)
+    chamadas = _analise_que_falha(monkeypatch, ConnectionError("sem rede"))
+
+    async def cenario():
+        fila = FilaAnalisesMemoria()
+        trabalhador = TrabalhadorAnalises(fila, SessaoFalsa, 1)
+        await fila.enfileirar(3, 30)
+
+        await trabalhador._processar(await fila.obter())
+        relogio[0] += 1.0
+        await trabalhador._processar(await fila.obter())
+
+        assert [job.meal_id for job in fila.mortos] == [3]
+        assert fila.mortos[0].ultimo_erro == "ConnectionError: sem rede"
+        assert await fila.estado(3) == {"tentativas": 2, "erro": "ConnectionError: sem rede"}
+        assert not await fila.ativo(3)
+        relogio[0] += 60
+        assert await fila.obter() is None
+
+    asyncio.run(cenario())
+    assert chamadas == [3, 3]
+    assert falhas == [3]
+
+
+def test_erro_definitivo_nao_tenta_de_novo(monkeypatch, relogio, falhas):
+    chamadas = _analise_que_falha(monkeypatch, ErroAnaliseDefinitivo("Refeição sem alimentos."))
+
+    async def cenario():
+        fila = FilaAnalisesMemoria()
+        await fila.enfileirar(4, 40)
+        await TrabalhadorAnalises(fila, SessaoFalsa, 1)._processar(await fila.obter())
+        assert [job.tentativa for job in fila.mortos] == [1]
+        relogio[0] += 3600
+        assert await fila.obter() is None
+
+    asyncio.run(cenario())
+    assert chamadas == [4]
+    assert falhas == [4]
+
+
+def test_ultima_tentativa_so_na_ultima(monkeypatch, relogio, falhas):
+    monkeypatch.setattr(settings, "ANALISE_MAX_TENTATIVAS", 3)
+    monkeypatch.setattr(settings, "ANALISE_BACKOFF_SEGUNDOS", 1.0)
+    recebidas = []
+
+    async def analisar(db, meal_id, user_id, ultima_tentativa):
+        recebidas.append(ultima_tentativa)
+        if not ultima_tentativa:
+            raise ErroRecomendacoesIA("cota excedida")
+
+    monkeypatch.setattr(modulo, "analisar_refeicao", analisar)
+
+    async def cenario():
+        fila = FilaAnalisesMemoria()
+        trabalhador = TrabalhadorAnalises(fila, SessaoFalsa, 1)
+        await fila.enfileirar(5, 50)
+        await trabalhador._processar(await fila.obter())
+        assert await fila.estado(5) == {"tentativas": 1, "erro": "ErroRecomendacoesIA: cota excedida"}
+        relogio[0] += 1.0
+        await trabalhador._processar(await fila.obter())
+        relogio[0] += 2.0
+        await trabalhador._processar(await fila.obter())
+        assert not await fila.ativo(5)
+        assert not fila.mortos
+
+    asyncio.run(cenario())
+    assert recebidas == [False, False, True]
+    assert falhas == []
+
+
+def test_falha_da_ia_so_salva_textos_padrao_na_ultima_tentativa(monkeypatch):
+    salvos = []
+    monkeypatch.setattr(analise_detalhada, "preparar_analise", lambda db, meal_id, user_id: (
+        "refeicao", dict.fromkeys(("energia_kcal", "proteina_g", "carboidrato_g", "lipidios_g"), 0.0), [], [{"nome": "Arroz"}]
+    ))
+    monkeypatch.setattr(analise_detalhada, "salvar_resultado", lambda db, db_refeicao, resultado: salvos.append(resultado))
+
+    async def sem_resposta(lista_alimentos, totais):
+        return {"erro": "Desculpe, não foi possível gerar as recomendações no momento."}
+
+    monkeypatch.setattr(analise_detalhada, "gerar_recomendacoes_detalhadas_ia_async", sem_resposta)
+
+    with pytest.raises(ErroRecomendacoesIA):
+        asyncio.run(analise_detalhada.analisar_refeicao(SessaoFalsa(), 9, 90, ultima_tentativa=False))
+    assert salvos == []
+
+    resultado = asyncio.run(analise_detalhada.analisar_refeicao(SessaoFalsa(), 9, 90, ultima_tentativa=True))
+    assert salvos == [resultado]
+    assert resultado.recomendacoes.pontos_positivos == ["Análise concluída."]
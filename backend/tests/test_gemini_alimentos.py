@@ -0,0 +1,29 @@
+# tests/test_gemini_alimentos.py
+#
+# ConsultaGeminiAlimentos: só respostas inválidas entram no cache negativo;
+# falhas transitórias do Gemini são consultadas de novo.
+
+from app.services import gemini_alimentos as modulo
+from app.services.gemini_alimentos import ConsultaGeminiAlimentos
+
+
+def test_falha_transitoria_nao_entra_no_cache_negativo(monkeypatch):
+    respostas = [{"erro": "Tempo limite excedido ao obter dados para Cuscuz."}, {"alimento": "Cuscuz"}]
+    monkeypatch.setattr(modulo, "fetch_gemini_nutritional_data", lambda nome: respostas.pop(0))
+    consulta = ConsultaGeminiAlimentos(max_itens_negativos=10, ttl_negativo_segundos=3600)
+
+    assert "erro" in consulta.consultar("cuscuz", "Cuscuz")
+    assert consulta.consultar("cuscuz", "Cuscuz") == {"alimento": "Cuscuz"}
+    assert (consulta.chamadas_modelo, consulta.hits_negativos, consulta.falhas) == (2, 0, 1)
+
+
+def test_resposta_invalida_entra_no_cache_negativo(monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(modulo, "fetch_gemini_nutritional_data", lambda nome: chamadas.append(nome) or {"alimento": nome})
+    consulta = ConsultaGeminiAlimentos(max_itens_negativos=10, ttl_negativo_segundos=3600)
+
+    consulta.consultar("cuscuz", "Cuscuz")
+    consulta.marcar_invalido("cuscuz", "Dados inválidos do Gemini: energia_kcal ausente")
+    assert consulta.consultar("cuscuz", "Cuscuz") == {"erro": "Dados inválidos do Gemini: energia_kcal ausente"}
+    assert chamadas == ["Cuscuz"]
+    assert consulta.hits_negativos == 1
@@ -24,6 +24,9 @@ export default function HistoricoPage() {
   const [refeicoes, setRefeicoes] = useState<RefeicaoHistoricoItem[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  // Cursor da próxima página (cabeçalho X-Page-Next); null quando não há mais
+  const [proximoCursor, setProximoCursor] = useState<string | null>(null);
+  const [carregandoMais, setCarregandoMais] = useState(false);
 
   // Proteção de Rota
   useEffect(() => {
@@ -32,7 +35,7 @@ export default function HistoricoPage() {
     }
   }, [usuario, carregando, router]);
 
-  // Buscar dados do Histórico
+  // Buscar dados do Histórico (primeira página)
   useEffect(() => {
     if (usuario) {
       const fetchHistorico = async () => {
@@ -41,6 +44,7 @@ export default function HistoricoPage() {
         try {
           const response = await api.get<RefeicaoHistoricoItem[]>('/api/v1/refeicoes/historico');
           setRefeicoes(response.data);
+          setProximoCursor(response.headers['x-page-next'] ?? null);
         } catch (err) {
           console.error("Erro ao buscar histórico:", err);
           setError("Não foi possível carregar seu histórico.");
@@ -52,6 +56,24 @@ export default function HistoricoPage() {
     }
   }, [usuario]); // Roda quando o usuário é carregado
 
+  // Próximas páginas
+  const carregarMais = async () => {
+    if (!proximoCursor) return;
+    setCarregandoMais(true);
+    try {
+      const response = await api.get<RefeicaoHistoricoItem[]>('/api/v1/refeicoes/historico', {
+        params: { cursor: proximoCursor },
+      });
+      setRefeicoes((anteriores) => [...anteriores, ...response.data]);
+      setProximoCursor(response.headers['x-page-next'] ?? null);
+    } catch (err) {
+      console.error("Erro ao carregar mais refeições:", err);
+      setError("Não foi possível carregar mais refeições.");
+    } finally {
+      setCarregandoMais(false);
+    }
+  };
+
   if (carregando || loading) {
     return (
       <div className="flex flex-col min-h-screen">
@@ -122,6 +144,19 @@ export default function HistoricoPage() {
             </Link>
           ))}
         </div>
+
+        {proximoCursor && (
+          <div className="flex justify-center mt-6">
+            <button
+              onClick={carregarMais}
+              disabled={carregandoMais}
+              className="flex items-center gap-2 px-4 py-2 rounded-lg bg-green-600 text-white font-semibold hover:bg-green-700 disabled:opacity-60"
+            >
+              {carregandoMais && <Loader2 className="animate-spin" size={18} />}
+              Carregar mais
+            </button>
+          </div>
+        )}
       </main>
     </div>
   );
@@ -2,7 +2,7 @@
 "use client";
 import React, { useState, useEffect } from 'react';
 import Image from 'next/image';
-import api from '../../services/api';
+import api, { lerEventosSSE } from '../../services/api';
 import { useRouter } from 'next/navigation';
 import { AxiosError } from 'axios';
 import Navbar from '../../components/Navbar';
@@ -13,6 +13,7 @@ import {
   ScanRapidoAlimento,
   ScanRapidoResponse,
   AnaliseCompletaResponse,
+  StatusAnaliseResponse,
   FoodDatabaseItem,
   ModalAlimentoData,
   FoodItem
@@ -557,39 +558,100 @@ export default function Home() {
         nome: fotoCapturada?.name
       });
       // 2. Criar o FormData
-      const formData = new FormData();
-      // 3. Verificar se a imagem original (do state 'fotoCapturada') existe
-      if (!fotoCapturada) {
-        throw new Error("Imagem original (fotoCapturada) não encontrada. Tente escanear novamente.");
-      }
-      // 4. Adicionar os campos que o backend espera
-      formData.append("imagem", fotoCapturada);
-      formData.append("alimentos_json", JSON.stringify(alimentosParaSalvar));
-      // 📍 ADICIONE AQUI (após criar o FormData)
-      console.log('📦 DEBUG: FormData criado:', {
-        temImagem: formData.has('imagem'),
-        temAlimentos: formData.has('alimentos_json')
-      });
-      // ✅ CORREÇÃO: Enviar a lista DIRETAMENTE
-      const saveResponse = await api.post<{ meal_id: number }>(
+      // ✅ Se o scan devolveu um upload_token, a imagem já está no servidor: envia só o token.
+      //    Sem token (ou token expirado -> 410), envia a imagem original.
+      const montarFormData = (comImagem: boolean) => {
+        const formData = new FormData();
+        if (comImagem) {
+          // 3. Verificar se a imagem original (do state 'fotoCapturada') existe
+          if (!fotoCapturada) {
+            throw new Error("Imagem original (fotoCapturada) não encontrada. Tente escanear novamente.");
+          }
+          formData.append("imagem", fotoCapturada);
+        } else {
+          formData.append("upload_token", scanResult?.upload_token ?? "");
+        }
+        // 4. Adicionar os campos que o backend espera
+        formData.append("alimentos_json", JSON.stringify(alimentosParaSalvar));
+        // A análise vem pelo streaming abaixo (sem fila em segundo plano)
+        formData.append("analisar_em_segundo_plano", "false");
+        return formData;
+      };
+      const salvar = (comImagem: boolean) => api.post<{ meal_id: number }>(
         '/api/v1/refeicoes/salvar-scan-editado',
-        formData
+        montarFormData(comImagem)
       );
+      let saveResponse;
+      if (scanResult.upload_token) {
+        try {
+          saveResponse = await salvar(false);
+        } catch (err) {
+          if (err instanceof AxiosError && err.response?.status === 410) {
+            saveResponse = await salvar(true);
+          } else {
+            throw err;
+          }
+        }
+      } else {
+        saveResponse = await salvar(true);
+      }
       console.log('✅ DEBUG: Resposta recebida:', saveResponse.data);
       savedMealId = saveResponse.data.meal_id;
       if (!savedMealId) {
         throw new Error("Falha ao obter o ID da refeição salva.");
       }
       console.log('Refeição salva com ID:', savedMealId);
-      // Agora chamar a análise detalhada
-      const analysisResponse = await api.post<AnaliseCompletaResponse>(
-        `/api/v1/refeicoes/analisar-detalhadamente/${savedMealId}`
-      );
-      if (analysisResponse.data && analysisResponse.data.detalhes_prato) {
-        setScanResult(null);
-        setAnalysisResult(analysisResponse.data);
-      } else {
-        throw new Error('Resposta da análise detalhada em formato inválido');
+      // Análise detalhada em streaming: macros na hora, recomendações conforme a IA gera
+      const mealId = savedMealId;
+      let concluida = false;
+      try {
+        await lerEventosSSE(`/api/v1/refeicoes/analisar-detalhadamente/${mealId}/stream`, (evento, dados) => {
+          if (evento === 'macros') {
+            setScanResult(null);
+            setAnalysisResult({
+              ...dados,
+              recomendacoes: { pontos_positivos: [], sugestoes_balanceamento: [], alternativas_saudaveis: [] },
+            });
+          } else if (evento === 'item') {
+            setAnalysisResult((atual) => {
+              if (!atual) return atual;
+              const { secao, valor } = dados as { secao: string; valor: string };
+              if (secao === 'vitaminas' || secao === 'minerais') {
+                const lista = [...(atual.analise_nutricional[secao] ?? []), valor];
+                return { ...atual, analise_nutricional: { ...atual.analise_nutricional, [secao]: lista } };
+              }
+              const chave = secao as keyof typeof atual.recomendacoes;
+              return { ...atual, recomendacoes: { ...atual.recomendacoes, [chave]: [...atual.recomendacoes[chave], valor] } };
+            });
+          } else if (evento === 'concluido') {
+            concluida = true;
+            setAnalysisResult(dados as AnaliseCompletaResponse);
+          } else if (evento === 'erro') {
+            throw new Error(dados?.detail || 'Erro ao realizar a análise detalhada.');
+          }
+        });
+      } catch (erroStream) {
+        console.warn('Streaming da análise indisponível; usando a fila em segundo plano:', erroStream);
+      }
+      if (!concluida) {
+        // Fallback: enfileira a análise e acompanha o status
+        let statusAnalise = (await api.post<StatusAnaliseResponse>(
+          `/api/v1/refeicoes/analisar-detalhadamente/${mealId}`
+        )).data;
+        const limite = Date.now() + 120_000;
+        while (statusAnalise.status === 'pending_analysis' && Date.now() < limite) {
+          await new Promise((resolve) => setTimeout(resolve, 1500));
+          statusAnalise = (await api.get<StatusAnaliseResponse>(`/api/v1/refeicoes/analise/${mealId}`)).data;
+        }
+        if (statusAnalise.status === 'analysis_failed') {
+          throw new Error(statusAnalise.erro || 'Não foi possível concluir a análise detalhada.');
+        }
+        if (statusAnalise.resultado && statusAnalise.resultado.detalhes_prato) {
+          setScanResult(null);
+          setAnalysisResult(statusAnalise.resultado);
+        } else {
+          throw new Error('A análise detalhada está demorando mais que o esperado. Confira o histórico em instantes.');
+        }
       }
     } catch (error) {
       console.error('Erro no fluxo de salvar e analisar:', error);
@@ -626,7 +688,18 @@ export default function Home() {
       return [];
     }
     try {
-      // Use o novo endpoint que inclui IA
+      // Autocomplete em memória no backend (sem ida ao banco a cada tecla)
+      const sugestoes = await api.get<FoodItem[]>(
+        `/api/v1/alimentos/autocomplete?q=${encodeURIComponent(searchTerm)}&limit=10`
+      );
+      if (sugestoes.data?.length) {
+        return sugestoes.data;
+      }
+    } catch (error) {
+      console.error('Erro no autocomplete de alimentos:', error);
+    }
+    try {
+      // Nada no autocomplete: busca ranqueada no banco, com IA se necessário
       const response = await api.get<FoodItem[]>(
         `/api/v1/alimentos/buscar-completo?q=${encodeURIComponent(searchTerm)}&incluir_ia=${incluirIA}&limit=10`
       );
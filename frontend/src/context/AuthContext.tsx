@@ -4,7 +4,7 @@
 
 import React, { createContext, useContext, useEffect, useState, useCallback } from "react";
 import { AxiosError } from "axios";
-import api, { setAccessToken, getAccessToken } from "../services/api";
+import api, { setAccessToken, getAccessToken, setRefreshToken, getRefreshToken } from "../services/api";
 import type { Usuario } from "../types/usuario";
 
 type MeResponse = Usuario;
@@ -44,8 +44,10 @@ export const AuthProvider: React.FC<React.PropsWithChildren> = ({ children }) =>
     } catch (error) {
       console.error('❌ Erro ao buscar usuário:', error);
       
+      // O interceptor já tentou renovar com o refresh token
       if (error instanceof AxiosError && error.response?.status === 401) {
         setAccessToken(null);
+        setRefreshToken(null);
       }
       
       setUsuario(null);
@@ -55,7 +57,7 @@ export const AuthProvider: React.FC<React.PropsWithChildren> = ({ children }) =>
   }, []);
 
   useEffect(() => {
-    const token = getAccessToken();
+    const token = getAccessToken() || getRefreshToken();
     if (IS_DEVELOPMENT) console.log('🔐 Token encontrado:', !!token);
     
     if (token) {
@@ -105,6 +107,7 @@ export const AuthProvider: React.FC<React.PropsWithChildren> = ({ children }) =>
       }
       
       setAccessToken(data.access_token);
+      setRefreshToken(data.refresh_token ?? null);
       await fetchMe();
     } catch (err) {
       console.error('❌ Erro no login:', err);
@@ -116,7 +119,13 @@ export const AuthProvider: React.FC<React.PropsWithChildren> = ({ children }) =>
 
   const logout = useCallback(() => {
     if (IS_DEVELOPMENT) console.log('🚪 Fazendo logout...');
+    // Revoga a sessão no backend (sem esperar: o logout local não depende disso)
+    const refreshToken = getRefreshToken();
+    if (refreshToken) {
+      api.post("/api/v1/auth/logout", { refresh_token: refreshToken }).catch(() => {});
+    }
     setAccessToken(null);
+    setRefreshToken(null);
     setUsuario(null);
   }, []);
 
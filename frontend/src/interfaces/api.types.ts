@@ -15,6 +15,15 @@ export interface AnaliseCompletaResponse {
   timestamp?: string;
 }
 
+// Status da análise detalhada (processada em segundo plano no backend)
+export interface StatusAnaliseResponse {
+  meal_id: number;
+  status: 'pending_analysis' | 'analysis_complete' | 'analysis_failed';
+  tentativas: number;
+  erro?: string | null;
+  resultado?: AnaliseCompletaResponse | null;
+}
+
 // Alimento detectado (para histórico)
 export interface AlimentoDetectado {
   id: number;
@@ -47,6 +56,8 @@ export interface AnaliseNutricional {
   vitaminas_minerais?: string[];
   vitaminas?: string[];
   minerais?: string[];
+  // Todos os nutrientes calculados no backend (fibra_g, sodio_mg, ferro_mg...); ausente em análises antigas
+  nutrientes?: Record<string, number> | null;
 }
 
 export interface Recomendacoes {
@@ -82,6 +93,7 @@ export interface ScanRapidoResponse {
   status: string; // Obrigatório agora
   modalidade?: string;
   timestamp?: string;
+  upload_token?: string | null; // Imagem já enviada no scan; evita reenviar o arquivo ao salvar
   resultado: {
     modalidade?: string;
     alimentos_extraidos: ScanRapidoAlimento[];
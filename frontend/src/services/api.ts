@@ -61,6 +61,60 @@ export const getAccessToken = (): string | null => {
   return null;
 };
 
+// Refresh token: só em localStorage (lido a cada uso, para abas diferentes
+// não reapresentarem um token já rotacionado — o backend trata isso como reuso)
+const CHAVE_REFRESH = "refreshToken";
+
+export const setRefreshToken = (token: string | null) => {
+  if (typeof window === "undefined") return;
+  try {
+    if (token) localStorage.setItem(CHAVE_REFRESH, token);
+    else localStorage.removeItem(CHAVE_REFRESH);
+  } catch (err) {
+    console.warn("services/api: falha ao acessar localStorage", err);
+  }
+};
+
+export const getRefreshToken = (): string | null => {
+  if (typeof window === "undefined") return null;
+  try {
+    return localStorage.getItem(CHAVE_REFRESH);
+  } catch (err) {
+    console.warn("services/api: erro ao ler refresh token do localStorage", err);
+    return null;
+  }
+};
+
+// Renovação em andamento: requisições que recebem 401 ao mesmo tempo esperam a mesma
+let _renovacao: Promise<string | null> | null = null;
+
+/**
+ * Troca o refresh token por um novo par (POST /api/v1/auth/refresh).
+ * Retorna o novo access token, ou null se a sessão não puder ser renovada.
+ */
+export const renovarAccessToken = (): Promise<string | null> => {
+  if (_renovacao) return _renovacao;
+  const refreshToken = getRefreshToken();
+  if (!refreshToken) return Promise.resolve(null);
+
+  _renovacao = axios
+    .post(`${baseURL ?? ""}/api/v1/auth/refresh`, { refresh_token: refreshToken })
+    .then(({ data }) => {
+      setAccessToken(data.access_token);
+      setRefreshToken(data.refresh_token);
+      return data.access_token as string;
+    })
+    .catch(() => {
+      setAccessToken(null);
+      setRefreshToken(null);
+      return null;
+    })
+    .finally(() => {
+      _renovacao = null;
+    });
+  return _renovacao;
+};
+
 // Interceptors (logging e tratamento simples)
 api.interceptors.request.use(
   (config) => {
@@ -75,12 +129,68 @@ api.interceptors.request.use(
 
 api.interceptors.response.use(
   (res) => res,
-  (error) => {
-    // Tratar 401 / refresh token etc. (placeholder)
-    // console.error("API response error:", error);
+  async (error) => {
+    // 401 com access token expirado: renova uma vez e repete a requisição
+    const original = error.config;
+    if (
+      error.response?.status === 401 &&
+      original &&
+      !original._renovado &&
+      !original.url?.includes("/auth/")
+    ) {
+      original._renovado = true;
+      const token = await renovarAccessToken();
+      if (token) {
+        original.headers = { ...original.headers, Authorization: `Bearer ${token}` };
+        return api(original);
+      }
+    }
     return Promise.reject(error);
   }
 );
 
+/**
+ * Lê um endpoint Server-Sent Events autenticado (EventSource não envia o header
+ * Authorization, então usa fetch + ReadableStream). Chama onEvento para cada evento.
+ */
+export const lerEventosSSE = async (
+  caminho: string,
+  onEvento: (nome: string, dados: any) => void
+): Promise<void> => {
+  const token = getAccessToken();
+  const resposta = await fetch(`${baseURL ?? ""}${caminho}`, {
+    headers: {
+      Accept: "text/event-stream",
+      ...(token ? { Authorization: `Bearer ${token}` } : {}),
+    },
+  });
+  if (!resposta.ok || !resposta.body) {
+    throw new Error(`Falha no streaming (HTTP ${resposta.status})`);
+  }
+
+  const leitor = resposta.body.getReader();
+  const decodificador = new TextDecoder();
+  let buffer = "";
+  while (true) {
+    const { value, done } = await leitor.read();
+    if (done) break;
+    buffer += decodificador.decode(value, { stream: true });
+    // Eventos são separados por uma linha em branco
+    let fim = buffer.indexOf("\n\n");
+    while (fim !== -1) {
+      const bloco = buffer.slice(0, fim);
+      buffer = buffer.slice(fim + 2);
+      let nome = "message";
+      const dados: string[] = [];
+      bloco.split("\n").forEach((linha) => {
+        if (linha.startsWith("event:")) nome = linha.slice(6).trim();
+        else if (linha.startsWith("data:")) dados.push(linha.slice(5).trimStart());
+      });
+      if (dados.length) onEvento(nome, JSON.parse(dados.join("\n")));
+      fim = buffer.indexOf("\n\n");
+    }
+  }
+};
+
 // Exportações
 export default api;